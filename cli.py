@@ -0,0 +1,153 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import settings as network_settings
+
+def oracle_plan(settings, administrator):
+    """The oracle, the job scheduler and the proxies of every symbol in settings.SYMBOLS.
+    """
+    from utils.deployment_utils import Step
+    steps = [
+        Step("PriceOracle", "PriceOracle", {
+            'response_threshold': settings.RESPONSE_THRESHOLD,
+            'validity_window_in_epochs': 4,
+            'valid_script': settings.VALID_SCRIPT,
+            'valid_sources': settings.VALID_SOURCES,
+            'administrator': administrator
+        }),
+        Step("JobScheduler", "JobScheduler", {'admin': administrator}),
+    ]
+    for target in ("LegacyProxyOracle", "FlippedLegacyProxyOracle", "ProxyOracle", "FlippedProxyOracle"):
+        for symbol in settings.SYMBOLS:
+            steps.append(Step("{}_{}".format(target, symbol), target, {'oracle': settings.SOURCE_ORACLE, 'symbol': symbol}))
+    return steps
+
+def lp_plan(settings, administrator):
+    """The FlippedLPPriceOracle of the LP pair in settings, valued through VALUE_TOKEN_ORACLE_ADDRESS.
+    """
+    from utils.deployment_utils import Step
+    return [
+        Step("FlippedLPPriceOracle", "FlippedLPPriceOracle", {
+            'lp_token_address': settings.LPT_ADDRESS,
+            'lp_address': settings.LP_ADDRESS,
+            'value_token_address': settings.VALUE_TOKEN_ADDRESS,
+            'value_token_oracle_address': settings.VALUE_TOKEN_ORACLE_ADDRESS,
+            'value_token_oracle_symbol': settings.VALUE_TOKEN_ORACLE_SYMBOL
+        })
+    ]
+
+def relative_plan(settings, administrator):
+    """The RelativeProxyOracle pricing settings.BASE_SYMBOL in settings.QUOTE_SYMBOL from settings.SOURCE_ORACLE.
+    """
+    from utils.deployment_utils import Step
+    return [
+        Step("RelativeProxyOracle", "RelativeProxyOracle", {
+            'oracle': settings.SOURCE_ORACLE,
+            'base_symbol': settings.BASE_SYMBOL,
+            'quote_symbol': settings.QUOTE_SYMBOL
+        })
+    ]
+
+PLANS = {
+    "oracle": (oracle_plan, "deployment.checkpoint.json"),
+    "lp": (lp_plan, "lp_oracle_deployment.checkpoint.json"),
+    "relative": (relative_plan, "relative_oracle_deployment.checkpoint.json"),
+}
+
+def compile_command(arguments):
+    return subprocess.run([arguments.smartpy, "compile", "compiler.py", arguments.output]).returncode
+
+def deploy_command(arguments):
+    from pytezos import pytezos
+    from utils.deployment_utils import Checkpoint, Deployer
+    settings = network_settings.settings
+    make_plan, default_checkpoint = PLANS[arguments.plan]
+
+    pytezos_admin_client = pytezos.using(key=settings.ADMIN_KEY, shell=arguments.endpoint or settings.SHELL)
+    administrator = pytezos_admin_client.key.public_key_hash()
+    print(administrator)
+
+    deployer = Deployer(pytezos_admin_client, Checkpoint(arguments.checkpoint or default_checkpoint), output=arguments.output, timeout=arguments.timeout)
+    deployer.run(make_plan(settings, administrator))
+    return 0
+
+def status_command(arguments):
+    """Prints the steps of the checkpoints, only reads the json files.
+    """
+    plans = [arguments.plan] if arguments.plan else sorted(PLANS)
+    for plan in plans:
+        path = arguments.checkpoint or PLANS[plan][1]
+        if not os.path.exists(path):
+            print("{}: not deployed ({} missing)".format(plan, path))
+            continue
+        with open(path) as checkpoint_file:
+            state = json.load(checkpoint_file)
+        print("{} on {}:".format(plan, state["chain_id"]))
+        for name, step in state["steps"].items():
+            print("  {:<8} {:<32} {}".format(step["status"], name, step.get("address") or step.get("operation_hash")))
+    return 0
+
+def read_command(arguments):
+    """Runs an onchain view through the node RPC, without pytezos.
+    """
+    from utils.rpc import Rpc
+    rpc = Rpc(arguments.endpoint or network_settings.settings.SHELL)
+    if not arguments.symbols:
+        print(json.dumps(rpc.run_view(arguments.contract, arguments.view)))
+    for symbol in arguments.symbols:
+        argument = {"int": symbol} if symbol.isdigit() else {"string": symbol}
+        print("{}: {}".format(symbol, json.dumps(rpc.run_view(arguments.contract, arguments.view, argument))))
+    return 0
+
+def shim_arguments(command, argv):
+    """Arguments of main for a script kept for compatibility that runs command (i.e. ["deploy", "lp"]) with its own argv. --network
+    is an option of main and has to come before the subcommand, all other arguments belong to the subcommand.
+    """
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("--network")
+    known, rest = parser.parse_known_args(argv)
+    return (["--network", known.network] if known.network else []) + command + rest
+
+def main(argv=None):
+    """Single entry point for compiling, deploying and reading the oracles. The network profile (<network>_settings.py) is selected
+    with --network or the ORACLES_NETWORK environment variable, pytezos is only imported by the commands that sign operations.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--network", help="settings profile, loads <network>_settings.py (default: ${} or {})".format(network_settings.NETWORK_VARIABLE, network_settings.DEFAULT_NETWORK))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = subparsers.add_parser("compile", help="compile all targets of compiler.py with SmartPy")
+    compile_parser.add_argument("--output", default="out", help="SmartPy compile output directory")
+    compile_parser.add_argument("--smartpy", default="SmartPy.sh", help="SmartPy CLI executable")
+    compile_parser.set_defaults(handler=compile_command)
+
+    deploy_parser = subparsers.add_parser("deploy", help="originate a plan, resumable through its checkpoint")
+    deploy_parser.add_argument("plan", choices=sorted(PLANS))
+    deploy_parser.add_argument("--checkpoint", help="deployment state file, defaults to the plan's, use a new one for a new deployment")
+    deploy_parser.add_argument("--output", default="out", help="SmartPy compile output directory")
+    deploy_parser.add_argument("--timeout", type=int, default=600, help="seconds to wait for an operation before giving up (rerun to continue)")
+    deploy_parser.add_argument("--endpoint", help="node RPC, defaults to settings.SHELL")
+    deploy_parser.set_defaults(handler=deploy_command)
+
+    status_parser = subparsers.add_parser("status", help="show the originated contracts of the checkpoints")
+    status_parser.add_argument("plan", nargs="?", choices=sorted(PLANS))
+    status_parser.add_argument("--checkpoint", help="checkpoint file, defaults to the plan's")
+    status_parser.set_defaults(handler=status_command)
+
+    read_parser = subparsers.add_parser("read", help="run an onchain view (i.e. get_price) of a deployed contract")
+    read_parser.add_argument("contract", help="address of the oracle or proxy")
+    read_parser.add_argument("symbols", nargs="*", help="view arguments, symbols or symbol ids (the view takes unit if omitted)")
+    read_parser.add_argument("--view", default="get_price", help="onchain view to run")
+    read_parser.add_argument("--endpoint", help="node RPC, defaults to settings.SHELL")
+    read_parser.set_defaults(handler=read_command)
+
+    arguments = parser.parse_args(argv)
+    if arguments.network:
+        network_settings.select(arguments.network)
+    return arguments.handler(arguments)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,11 @@
 import smartpy as sp
 
 import oracles.constants as Constants
-from oracles.job_scheduler import JobScheduler
-from oracles.generic_oracle import PriceOracle, LegacyProxyOracle, ProxyOracle, RelativeProxyOracle
+from oracles.job_scheduler import JobScheduler, CompactJobScheduler
+from oracles.generic_oracle import PriceOracle, CompactPriceOracle, LegacyProxyOracle, ProxyOracle, RelativeProxyOracle
 from oracles.lp_oracle import LPPriceOracle
+from oracles.price_dispatcher import PriceDispatcher
+from utils.viewer import Viewer
 
 def main():
     """
@@ -19,6 +21,18 @@ def main():
     sp.add_compilation_target("LPPriceOracle", LPPriceOracle(sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), 8, sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), "BTC", requires_flip=False))
     sp.add_compilation_target("FlippedLPPriceOracle", LPPriceOracle(sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), 8, sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), "BTC", requires_flip=True))
     sp.add_compilation_target("RelativeProxyOracle", RelativeProxyOracle(sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), "BTC", "XTZ"))
+    sp.add_compilation_target("CompactPriceOracle", CompactPriceOracle(sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83')))
+    sp.add_compilation_target("CompactLegacyProxyOracle", LegacyProxyOracle(sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), sp.nat(Constants.SYMBOL_IDS['BTC']), use_symbol_ids=True))
+    sp.add_compilation_target("CompactRelativeProxyOracle", RelativeProxyOracle(sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), sp.nat(Constants.SYMBOL_IDS['BTC']), sp.nat(Constants.SYMBOL_IDS['XTZ']), use_symbol_ids=True))
+    sp.add_compilation_target("LazyJobScheduler", JobScheduler(sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), lazy_entry_points=True))
+    sp.add_compilation_target("LazyPriceOracle", PriceOracle(sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), lazy_entry_points=True))
+    sp.add_compilation_target("DirectPriceOracle", PriceOracle(sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), direct_fulfill=True))
+    sp.add_compilation_target("HighFrequencyPriceOracle", PriceOracle(sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), epoch_interval=Constants.HIGH_FREQUENCY_EPOCH_INTERVAL, heartbeat=Constants.ORACLE_EPOCH_INTERVAL))
+    sp.add_compilation_target("PriceDispatcher", PriceDispatcher(sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83')))
+    sp.add_compilation_target("Viewer", Viewer())
+    sp.add_compilation_target("MedianPriceOracle", PriceOracle(sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), aggregation="median"))
+    sp.add_compilation_target("CompactJobScheduler", CompactJobScheduler(sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83')))
+    sp.add_compilation_target("CompactScriptPriceOracle", PriceOracle(sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), compact_scripts=True))
     
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,13 @@
+import smartpy as sp
+
+from oracles.generic_oracle import PriceOracle
+
+def main():
+    """
+    This file compiles the PriceOracle with the fixed width payload format. Its decoder uses the NAT instruction (protocol Mumbai),
+    it is kept out of compiler.py until the SmartPy version the project pins is known to support it.
+    """
+    sp.add_compilation_target("FixedPayloadPriceOracle", PriceOracle(sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83'), payload_format="fixed"))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+from pytezos.rpc.errors import MichelsonError
+from pytezos import pytezos
+import argparse
+import time
+
+import oracles.constants as Constants
+import oracles.errors as Errors
+import settings as network_settings
+from utils.limits import LimitTuner
+
+SKIP_RETRY_INTERVAL = 30
+DISPATCH_DELAY = 60
+
+def failwith(error):
+    """Returns the int a rejected operation failed with (see oracles/errors.py), None if the script did not fail with an int. The
+    pytezos error carries the decoded RPC error, or a list of them, as its argument.
+    """
+    errors = error.args[0] if error.args else None
+    for item in errors if isinstance(errors, list) else [errors]:
+        if isinstance(item, dict) and "int" in item.get("with", {}):
+            return int(item["with"]["int"])
+    return None
+
+def next_round(now, epoch_interval, delay):
+    """Seconds from now until the keeper dispatches again: delay seconds into the next epoch, so that the oracle had time to
+    finalize it.
+    """
+    return epoch_interval - now % epoch_interval + delay
+
+def isolate(tuner, dispatcher):
+    """Called after a failed dispatch: pushes one subscription at a time up to the failing one and skips it once the contract
+    allows it (SKIP_TOO_EARLY until the round made no progress for skip_delay). Returns True if the round can continue.
+    """
+    while True:
+        try:
+            tuner.send(dispatcher.dispatch_batch(1), min_confirmations=1)
+        except MichelsonError as error:
+            if failwith(error) == Errors.NOTHING_TO_DISPATCH:
+                return False
+            break
+    while True:
+        try:
+            operation_group = tuner.send(dispatcher.skip(), min_confirmations=1)
+            print("skipped a failing subscription: '{}'".format(operation_group.hash()))
+            return True
+        except MichelsonError as error:
+            if failwith(error) != Errors.SKIP_TOO_EARLY:
+                print("skip failed: {}".format(error))
+                return False
+        time.sleep(SKIP_RETRY_INTERVAL)
+
+def main():
+    """This script is the keeper of the PriceDispatcher. After every epoch it calls dispatch until all subscriptions received the
+    new prices (the contract fails with NOTHING_TO_DISPATCH once the round is done) and then sleeps until the next epoch. A
+    subscription whose target fails is skipped (see isolate).
+
+    The epoch interval is compiled into the oracle and the dispatcher and is not in their storage, pass it with --epoch-interval for
+    builds that do not use Constants.ORACLE_EPOCH_INTERVAL (i.e. 30 for the HighFrequencyPriceOracle).
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--network", help="settings profile, loads <network>_settings.py")
+    parser.add_argument("--epoch-interval", dest="epoch_interval", type=int, default=Constants.ORACLE_EPOCH_INTERVAL, help="epoch interval of the oracle in seconds")
+    parser.add_argument("--delay", type=int, help="seconds into the epoch to dispatch at (default {} or half the epoch interval if shorter)".format(DISPATCH_DELAY))
+    arguments = parser.parse_args()
+    if arguments.network:
+        network_settings.select(arguments.network)
+    delay = arguments.delay if arguments.delay is not None else min(DISPATCH_DELAY, arguments.epoch_interval // 2)
+
+    settings = network_settings.settings
+    pytezos_keeper_client = pytezos.using(key=settings.ADMIN_KEY, shell=settings.SHELL)
+    dispatcher = pytezos_keeper_client.contract(settings.PRICE_DISPATCHER)
+    tuner = LimitTuner(pytezos_keeper_client)
+    while True:
+        try:
+            operation_group = tuner.send(dispatcher.dispatch(), min_confirmations=1)
+            print("dispatched: '{}'".format(operation_group.hash()))
+            continue
+        except MichelsonError as error:
+            if failwith(error) != Errors.NOTHING_TO_DISPATCH:
+                print("dispatch failed: {}".format(error))
+                if isolate(tuner, dispatcher):
+                    continue
+        time.sleep(next_round(time.time(), arguments.epoch_interval, delay))
+
+if __name__ == '__main__':
+    main()
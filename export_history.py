@@ -0,0 +1,53 @@
+import argparse
+import sys
+import time
+
+import settings as network_settings
+from utils.columns import ColumnStore
+from utils.history import SCHEMA, Exporter, RecordedRpc, RecordingRpc
+from utils.rpc import Rpc
+
+def main():
+    """This script exports the history of the oracles into column files for analytics, incident reviews and backtests: every fulfill
+    with its decoded response and respondent, every finalized epoch with its prices and every LPPriceOracle ratio update.
+
+    Each run continues from the last block of the previous one. Columns are plain little endian arrays, load them with
+    numpy.fromfile(path, dtype) using the dtypes listed in state.json, string columns are codes into the state.json dictionaries.
+
+    Example:
+        python3 export_history.py history --oracle KT1... --lp-oracle KT1... --start 2500000
+        python3 export_history.py history --oracle KT1... --record blocks    (also saves the blocks for --recorded)
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="export directory, created on the first run")
+    parser.add_argument("--oracle", action="append", default=[], help="PriceOracle address, repeat for several")
+    parser.add_argument("--lp-oracle", dest="lp_oracle", action="append", default=[], help="LPPriceOracle address, repeat for several")
+    parser.add_argument("--start", type=int, help="first level of a new export, defaults to the confirmed head")
+    parser.add_argument("--until", type=int, help="last level to export, defaults to the confirmed head")
+    parser.add_argument("--confirmations", type=int, default=2, help="blocks below the head that are not exported yet")
+    parser.add_argument("--network", help="settings profile, loads <network>_settings.py")
+    parser.add_argument("--endpoint", help="node RPC, defaults to settings.SHELL")
+    parser.add_argument("--record", help="also save the fetched blocks and scripts to this directory")
+    parser.add_argument("--recorded", help="read the blocks and scripts saved with --record instead of the node")
+    arguments = parser.parse_args()
+    if arguments.network:
+        network_settings.select(arguments.network)
+
+    if arguments.recorded:
+        source = RecordedRpc(arguments.recorded)
+    elif arguments.record:
+        source = RecordingRpc(arguments.endpoint or network_settings.settings.SHELL, arguments.record)
+    else:
+        source = Rpc(arguments.endpoint or network_settings.settings.SHELL)
+
+    started = time.time()
+    store = ColumnStore(arguments.directory, SCHEMA)
+    first = store.state["level"]
+    exporter = Exporter(source, store, arguments.oracle, arguments.lp_oracle, confirmations=arguments.confirmations)
+    last = exporter.sync(arguments.start, arguments.until)
+    print("exported levels {} to {} in {:.1f}s: {}".format(first + 1 if first is not None else arguments.start, last, time.time() - started,
+        ", ".join("{} {} rows".format(name, rows) for name, rows in sorted(store.state["rows"].items()))))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
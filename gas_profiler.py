@@ -0,0 +1,570 @@
+import argparse
+import collections
+import glob
+import json
+import re
+import subprocess
+import sys
+import tempfile
+
+TOKEN = re.compile(r'''
+    (?P<newline>\n)
+  | (?P<space>[ \t\r]+)
+  | (?P<comment>\#[^\n]*)
+  | (?P<block_comment>/\*.*?\*/)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<bytes>0x[0-9a-fA-F]*)
+  | (?P<int>-?[0-9]+)
+  | (?P<annotation>[@:%][^\s;{}()]*)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_.]*)
+  | (?P<punctuation>[{}();])
+''', re.VERBOSE | re.DOTALL)
+
+ENTRYPOINT_COMMENT = re.compile(r'^#\s*==\s*(.+?)\s*==\s*$')
+TRACE_ENTRY = re.compile(r'location: (\d+) \((?:just consumed gas: ([0-9.]+)|remaining gas: ([0-9.]+) units remaining)\)')
+UNKNOWN = "<no statement>"
+
+class Node:
+    """Micheline node of a parsed script. Prims keep the SmartPy entrypoint and statement comment they were emitted for.
+    """
+    def __init__(self, kind, value=None, context=None):
+        self.kind = kind
+        self.value = value
+        self.context = context
+        self.children = []
+        self.location = None
+
+def tokenize(source):
+    """Splits a Michelson script into (kind, text, starts_line) tokens. starts_line is True for the first token of a line, which is
+    how the full line comments SmartPy writes for every statement are told apart from the trailing stack comments.
+    """
+    tokens, position, starts_line = [], 0, True
+    while position < len(source):
+        match = TOKEN.match(source, position)
+        if match is None:
+            raise ValueError("cannot tokenize script at offset {}: {!r}".format(position, source[position:position+20]))
+        kind, text = match.lastgroup, match.group()
+        position = match.end()
+        if kind == "newline":
+            starts_line = True
+        elif kind in ("space", "block_comment", "annotation"):
+            continue
+        else:
+            tokens.append((kind, text, starts_line))
+            starts_line = False
+    return tokens
+
+class Parser:
+    """Parses a Michelson script (as written by SmartPy.sh compile) into Micheline nodes numbered with the canonical locations the
+    octez trace refers to: pre-order, starting at 0 for the toplevel sequence.
+    """
+    def __init__(self, source):
+        self.tokens = tokenize(source)
+        self.index = 0
+        self.entrypoint = "<dispatch>"
+        self.statement = UNKNOWN
+
+    def peek(self):
+        self.skip_comments()
+        return self.tokens[self.index] if self.index < len(self.tokens) else (None, None, False)
+
+    def skip_comments(self):
+        while self.index < len(self.tokens) and self.tokens[self.index][0] == "comment":
+            _, text, starts_line = self.tokens[self.index]
+            if starts_line:
+                entrypoint = ENTRYPOINT_COMMENT.match(text)
+                if entrypoint:
+                    self.entrypoint, self.statement = entrypoint.group(1), UNKNOWN
+                else:
+                    self.statement = text.lstrip("# ").split(" # ")[0].strip() or UNKNOWN
+            self.index += 1
+
+    def take(self, expected=None):
+        kind, text, _ = self.peek()
+        if expected is not None and text != expected:
+            raise ValueError("expected {!r} but found {!r}".format(expected, text))
+        self.index += 1
+        return kind, text
+
+    def parse(self):
+        root = Node("seq")
+        root.children = self.sequence_items(None)
+        number(root, [0])
+        return root
+
+    def sequence_items(self, closing):
+        items = []
+        while True:
+            kind, text, _ = self.peek()
+            if text == closing or kind is None:
+                return items
+            if text == ";":
+                self.take()
+                continue
+            items.append(self.application())
+
+    def application(self):
+        kind, text, _ = self.peek()
+        if kind != "word":
+            return self.atom()
+        self.take()
+        node = Node("prim", text, (self.entrypoint, self.statement))
+        while True:
+            kind, argument, _ = self.peek()
+            if kind is None or argument in (";", "}", ")"):
+                break
+            child = self.atom()
+            node.children.append(child)
+            if text == "view" and len(node.children) == 1 and child.kind == "string":
+                self.entrypoint, self.statement = "view " + child.value.strip('"'), UNKNOWN
+        return node
+
+    def atom(self):
+        kind, text = self.take()
+        if text == "{":
+            # statements and entrypoints end with their block, the code following it belongs to the enclosing statement again
+            context = (self.entrypoint, self.statement)
+            node = Node("seq", "{}", context)
+            node.children = self.sequence_items("}")
+            self.take("}")
+            self.entrypoint, self.statement = context
+            return node
+        if text == "(":
+            node = self.application()
+            self.take(")")
+            return node
+        if kind == "word":
+            return Node("prim", text, (self.entrypoint, self.statement))
+        return Node(kind, text)
+
+def number(node, counter):
+    node.location = counter[0]
+    counter[0] += 1
+    for child in node.children:
+        number(child, counter)
+
+def locations(root):
+    """Returns location -> node for every prim and code block of the script.
+    """
+    index, pending = {}, [root]
+    while pending:
+        node = pending.pop()
+        if node.context is not None:
+            index[node.location] = node
+        pending.extend(node.children)
+    return index
+
+def expression_tokens(source):
+    """Splits a Michelson expression or script into (kind, text, start, end) tokens, annotations kept and spaces dropped.
+    """
+    tokens, position = [], 0
+    while position < len(source):
+        match = TOKEN.match(source, position)
+        if match is None:
+            raise ValueError("cannot tokenize script at offset {}: {!r}".format(position, source[position:position+20]))
+        if match.lastgroup not in ("newline", "space", "block_comment"):
+            tokens.append((match.lastgroup, match.group(), match.start(), match.end()))
+        position = match.end()
+    return tokens
+
+def expression_end(tokens, index):
+    """Index of the token after the expression starting at index: a single token or a balanced (...) or {...} group.
+    """
+    depth = 0
+    while index < len(tokens):
+        text = tokens[index][1]
+        if text in ("{", "("):
+            depth += 1
+        elif text in ("}", ")"):
+            depth -= 1
+        index += 1
+        if depth == 0:
+            return index
+    raise ValueError("unbalanced expression")
+
+def micheline(source):
+    """Parses a Michelson expression (i.e. a storage or a parameter) into Micheline json, annotations kept.
+    """
+    tokens = [token for token in expression_tokens(source) if token[0] != "comment"]
+
+    def application(index):
+        kind, text = tokens[index][:2]
+        if kind != "word":
+            return atom(index)
+        node, index = {"prim": text}, index + 1
+        while index < len(tokens) and tokens[index][1] not in (";", "}", ")"):
+            if tokens[index][0] == "annotation":
+                node.setdefault("annots", []).append(tokens[index][1])
+                index += 1
+            else:
+                argument, index = atom(index)
+                node.setdefault("args", []).append(argument)
+        return node, index
+
+    def atom(index):
+        kind, text = tokens[index][:2]
+        if text == "{":
+            items, index = [], index + 1
+            while tokens[index][1] != "}":
+                if tokens[index][1] == ";":
+                    index += 1
+                    continue
+                item, index = application(index)
+                items.append(item)
+            return items, index + 1
+        if text == "(":
+            node, index = application(index + 1)
+            if tokens[index][1] != ")":
+                raise ValueError("expected ) but found {!r}".format(tokens[index][1]))
+            return node, index + 1
+        if kind == "word":
+            node, index = {"prim": text}, index + 1
+            while index < len(tokens) and tokens[index][0] == "annotation":
+                node.setdefault("annots", []).append(tokens[index][1])
+                index += 1
+            return node, index
+        if kind == "int":
+            return {"int": text}, index + 1
+        if kind == "string":
+            return {"string": json.loads(text)}, index + 1
+        if kind == "bytes":
+            return {"bytes": text[2:]}, index + 1
+        raise ValueError("unexpected {!r}".format(text))
+
+    node, index = application(0)
+    if index != len(tokens):
+        raise ValueError("trailing {!r} after the expression".format(tokens[index][1]))
+    return node
+
+def michelson(node, nested=False):
+    """Writes Micheline json as a Michelson expression, the inverse of micheline.
+    """
+    if isinstance(node, list):
+        return "{" + " ; ".join(michelson(item) for item in node) + "}"
+    if "int" in node:
+        return node["int"]
+    if "string" in node:
+        return json.dumps(node["string"])
+    if "bytes" in node:
+        return "0x" + node["bytes"]
+    parts = [node["prim"]] + node.get("annots", []) + [michelson(argument, nested=True) for argument in node.get("args", [])]
+    return "({})".format(" ".join(parts)) if nested and len(parts) > 1 else " ".join(parts)
+
+def script_sections(source):
+    """Returns the text of the storage type and of every view (name -> (argument type, result type, code block)) of a script.
+    """
+    tokens = [token for token in expression_tokens(source) if token[0] != "comment"]
+    text = lambda first, last: source[tokens[first][2]:tokens[last-1][3]]
+    storage, views, index = None, {}, 0
+    while index < len(tokens):
+        word = tokens[index][1]
+        if word == "storage":
+            end = expression_end(tokens, index + 1)
+            storage = text(index + 1, end)
+        elif word == "view":
+            argument = index + 2
+            result = expression_end(tokens, argument)
+            code = expression_end(tokens, result)
+            end = expression_end(tokens, code)
+            views[json.loads(tokens[index + 1][1])] = (text(argument, result), text(result, code), text(code, end))
+        else:
+            end = expression_end(tokens, index + 1) if word in ("parameter", "code") else index + 1
+        index = end
+    return storage, views
+
+def view_script(source, name):
+    """Script running the onchain view name of a compiled contract as its code, so that run script can trace it. The parameter is
+    the view argument and the storage the contract storage, the result is dropped. The view keeps its SmartPy statement comments,
+    only the few instructions around it are attributed to the wrapper.
+    """
+    storage, views = script_sections(source)
+    if name not in views:
+        raise ValueError("no view {!r} in the script, it has {}".format(name, ", ".join(sorted(views)) or "none"))
+    argument, _, code = views[name]
+    return "\n".join([
+        "parameter {};".format(argument),
+        "storage {};".format(storage),
+        "code",
+        "  {",
+        "    # == view " + name + " ==",
+        "    # view wrapper",
+        "    DUP;",
+        "    CDR;",
+        "    SWAP;",
+        code + ";",
+        "    DROP;",
+        "    NIL operation;",
+        "    PAIR;",
+        "  };",
+    ])
+
+def set_fields(source, storage, overrides):
+    """Returns the storage (Michelson expression) with the fields of overrides (field annotation -> Michelson expression) replaced,
+    whatever the layout SmartPy picked for the storage record.
+    """
+    from utils.reader import storage_fields
+    storage_type = micheline(script_sections(source)[0])
+    value = micheline(storage)
+    found = storage_fields(storage_type, value, set(overrides))
+    missing = set(overrides) - set(found)
+    if missing:
+        raise ValueError("no field {} in the storage type".format(", ".join(sorted(missing))))
+    for name, field in found.items():
+        replacement = micheline(overrides[name])
+        if isinstance(field, list) and isinstance(replacement, list):
+            field[:] = replacement
+        elif isinstance(field, dict) and isinstance(replacement, dict):
+            field.clear()
+            field.update(replacement)
+        else:
+            raise ValueError("cannot replace {} of the storage by {}, write sequences as {{...}}".format(michelson(field), overrides[name]))
+    return michelson(value)
+
+def parse_trace(output):
+    """Returns a list of (location, milligas) from an octez-client --trace-stack output or a trace_code RPC json. Traces reporting
+    the remaining gas are turned into per instruction consumption.
+    """
+    stripped = output.strip()
+    if stripped.startswith("{") or stripped.startswith("["):
+        trace = json.loads(stripped)
+        if isinstance(trace, dict):
+            trace = trace["trace"]
+        entries = [(int(entry["location"]), None, float(entry["gas"])) for entry in trace]
+    else:
+        entries = [(int(location), float(consumed) if consumed else None, float(remaining) if remaining else None) for location, consumed, remaining in TRACE_ENTRY.findall(output)]
+    samples, previous = [], None
+    for location, consumed, remaining in entries:
+        if consumed is None:
+            consumed = 0 if previous is None else max(previous - remaining, 0)
+            previous = remaining
+        samples.append((location, int(round(consumed * 1000))))
+    return samples
+
+def profile(script, samples):
+    """Aggregates the samples by SmartPy entrypoint, statement and Michelson instruction.
+
+    Returns:
+        collections.Counter: (entrypoint, statement, instruction) -> milligas
+    """
+    index = locations(Parser(script).parse())
+    costs = collections.Counter()
+    for location, milligas in samples:
+        node = index.get(location)
+        if node is None:
+            costs[("<unknown>", UNKNOWN, "@{}".format(location))] += milligas
+        else:
+            entrypoint, statement = node.context
+            costs[(entrypoint, statement, node.value)] += milligas
+    return costs
+
+def folded(costs):
+    """Flame graph input (flamegraph.pl, speedscope, inferno): one 'entrypoint;statement;instruction milligas' line per frame.
+    """
+    lines = []
+    for (entrypoint, statement, instruction), milligas in sorted(costs.items()):
+        frames = [frame.replace(";", ",") for frame in (entrypoint, statement, instruction)]
+        lines.append("{} {}".format(";".join(frames), milligas))
+    return "\n".join(lines)
+
+def report(costs, limit):
+    """Human readable table of the most expensive statements.
+    """
+    statements = collections.Counter()
+    for (entrypoint, statement, _), milligas in costs.items():
+        statements[(entrypoint, statement)] += milligas
+    total = sum(statements.values()) or 1
+    lines = ["{:>10} {:>6}  {}".format("gas", "%", "statement")]
+    for (entrypoint, statement), milligas in statements.most_common(limit):
+        lines.append("{:>10.3f} {:>5.1f}%  [{}] {}".format(milligas / 1000, milligas * 100 / total, entrypoint, statement))
+    lines.append("{:>10.3f} total".format(total / 1000))
+    return "\n".join(lines)
+
+def total(costs):
+    return sum(costs.values())
+
+def comparison(baseline, costs):
+    """Per entrypoint gas of the baseline and the profiled script and the difference, i.e. a plain build against its lazy build.
+    """
+    entrypoints = collections.Counter(), collections.Counter()
+    for counter, profiled in zip(entrypoints, (baseline, costs)):
+        for (entrypoint, _, _), milligas in profiled.items():
+            counter[entrypoint] += milligas
+    lines = ["{:>10} {:>10} {:>8}  {}".format("baseline", "gas", "delta", "entrypoint")]
+    for entrypoint in sorted(set(entrypoints[0]) | set(entrypoints[1])):
+        before, after = entrypoints[0][entrypoint], entrypoints[1][entrypoint]
+        lines.append("{:>10.3f} {:>10.3f} {:>+8.3f}  {}".format(before / 1000, after / 1000, (after - before) / 1000, entrypoint))
+    before, after = total(baseline), total(costs)
+    lines.append("{:>10.3f} {:>10.3f} {:>+8.3f}  total ({:+.1f}%)".format(before / 1000, after / 1000, (after - before) / 1000,
+        (after - before) * 100 / (before or 1)))
+    return "\n".join(lines)
+
+def run_script(arguments, script, storage, parameter):
+    """Runs the entrypoint with octez-client (mockup by default, a node with --endpoint) and returns the trace output.
+    """
+    command = [arguments.client]
+    if arguments.endpoint:
+        command += ["--endpoint", arguments.endpoint]
+    else:
+        command += ["--mode", "mockup", "--base-dir", arguments.base_dir or tempfile.mkdtemp(prefix="gas_profiler_")]
+    command += ["run", "script", script, "on", "storage", storage, "and", "input", parameter, "--trace-stack"]
+    if arguments.entrypoint and not arguments.view:
+        command += ["--entrypoint", arguments.entrypoint]
+    for option in ("source", "payer", "now", "self_address"):
+        value = getattr(arguments, option)
+        if value:
+            command += ["--" + option.replace("_", "-"), value]
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    if process.returncode != 0:
+        raise RuntimeError("octez-client failed:\n" + process.stdout)
+    return process.stdout
+
+def resolve(path):
+    """The single file matching path, which may be a glob (i.e. out/PriceOracle/step_000_cont_*_contract.tz).
+    """
+    matches = sorted(glob.glob(path))
+    if len(matches) != 1:
+        raise ValueError("{} matches {} files".format(path, len(matches)))
+    return matches[0]
+
+def load(value):
+    """Option value, read from the file if it is written @path.
+    """
+    if value is None or not value.startswith("@"):
+        return value
+    with open(resolve(value[1:])) as value_file:
+        return value_file.read().strip()
+
+def overrides(values):
+    """Storage overrides as field -> Michelson expression, from a dict or from FIELD=EXPRESSION strings.
+    """
+    if isinstance(values, dict):
+        return {name: load(value) for name, value in values.items()}
+    return {name: load(value) for name, value in (item.split("=", 1) for item in values or [])}
+
+def measure(arguments, script, storage, parameter, trace=None):
+    """Profiles one call of the compiled script with the view, storage overrides and call options of arguments. A saved trace
+    is profiled instead of running the script if trace is given.
+
+    Returns:
+        collections.Counter: see profile
+    """
+    with open(resolve(script)) as script_file:
+        source = script_file.read()
+    if trace:
+        with open(trace) as trace_file:
+            output = trace_file.read()
+    else:
+        if storage is None or parameter is None:
+            raise ValueError("a storage and an input are required unless a trace is given")
+        storage = load(storage)
+        if arguments.set:
+            storage = set_fields(source, storage, overrides(arguments.set))
+        if arguments.view:
+            with tempfile.NamedTemporaryFile("w", suffix=".tz") as view_file:
+                view_file.write(view_script(source, arguments.view))
+                view_file.flush()
+                output = run_script(arguments, view_file.name, storage, load(parameter))
+        else:
+            output = run_script(arguments, resolve(script), storage, load(parameter))
+    if arguments.view:
+        source = view_script(source, arguments.view)
+    return profile(source, parse_trace(output))
+
+CASE_OPTIONS = {"name": None, "script": None, "storage": None, "input": None, "entrypoint": None, "view": None, "set": {},
+    "source": None, "payer": None, "now": None, "self_address": None, "trace": None, "baseline": None}
+
+def suite(arguments, cases):
+    """Measures every case (a dict of CASE_OPTIONS, i.e. read from a gas_benchmarks.json) and returns a markdown table of the
+    total gas, with the difference to the case named baseline. Cases that fail are listed with their error.
+
+    Returns:
+        tuple: the table and the number of failed cases
+    """
+    totals, failed = {}, 0
+    lines = ["| case | gas | baseline | difference |", "| --- | ---: | --- | ---: |"]
+    for case in cases:
+        unknown = set(case) - set(CASE_OPTIONS)
+        if unknown:
+            raise ValueError("unknown options {} in case {}".format(", ".join(sorted(unknown)), case.get("name")))
+        options = argparse.Namespace(client=arguments.client, endpoint=arguments.endpoint, base_dir=arguments.base_dir,
+            **dict(CASE_OPTIONS, **case))
+        try:
+            totals[options.name] = total(measure(options, options.script, options.storage, options.input, options.trace))
+        except (OSError, RuntimeError, ValueError) as error:
+            failed += 1
+            lines.append("| {} | failed: {} | | |".format(options.name, str(error).strip().splitlines()[0]))
+            continue
+        gas = totals[options.name]
+        if options.baseline in totals:
+            baseline = totals[options.baseline]
+            lines.append("| {} | {:.3f} | {} | {:+.3f} ({:+.1f}%) |".format(options.name, gas / 1000, options.baseline,
+                (gas - baseline) / 1000, (gas - baseline) * 100 / (baseline or 1)))
+        else:
+            lines.append("| {} | {:.3f} | | |".format(options.name, gas / 1000))
+    return "\n".join(lines), failed
+
+def main():
+    """This script breaks the gas of a single call of a compiled contract down by Michelson instruction and maps it back to the SmartPy
+    statements (the comments SmartPy.sh compile writes into the .tz). It writes a flame graph compatible profile.
+
+    Example (fulfill of the PriceOracle):
+        python3 gas_profiler.py out/PriceOracle/step_000_cont_1_contract.tz --entrypoint fulfill --storage "$(cat storage.tz)" \\
+            --input "$(cat fulfill.tz)" --payer tz3S9uYxmGahffYfcYURijrCGm1VBqiH4mPe --now 18000 --folded fulfill.folded
+        flamegraph.pl fulfill.folded > fulfill.svg
+
+    --storage and --input take a Michelson expression or @file. --set FIELD=EXPRESSION replaces a field of the storage by its
+    annotation, i.e. --set last_epoch=20. --view NAME runs an onchain view instead of an entrypoint, the input is the view argument.
+
+    With --compare the same call is also run on a baseline build and the gas of both is printed side by side, i.e. the plain
+    PriceOracle as baseline of the LazyPriceOracle (lazy builds need their compiled storage, pass it with --compare-storage).
+
+    With --suite the cases of a benchmark file (i.e. gas_benchmarks.json) are measured and printed as a markdown table.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("script", nargs="?", help="compiled contract (.tz) written by SmartPy.sh compile, may be a glob")
+    parser.add_argument("--storage", help="storage as Michelson expression or @file (big_maps as literal maps)")
+    parser.add_argument("--input", help="parameter (view argument with --view) as Michelson expression or @file")
+    parser.add_argument("--entrypoint", help="entrypoint the input is for")
+    parser.add_argument("--view", help="onchain view to run instead of an entrypoint")
+    parser.add_argument("--set", action="append", default=[], help="FIELD=EXPRESSION replacing a storage field, repeat for several")
+    parser.add_argument("--source", help="sp.sender of the call (octez-client names the sender source)")
+    parser.add_argument("--payer", help="sp.source of the call")
+    parser.add_argument("--now", help="sp.now of the call")
+    parser.add_argument("--self-address", dest="self_address", help="sp.self_address of the call (needed for views on deployed contracts)")
+    parser.add_argument("--endpoint", help="run against this node instead of a local mockup")
+    parser.add_argument("--base-dir", dest="base_dir", help="octez-client mockup base dir, a temporary one is created if omitted")
+    parser.add_argument("--client", default="octez-client", help="octez-client executable")
+    parser.add_argument("--trace", help="use this saved --trace-stack output or trace_code RPC json instead of running the script")
+    parser.add_argument("--folded", help="write the flame graph profile to this file")
+    parser.add_argument("--top", type=int, default=25, help="number of statements in the report")
+    parser.add_argument("--compare", help="baseline compiled contract (.tz) to run the same call on")
+    parser.add_argument("--compare-storage", dest="compare_storage", help="storage of the baseline, defaults to --storage")
+    parser.add_argument("--compare-input", dest="compare_input", help="parameter of the baseline, defaults to --input")
+    parser.add_argument("--compare-trace", dest="compare_trace", help="saved trace of the baseline instead of running it")
+    parser.add_argument("--suite", help="benchmark file ({\"cases\": [...]}) to measure instead of a single call")
+    arguments = parser.parse_args()
+
+    if arguments.suite:
+        with open(arguments.suite) as suite_file:
+            table, failed = suite(arguments, json.load(suite_file)["cases"])
+        print(table)
+        return 1 if failed else 0
+    if arguments.script is None:
+        parser.error("the script is required unless --suite is given")
+    if not arguments.trace and (arguments.storage is None or arguments.input is None):
+        parser.error("--storage and --input are required unless --trace is given")
+
+    costs = measure(arguments, arguments.script, arguments.storage, arguments.input, arguments.trace)
+    print(report(costs, arguments.top))
+    if arguments.compare:
+        baseline = measure(arguments, arguments.compare, arguments.compare_storage or arguments.storage,
+            arguments.compare_input or arguments.input, arguments.compare_trace)
+        print()
+        print(comparison(baseline, costs))
+    if arguments.folded:
+        with open(arguments.folded, "w") as folded_file:
+            folded_file.write(folded(costs) + "\n")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
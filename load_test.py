@@ -0,0 +1,311 @@
+from pytezos import pytezos, Key
+from pytezos.rpc.errors import RpcError
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import random
+import re
+import subprocess
+import threading
+import time
+
+import oracles.errors as Errors
+from utils.deployment_utils import Step, Checkpoint, Deployer
+from utils.limits import LimitTuner, usage
+from utils.payload import pack_response
+from utils.slots import default_slot
+
+FLEXTESA_ALICE = "edsk3QoqBuvdamxouPhin7swCvkQNgq4jP5KZPbwWNnwdZpSpJiEbq"
+ERROR_NAMES = {value: name for name, value in vars(Errors).items() if name.isupper()}
+FAILWITH_INT = re.compile(r"'with': \{'int': '(\d+)'\}")
+PRICES = (3500000, 2100000, 38415000000)
+BATCH_SIZE = 50
+
+def percentile(values, fraction):
+    """Nearest rank percentile of a list, None if it is empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered)-1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def error_name(errors):
+    """Maps the errors of a failed operation to the oracles/errors.py name of the failwith code, or to the shortened error id
+    (e.g. a missing job in JobScheduler.fulfill fails without a code).
+    """
+    for error in errors:
+        code = error.get("with", {}).get("int")
+        if code is not None:
+            return ERROR_NAMES.get(int(code), code)
+    return errors[-1]["id"].split(".")[-1] if errors else "unknown"
+
+def account(index, role):
+    """Deterministic ed25519 key of the index-th executor or consumer, so reruns against the same sandbox reuse the accounts and
+    the checkpointed contracts.
+    """
+    return Key.from_secret_exponent(hashlib.sha256("load-test-{}-{}".format(role, index).encode()).digest())
+
+class Recorder:
+    """Thread safe record of every operation group the fleet sends. The block watcher fills in the inclusion time, status
+    and gas.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.operations = {}
+        self.rejected = []
+
+    def sent(self, kind, operation_hash):
+        with self.lock:
+            self.operations[operation_hash] = {"kind": kind, "sent": time.time(), "included": None}
+
+    def reject(self, kind, error):
+        """Operations that failed the simulation or the injection, they never reach a block.
+        """
+        match = FAILWITH_INT.search(str(error))
+        name = ERROR_NAMES.get(int(match.group(1)), match.group(1)) if match else type(error).__name__
+        with self.lock:
+            self.rejected.append({"kind": kind, "error": name})
+
+    def include(self, operation_group, seen):
+        with self.lock:
+            record = self.operations.get(operation_group["hash"])
+            if record is None or record["included"] is not None:
+                return
+            errors, milligas = [], 0
+            for content in operation_group["contents"]:
+                metadata = content["metadata"]
+                for result in [metadata["operation_result"]] + [internal["result"] for internal in metadata.get("internal_operation_results", [])]:
+                    errors.extend(result.get("errors", []))
+                milligas += usage(content)[0]
+            record.update(included=seen, status="applied" if not errors else "failed", milligas=milligas,
+                error=error_name(errors) if errors else None)
+
+    def pending(self):
+        with self.lock:
+            return sum(1 for record in self.operations.values() if record["included"] is None)
+
+def watch(client, recorder, stop, interval=0.5):
+    """Follows the head and hands the manager operations of every new block to the recorder.
+    """
+    level = client.shell.head.header()["level"]
+    while not stop.is_set():
+        head = client.shell.head.header()["level"]
+        while level < head:
+            level += 1
+            seen = time.time()
+            for operation_group in client.shell.blocks[level].operations.managers():
+                recorder.include(operation_group, seen)
+        time.sleep(interval)
+
+def send(tuner, recorder, kind, operation):
+    try:
+        operation_group = tuner.send(operation)
+        recorder.sent(kind, operation_group.hash())
+    except RpcError as error:
+        recorder.reject(kind, error)
+
+class Sandbox:
+    """Starts a flextesa sandbox in docker for the duration of the test (or does nothing if image is None, e.g. for an already
+    running sandbox or a mockup endpoint).
+    """
+    def __init__(self, image, box, port, block_time):
+        self.image = image
+        self.box = box
+        self.port = port
+        self.block_time = block_time
+        self.name = "oracles-load-test-{}".format(port)
+
+    def __enter__(self):
+        if self.image is not None:
+            subprocess.run(["docker", "run", "--rm", "--detach", "--name", self.name, "--env", "block_time={}".format(self.block_time),
+                "--publish", "{}:20000".format(self.port), self.image, self.box, "start"], check=True)
+            client = pytezos.using(shell="http://localhost:{}".format(self.port))
+            deadline = time.time() + 120
+            while True:
+                try:
+                    if client.shell.head.header()["level"] > 1:
+                        break
+                except Exception:
+                    if time.time() > deadline:
+                        raise
+                time.sleep(1)
+        return self
+
+    def __exit__(self, *exception):
+        if self.image is not None:
+            subprocess.run(["docker", "stop", self.name], check=False)
+
+def plan(administrator, executors, feeds, consumers, target, threshold):
+    """Declarative plan of the load test contracts: the scheduler, one oracle per feed with its legacy and relative proxy and one
+    Viewer (price callback) per consumer.
+    """
+    steps = [Step("JobScheduler", "JobScheduler", {'admin': administrator, 'proposed_admin': administrator})]
+    for feed in range(feeds):
+        steps.append(Step("oracle_{}".format(feed), target, {
+            'administrator': administrator,
+            'response_threshold': threshold,
+            'valid_script': feed_script(feed),
+            'valid_sources': [executor.public_key_hash() for executor in executors]
+        }))
+        steps.append(Step("legacy_proxy_{}".format(feed), "LegacyProxyOracle",
+            lambda addresses, feed=feed: {'oracle': addresses["oracle_{}".format(feed)], 'symbol': "BTC"}))
+        steps.append(Step("relative_proxy_{}".format(feed), "RelativeProxyOracle",
+            lambda addresses, feed=feed: {'oracle': addresses["oracle_{}".format(feed)], 'base_symbol': "BTC", 'quote_symbol': "XTZ"}))
+    for consumer in range(consumers):
+        steps.append(Step("viewer_{}".format(consumer), "Viewer", {}))
+    return steps
+
+def feed_script(feed):
+    return "ipfs://load-test/feed/{}".format(feed).encode()
+
+def in_batches(operations, size=BATCH_SIZE):
+    for start in range(0, len(operations), size):
+        yield operations[start:start+size]
+
+def setup(admin_client, tuner, arguments, executors, consumers):
+    """Funds and reveals the accounts, originates the plan, publishes one job per executor and feed and lets every executor ack its
+    jobs.
+    """
+    administrator = admin_client.key.public_key_hash()
+    accounts = executors + consumers
+    transfers = [admin_client.transaction(destination=key.public_key_hash(), amount=arguments.funding) for key in accounts]
+    for batch in in_batches(transfers):
+        tuner.send(admin_client.bulk(*batch), min_confirmations=1)
+    for key in accounts:
+        client = pytezos.using(shell=arguments.endpoint, key=key)
+        if client.shell.contracts[key.public_key_hash()].manager_key() is None:
+            tuner.send(client.reveal(), min_confirmations=1)
+
+    deployer = Deployer(admin_client, Checkpoint(arguments.checkpoint), output=arguments.output, tuner=tuner)
+    addresses = deployer.run(plan(administrator, executors, arguments.feeds, len(consumers), arguments.oracle_target, arguments.threshold))
+
+    scheduler = admin_client.contract(addresses["JobScheduler"])
+    publishes = [scheduler.publish({"executor": executor.public_key_hash(), "script": feed_script(feed), "start": 0, "end": 2**40,
+        "interval": arguments.epoch_interval, "fee": 0, "contract": addresses["oracle_{}".format(feed)], "slot": default_slot()})
+        for executor in executors for feed in range(arguments.feeds)]
+    for batch in in_batches(publishes):
+        tuner.send(admin_client.bulk(*batch), min_confirmations=1)
+    for key in executors:
+        client = pytezos.using(shell=arguments.endpoint, key=key)
+        executor_scheduler = client.contract(addresses["JobScheduler"])
+        tuner.send(client.bulk(*[executor_scheduler.ack(feed_script(feed)) for feed in range(arguments.feeds)]), min_confirmations=1)
+    return addresses
+
+def fulfill(executor, scheduler, feeds, now, epoch_interval):
+    """One executor submits all feeds in a single batch (one manager operation per source and block) with prices within the
+    oracle's precision margin of each other.
+    """
+    timestamp = now - now % epoch_interval
+    calls = []
+    for feed in range(feeds):
+        prices = [int(price * (1 + random.uniform(-0.0003, 0.0003))) for price in PRICES]
+        calls.append(scheduler.fulfill({"script": feed_script(feed), "payload": pack_response(timestamp, *prices)}))
+    return executor.bulk(*calls)
+
+def read(consumer, proxies, callback):
+    return consumer.bulk(*[proxy.get_price(callback) for proxy in proxies])
+
+def report(recorder, duration):
+    kinds = sorted({record["kind"] for record in recorder.operations.values()} | {record["kind"] for record in recorder.rejected})
+    summary = {"duration": round(duration, 1), "kinds": {}}
+    for kind in kinds:
+        records = [record for record in recorder.operations.values() if record["kind"] == kind]
+        included = [record for record in records if record["included"] is not None]
+        applied = [record for record in included if record["status"] == "applied"]
+        latencies = [record["included"] - record["sent"] for record in included]
+        gas = [record["milligas"] / 1000 for record in applied]
+        failures = {}
+        for record in [record for record in included if record["status"] == "failed"] + [record for record in recorder.rejected if record["kind"] == kind]:
+            failures[record["error"]] = failures.get(record["error"], 0) + 1
+        summary["kinds"][kind] = {
+            "sent": len(records),
+            "included": len(included),
+            "applied": len(applied),
+            "not_included": len(records) - len(included),
+            "throughput_per_minute": round(len(applied) * 60 / duration, 2) if duration else None,
+            "latency_seconds": {name: percentile(latencies, fraction) for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1))},
+            "gas": {name: percentile(gas, fraction) for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1))},
+            "failures": failures
+        }
+    return summary
+
+def main():
+    """This script load tests the fulfill pipeline on a sandbox: a fleet of executors submits every feed through JobScheduler.fulfill
+    at the start of each epoch while consumers read through the LegacyProxyOracle and RelativeProxyOracle of every feed. It reports
+    throughput, inclusion latency, failures by oracles/errors.py code and gas percentiles per operation kind.
+
+    Example (flextesa in docker, 30 second epochs):
+        SmartPy.sh compile compiler.py out
+        python3 load_test.py --start-sandbox --oracle-target HighFrequencyPriceOracle --epoch-interval 30 --executors 20 --feeds 10
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", default="http://localhost:20000", help="sandbox node RPC")
+    parser.add_argument("--start-sandbox", dest="start_sandbox", action="store_true", help="start a flextesa sandbox in docker")
+    parser.add_argument("--image", default="oxheadalpha/flextesa:latest", help="flextesa docker image")
+    parser.add_argument("--box", default="limabox", help="flextesa box script")
+    parser.add_argument("--block-time", dest="block_time", type=int, default=5, help="sandbox block time in seconds")
+    parser.add_argument("--funder-key", dest="funder_key", default=FLEXTESA_ALICE, help="key of a funded sandbox account, also the admin")
+    parser.add_argument("--executors", type=int, default=20)
+    parser.add_argument("--feeds", type=int, default=10, help="one oracle with its own script and proxies per feed")
+    parser.add_argument("--consumers", type=int, default=5)
+    parser.add_argument("--threshold", type=int, default=3, help="response_threshold of the oracles")
+    parser.add_argument("--oracle-target", dest="oracle_target", default="PriceOracle", help="compilation target of the oracles")
+    parser.add_argument("--epoch-interval", dest="epoch_interval", type=int, default=900, help="epoch interval the target is compiled with")
+    parser.add_argument("--rounds", type=int, default=3, help="number of epochs to run")
+    parser.add_argument("--offset", type=float, default=2, help="seconds after the epoch start the fleet submits")
+    parser.add_argument("--funding", type=int, default=100*10**6, help="mutez sent to every executor and consumer")
+    parser.add_argument("--output", default="out", help="SmartPy compile output directory")
+    parser.add_argument("--checkpoint", default="load_test.checkpoint.json", help="deployment checkpoint, reused on the same sandbox")
+    parser.add_argument("--report", help="also write the report as json to this file")
+    arguments = parser.parse_args()
+
+    port = int(arguments.endpoint.rsplit(":", 1)[-1].strip("/"))
+    if arguments.start_sandbox and os.path.exists(arguments.checkpoint):
+        # a fresh sandbox has the same chain id but none of the checkpointed contracts
+        os.remove(arguments.checkpoint)
+    with Sandbox(arguments.image if arguments.start_sandbox else None, arguments.box, port, arguments.block_time):
+        admin_client = pytezos.using(shell=arguments.endpoint, key=arguments.funder_key)
+        tuner = LimitTuner(admin_client)
+        executor_keys = [account(index, "executor") for index in range(arguments.executors)]
+        consumer_keys = [account(index, "consumer") for index in range(arguments.consumers)]
+        addresses = setup(admin_client, tuner, arguments, executor_keys, consumer_keys)
+
+        executors = [pytezos.using(shell=arguments.endpoint, key=key) for key in executor_keys]
+        schedulers = [executor.contract(addresses["JobScheduler"]) for executor in executors]
+        consumers = [pytezos.using(shell=arguments.endpoint, key=key) for key in consumer_keys]
+        proxies = [[consumer.contract(addresses["{}_{}".format(kind, feed)]) for feed in range(arguments.feeds) for kind in ("legacy_proxy", "relative_proxy")]
+            for consumer in consumers]
+        callbacks = ["{}%set_nat".format(addresses["viewer_{}".format(index)]) for index in range(arguments.consumers)]
+
+        recorder, stop = Recorder(), threading.Event()
+        watcher = threading.Thread(target=watch, args=(admin_client, recorder, stop), daemon=True)
+        watcher.start()
+        started = time.time()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=arguments.executors + arguments.consumers) as pool:
+            for round_index in range(arguments.rounds):
+                now = time.time()
+                time.sleep(arguments.epoch_interval - now % arguments.epoch_interval + arguments.offset)
+                now = int(time.time())
+                print("round {} at {}".format(round_index, now))
+                futures = [pool.submit(send, tuner, recorder, "fulfill", fulfill(executor, scheduler, arguments.feeds, now, arguments.epoch_interval))
+                    for executor, scheduler in zip(executors, schedulers)]
+                futures += [pool.submit(send, tuner, recorder, "read", read(consumer, consumer_proxies, callback))
+                    for consumer, consumer_proxies, callback in zip(consumers, proxies, callbacks)]
+                concurrent.futures.wait(futures)
+
+        deadline = time.time() + arguments.epoch_interval
+        while recorder.pending() and time.time() < deadline:
+            time.sleep(1)
+        stop.set()
+        watcher.join()
+
+    summary = report(recorder, time.time() - started)
+    print(json.dumps(summary, indent=2))
+    if arguments.report:
+        with open(arguments.report, "w") as report_file:
+            json.dump(summary, report_file, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import argparse
+import csv
+import json
+import sys
+import time
+
+import oracles.constants as Constants
+
+EPOCH_INTERVAL = Constants.ORACLE_EPOCH_INTERVAL
+
+def ratio_of(value_token_balance, lpt_total_supply):
+    """value_token_per_lpt_ratio of LPPriceOracle.internal_get_price before the clamp.
+    """
+    return value_token_balance*Constants.PRICE_PRECISION // lpt_total_supply
+
+def clamp(ratio, new_ratio, elapsed):
+    """Same integer math as LPPriceOracle.internal_get_price: the ratio moves at most (ratio>>5) per ORACLE_EPOCH_INTERVAL, scaled
+    by the seconds elapsed since the last update. Returns (clamped ratio, saturated).
+    """
+    if ratio == 0:
+        return new_ratio, False
+    # called once per replayed read, so the min/max of the contract are spelled out as comparisons
+    max_difference = (ratio>>5)*(elapsed if elapsed < EPOCH_INTERVAL else EPOCH_INTERVAL)//EPOCH_INTERVAL
+    if new_ratio > ratio + max_difference:
+        return ratio + max_difference, True
+    if new_ratio < ratio - max_difference:
+        return ratio - max_difference, True
+    return new_ratio, False
+
+def price_of(ratio, value_token_price, value_token_decimals, requires_flip):
+    """Price the LPPriceOracle sends to the callback.
+    """
+    if requires_flip:
+        return (Constants.PRICE_PRECISION**3 * 10**value_token_decimals)//(value_token_price*ratio*2)
+    return (value_token_price*ratio*2)//(Constants.PRICE_PRECISION * 10**value_token_decimals)
+
+def load_series(path, columns):
+    """Reads a csv with a header into a list of int tuples of columns, sorted by the first column (the timestamp).
+    """
+    with open(path, newline="") as series_file:
+        header = next(csv.reader(series_file))
+        indices = [header.index(column) for column in columns]
+        body = series_file.read()
+    try:
+        # plain numeric csv: one int conversion over the whole file instead of a csv row at a time
+        values = list(map(int, body.replace(",", " ").split()))
+        if len(values) % len(header):
+            raise ValueError("rows of different width")
+        rows = list(zip(*[values[index::len(header)] for index in indices]))
+    except ValueError:
+        rows = [tuple(int(row[index]) for index in indices) for row in csv.reader(body.splitlines()) if row]
+    # recorded series are usually in order already, sorting is only paid if they are not
+    timestamps = [row[0] for row in rows]
+    if timestamps != sorted(timestamps):
+        rows.sort()
+    return rows
+
+def replay(pool, prices, reads):
+    """Replays the get_price calls at the read timestamps against the pool state (timestamp, value_token_balance,
+    lpt_total_supply) and value token price (timestamp, price) series, both as of the last record before or at the read.
+
+    The clamp state carries from one call to the next, so the replay is a single pass over the reads with exact integer math.
+
+    Yields:
+        tuple: (timestamp, value token price, unclamped ratio, clamped ratio, saturated)
+    """
+    ratio, last_update = 0, 0
+    pool_index, price_index = -1, -1
+    pool_last, prices_last = len(pool) - 1, len(prices) - 1
+    new_ratio, balance_supply = None, None
+    for timestamp in reads:
+        while pool_index < pool_last and pool[pool_index + 1][0] <= timestamp:
+            pool_index += 1
+        while price_index < prices_last and prices[price_index + 1][0] <= timestamp:
+            price_index += 1
+        if pool_index < 0 or price_index < 0:
+            continue
+        # the unclamped ratio only changes with the pool row
+        if pool[pool_index] is not balance_supply:
+            balance_supply = pool[pool_index]
+            new_ratio = ratio_of(balance_supply[1], balance_supply[2])
+        ratio, saturated = clamp(ratio, new_ratio, max(timestamp - last_update, 0))
+        last_update = timestamp
+        yield timestamp, prices[price_index][1], new_ratio, ratio, saturated
+
+def percentile(ordered, fraction):
+    """Nearest rank percentile of a sorted list, None if it is empty.
+    """
+    if not ordered:
+        return None
+    return ordered[min(len(ordered)-1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def analyse(steps, value_token_decimals, requires_flip):
+    """Tracking error (basis points between the clamped and the unclamped price), clamp saturation time (a saturated read serves
+    the clamped value until the next read) and lag (duration of the saturated episodes until the ratio caught up).
+    """
+    errors, lags = [], []
+    saturated_seconds, total_seconds = 0, 0
+    previous, episode_start = None, None
+    for step in steps:
+        timestamp, value_token_price, new_ratio, ratio, saturated = step
+        if previous is not None:
+            total_seconds += timestamp - previous[0]
+            if previous[4]:
+                saturated_seconds += timestamp - previous[0]
+        if saturated and episode_start is None:
+            episode_start = timestamp
+        elif not saturated and episode_start is not None:
+            lags.append(timestamp - episode_start)
+            episode_start = None
+        if ratio == new_ratio:
+            # served the unclamped price
+            errors.append(0.0)
+        else:
+            served = price_of(ratio, value_token_price, value_token_decimals, requires_flip)
+            exact = price_of(new_ratio, value_token_price, value_token_decimals, requires_flip)
+            errors.append(abs(served - exact) * 10000 / exact if exact else 0)
+        previous = step
+    errors.sort()
+    lags.sort()
+    return {
+        "reads": len(errors),
+        "replayed_seconds": total_seconds,
+        "tracking_error_bps": {
+            "mean": sum(errors) / len(errors) if errors else None,
+            "p50": percentile(errors, 0.5),
+            "p95": percentile(errors, 0.95),
+            "p99": percentile(errors, 0.99),
+            "max": errors[-1] if errors else None
+        },
+        "saturated_seconds": saturated_seconds,
+        "saturated_share": saturated_seconds / total_seconds if total_seconds else None,
+        "saturated_episodes": len(lags),
+        "unfinished_episode_seconds": previous[0] - episode_start if episode_start is not None else 0,
+        "lag_seconds": {"p50": percentile(lags, 0.5), "p95": percentile(lags, 0.95), "max": lags[-1] if lags else None}
+    }
+
+def main():
+    """This script backtests the time proportional ratio clamp of the LPPriceOracle on recorded data with the contract's integer math.
+
+    Inputs are csv files with a header:
+        pool:   timestamp,value_token_balance,lpt_total_supply   (one row per change of the pool)
+        prices: timestamp,price                                  (value token oracle price, i.e. get_price of the PriceOracle)
+        reads:  timestamp                                        (get_price calls, optional, see --read-interval)
+
+    Example:
+        python3 lp_backtest.py pool.csv prices.csv --decimals 8 --reads reads.csv --output steps.csv
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pool", help="pool balance and total supply series")
+    parser.add_argument("prices", help="value token price series")
+    parser.add_argument("--reads", help="timestamps of the get_price calls")
+    parser.add_argument("--read-interval", dest="read_interval", type=int, default=Constants.ORACLE_EPOCH_INTERVAL, help="seconds between get_price calls if --reads is omitted")
+    parser.add_argument("--decimals", type=int, default=8, help="value_token_decimals of the LPPriceOracle")
+    parser.add_argument("--unflipped", action="store_true", help="replay an LPPriceOracle built with requires_flip=False")
+    parser.add_argument("--output", help="write every replayed read as csv to this file")
+    arguments = parser.parse_args()
+
+    started = time.time()
+    pool = load_series(arguments.pool, ("timestamp", "value_token_balance", "lpt_total_supply"))
+    prices = load_series(arguments.prices, ("timestamp", "price"))
+    if arguments.reads:
+        reads = [row[0] for row in load_series(arguments.reads, ("timestamp",))]
+    else:
+        reads = range(pool[0][0], pool[-1][0] + 1, arguments.read_interval)
+
+    steps = list(replay(pool, prices, reads))
+    summary = analyse(steps, arguments.decimals, not arguments.unflipped)
+    summary["runtime_seconds"] = round(time.time() - started, 3)
+    print(json.dumps(summary, indent=2))
+
+    if arguments.output:
+        with open(arguments.output, "w", newline="") as output_file:
+            writer = csv.writer(output_file)
+            writer.writerow(("timestamp", "value_token_price", "unclamped_ratio", "ratio", "saturated"))
+            writer.writerows(steps)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
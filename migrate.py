@@ -0,0 +1,105 @@
+import argparse
+import json
+import sys
+import time
+
+import settings as network_settings
+
+def snapshot_command(arguments):
+    from utils.migration import snapshot
+    from utils.rpc import Rpc, Tzkt
+    state = snapshot(Rpc(arguments.endpoint or network_settings.settings.SHELL), Tzkt(arguments.tzkt), arguments.contract, arguments.level)
+    with open(arguments.snapshot, "w") as snapshot_file:
+        json.dump(state, snapshot_file)
+    print("{} at level {}:".format(state["contract"], state["level"]))
+    for name, value in state["fields"].items():
+        print("  {:<32} {}".format(name, "{} entries".format(len(value)) if isinstance(value, list) else "value"))
+    return 0
+
+def apply(arguments, client, administrator=None):
+    from pytezos.michelson.parse import michelson_to_micheline
+    from utils.deployment_utils import Step, Checkpoint, Deployer, artifact
+    from utils.migration import MIGRATIONS, Migrator, plan, storage_section, verify
+
+    with open(arguments.snapshot) as snapshot_file:
+        state = json.load(snapshot_file)
+    with open(artifact(arguments.target, arguments.output)) as code_file:
+        code = michelson_to_micheline(code_file.read())
+    migration = MIGRATIONS[arguments.kind]
+    storage, replays, expected = plan(state, migration, code, administrator)
+    signer = client.key.public_key_hash()
+    if administrator is None and storage.get(migration.admin[0], signer) != signer:
+        raise ValueError("the replays have to be signed by the migrated admin {}, not {}".format(storage[migration.admin[0]], signer))
+    print("{} inlined fields, {} replayed calls".format(len(storage), len(replays)))
+
+    started = time.time()
+    deployer = Deployer(client, Checkpoint(arguments.checkpoint), output=arguments.output, timeout=arguments.timeout)
+    address = deployer.run([Step(arguments.name, arguments.target, storage, compiled_storage=arguments.compiled_storage)])[arguments.name]
+    batches = Migrator(deployer, batch_size=arguments.batch_size).replay(arguments.name, address, replays)
+    print("migrated to {} in {:.0f}s, {} replay batches sent".format(address, time.time() - started, batches))
+
+    mismatches = verify(client, address, storage_section(code), expected)
+    for name, key in mismatches:
+        print("mismatch: {}{}".format(name, "" if key is None else "[{!r}]".format(key)))
+    return 1 if mismatches else 0
+
+def apply_command(arguments):
+    from pytezos import pytezos
+    if not arguments.sandbox:
+        settings = network_settings.settings
+        return apply(arguments, pytezos.using(key=settings.ADMIN_KEY, shell=arguments.endpoint or settings.SHELL))
+    from load_test import Sandbox, FLEXTESA_ALICE
+    with Sandbox(arguments.image, arguments.box, arguments.port, arguments.block_time):
+        client = pytezos.using(key=FLEXTESA_ALICE, shell="http://localhost:{}".format(arguments.port))
+        return apply(arguments, client, administrator=client.key.public_key_hash())
+
+def main():
+    """This script migrates the state of a deployed PriceOracle or JobScheduler to a new version of the contract.
+
+    snapshot reads the storage at one level, big_maps included (all keys read in bulk from TzKT), into a json file. apply
+    originates the new target with the snapshot fields it has with the same type, inlines as many big_map entries as fit in the
+    origination and replays the rest as batched admin calls (i.e. JobScheduler.publish, 50 per operation), then checks the new
+    storage against the snapshot. Originations and batches are checkpointed, rerun apply to continue an interrupted migration.
+
+    Rehearse on a flextesa sandbox first (the sandbox account becomes the admin):
+        python3 migrate.py snapshot KT1... scheduler.json
+        python3 migrate.py apply scheduler.json scheduler JobScheduler --sandbox --checkpoint rehearsal.checkpoint.json
+        python3 migrate.py apply scheduler.json scheduler JobScheduler
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--network", help="settings profile, loads <network>_settings.py")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="save the storage of a deployed contract")
+    snapshot_parser.add_argument("contract", help="address of the contract to migrate")
+    snapshot_parser.add_argument("snapshot", help="json file to write")
+    snapshot_parser.add_argument("--level", type=int, help="block level of the snapshot, defaults to the head")
+    snapshot_parser.add_argument("--endpoint", help="node RPC, defaults to settings.SHELL")
+    snapshot_parser.add_argument("--tzkt", default="https://api.tzkt.io", help="TzKT API of the network")
+    snapshot_parser.set_defaults(handler=snapshot_command)
+
+    apply_parser = subparsers.add_parser("apply", help="originate the new contract from a snapshot and replay what did not fit")
+    apply_parser.add_argument("snapshot", help="json file written by snapshot")
+    apply_parser.add_argument("kind", choices=["scheduler", "oracle"], help="contract family, selects the replays")
+    apply_parser.add_argument("target", help="compilation target of the new contract, i.e. JobScheduler or MedianPriceOracle")
+    apply_parser.add_argument("--name", default="migrated", help="step name in the checkpoint")
+    apply_parser.add_argument("--checkpoint", default="migration.checkpoint.json", help="deployment state file, use a new one per migration")
+    apply_parser.add_argument("--compiled-storage", dest="compiled_storage", action="store_true", help="start from the compiled storage (lazy targets)")
+    apply_parser.add_argument("--batch-size", dest="batch_size", type=int, default=50, help="replayed calls per operation")
+    apply_parser.add_argument("--output", default="out", help="SmartPy compile output directory")
+    apply_parser.add_argument("--timeout", type=int, default=600, help="seconds to wait for an operation before giving up (rerun to continue)")
+    apply_parser.add_argument("--endpoint", help="node RPC, defaults to settings.SHELL")
+    apply_parser.add_argument("--sandbox", action="store_true", help="rehearse on a flextesa sandbox started in docker")
+    apply_parser.add_argument("--image", default="oxheadalpha/flextesa:latest", help="flextesa docker image")
+    apply_parser.add_argument("--box", default="limabox", help="flextesa box script")
+    apply_parser.add_argument("--port", type=int, default=20000, help="sandbox RPC port")
+    apply_parser.add_argument("--block-time", dest="block_time", type=int, default=2, help="sandbox block time in seconds")
+    apply_parser.set_defaults(handler=apply_command)
+
+    arguments = parser.parse_args()
+    if arguments.network:
+        network_settings.select(arguments.network)
+    return arguments.handler(arguments)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,17 @@
 DECIMALS = 12
 PRECISION_FACTOR = 10**DECIMALS  
 ORACLE_EPOCH_INTERVAL = 900 # this is 15 minutes
+HIGH_FREQUENCY_EPOCH_INTERVAL = 30 # epoch interval of the deviation triggered mode, ORACLE_EPOCH_INTERVAL is its heartbeat
+JOB_PRUNE_BATCH = 50 # max jobs per JobScheduler.prune call
 
 PRECISION_SHIFT = 10
-PRICE_PRECISION = 10**6
\ No newline at end of file
+PRICE_PRECISION = 10**6
+
+# ids used as prices big_map keys by the CompactPriceOracle
+SYMBOL_IDS = {"DEFI": 0, "XTZ": 1, "BTC": 2}
+
+# layout of the "fixed" fulfill payload: version, big endian timestamp, three big endian prices
+FIXED_PAYLOAD_VERSION = 1
+FIXED_PAYLOAD_TIMESTAMP_BYTES = 4
+FIXED_PAYLOAD_PRICE_BYTES = 6
+FIXED_PAYLOAD_LENGTH = 1 + FIXED_PAYLOAD_TIMESTAMP_BYTES + 3*FIXED_PAYLOAD_PRICE_BYTES
@@ -10,5 +10,9 @@ CANNOT_BE_ZERO = 905
 
 NULL_VALUE = 501
 INVALID_VIEW = 502
+INVALID_CALLBACK = 503
+NOTHING_TO_DISPATCH = 504
+INVALID_PAYLOAD = 505
+SKIP_TOO_EARLY = 506
 
 NOT_INTERNAL = 400
\ No newline at end of file
@@ -1,5 +1,5 @@
 import smartpy as sp
-from oracles.job_scheduler import Fulfill
+from oracles.job_scheduler import Fulfill, Script
 import oracles.constants as Constants
 import oracles.errors as Errors
 
@@ -26,13 +26,34 @@ class Response:
 class PriceOracle(sp.Contract):
     """The generic price oracle accepts prices from the set sources and set script. The price is allowed to change only 6.25% max from the previous
     set price. This version of the oracle uses the onchain views. Only the administrator is allowed to change the script and sources.
+    If lazy_entry_points is set the admin entrypoints are compiled into lazily loaded big_map lambdas, only fulfill and the views stay in
+    the main code which is loaded on every call. If direct_fulfill is set the sources have to call fulfill directly instead of going
+    through the JobScheduler, the sp.sender is checked instead of the sp.source.
+
+    The epoch_interval defaults to Constants.ORACLE_EPOCH_INTERVAL. A shorter interval enables the high frequency mode where
+    executors only submit on a deviation or once the heartbeat expired (see utils/trigger.py). In that mode the smooth clamp is
+    scaled by the time elapsed since the last update and the default validity window covers 4 heartbeats.
+
+    The payload_format "packed" expects sp.pack(Response) as fulfill payload. The "fixed" format is the smaller fixed width layout
+    written by utils.payload.encode_fixed, it is decoded with the NAT (bytes to nat) instruction available since protocol Mumbai.
+
+    The aggregation "first" anchors an epoch on its first response, later responses count if they are within the precision margin of
+    it. The aggregation "median" buffers up to max_responses responses per epoch and finalizes on their (lower) median once
+    response_threshold of them are within the precision margin of it, so a single outlier arriving first cannot stall the epoch.
+
+    If compact_scripts is set valid_script is the nat id of the script in the registry of a CompactJobScheduler instead of its uri.
     """
-    def __init__(self, administrator):
+    def __init__(self, administrator, lazy_entry_points=False, direct_fulfill=False, epoch_interval=Constants.ORACLE_EPOCH_INTERVAL, heartbeat=Constants.ORACLE_EPOCH_INTERVAL, payload_format="packed", aggregation="first", max_responses=5, compact_scripts=False):
+        self.direct_fulfill = direct_fulfill
+        self.compact_scripts = compact_scripts
+        self.payload_format = payload_format
+        self.aggregation = aggregation
+        self.epoch_interval = epoch_interval
         self.init(
             prices=sp.big_map(tkey=sp.TString, tvalue=sp.TNat),
             last_epoch=sp.nat(0),
             response_threshold=sp.nat(3),
-            validity_window_in_epochs=sp.nat(4),
+            validity_window_in_epochs=sp.nat(4*max(heartbeat, epoch_interval)//epoch_interval),
             valid_script=sp.bytes("0x697066733a2f2f516d50367043416a5337525948383768573366454a754631524b6f75486a7a55674c5035694e61323853636b5533"),
             valid_defi_price=sp.nat(0),
             valid_xtz_price=sp.nat(0),
@@ -48,11 +69,21 @@ class PriceOracle(sp.Contract):
             ]), 
             administrator=administrator 
         )
+        if aggregation == "median":
+            self.update_initial_storage(
+                valid_responses=sp.big_map(tkey=sp.TNat, tvalue=sp.TMap(sp.TAddress, Response.get_type())),
+                max_responses=sp.nat(max_responses)
+            )
+        if compact_scripts:
+            self.update_initial_storage(valid_script=sp.nat(0))
+        if lazy_entry_points:
+            self.add_flag("lazy-entry-points")
     
     @sp.entry_point
     def set_valid_script(self, script):
         """Entrypoint used by the admin to set the valid script. Only admin is allowed to call this entrypoint.
         """
+        sp.set_type(script, Script.get_type(self.compact_scripts))
         sp.verify(sp.sender==self.data.administrator, message=Errors.NOT_ADMIN)
         self.data.valid_script = script
 
@@ -82,18 +113,38 @@ class PriceOracle(sp.Contract):
         """Lambda that takes as paramenter a pair (old_value: TNat, new_value: TNat) and returns 
         if the change is bigger than 6.25% old_value*1.0625 if the change is smaller than 6.25% old_value*0.9375. If the
         value is in between between new_value is returned.
+
+        In the high frequency mode the parameter is a pair ((old_value: TNat, new_value: TNat), elapsed: TNat) and the 6.25% 
+        are scaled by min(elapsed, Constants.ORACLE_EPOCH_INTERVAL)/Constants.ORACLE_EPOCH_INTERVAL, which keeps the max change
+        at 6.25% per 15 minutes.
         """
-        old_value, new_value = sp.match_pair(pair)
+        if self.epoch_interval == Constants.ORACLE_EPOCH_INTERVAL:
+            old_value, new_value = sp.match_pair(pair)
+            max_difference = old_value>>4
+        else:
+            values, elapsed = sp.match_pair(pair)
+            old_value, new_value = sp.match_pair(values)
+            max_difference = sp.compute((old_value>>4)*sp.min(elapsed, Constants.ORACLE_EPOCH_INTERVAL)//Constants.ORACLE_EPOCH_INTERVAL)
         sp.verify(new_value > 0, message=Errors.NULL_VALUE)
-        with sp.if_((old_value==0) | (old_value>>4 > abs(old_value-new_value))):
+        with sp.if_((old_value==0) | (max_difference > abs(old_value-new_value))):
             sp.result(new_value)
         with sp.else_():
             with sp.if_(old_value-new_value>0):
-                sp.result(sp.as_nat(old_value-(old_value>>4)))
+                sp.result(sp.as_nat(old_value-max_difference))
             with sp.else_():
-                sp.result(old_value+(old_value>>4))
+                sp.result(old_value+max_difference)
 
-    @sp.entry_point
+    def smoothed(self, old_value, new_value):
+        """Inlined call of the smooth lambda, in the high frequency mode the time elapsed since the last update is passed along.
+        Needs to be used before last_epoch is set to the current epoch.
+        """
+        if self.epoch_interval == Constants.ORACLE_EPOCH_INTERVAL:
+            return self.smooth(sp.pair(old_value, new_value))
+        else:
+            elapsed = sp.as_nat(self.data.valid_epoch-self.data.last_epoch)*self.epoch_interval
+            return self.smooth(sp.pair(sp.pair(old_value, new_value), elapsed))
+
+    @sp.entry_point(lazify=False)
     def fulfill(self, fulfill):
         """The fulfill entrypoint is called by the data transmitter directly. It's your responsibility to make it
         as efficient as possible (it has a gas and storage limit of 11000). While the sp.sender of this entrypoint
@@ -105,38 +156,144 @@ class PriceOracle(sp.Contract):
         , comes from a new source and matches with some minor precision margin the value set by a previous source
         the response is counted as +1. If the response counter reaches the threshold the price in storage is set 
         and ready to be used by the get_price entrypoint.
+
+        If the python variable self.direct_fulfill is set the JobScheduler hop is skipped: the source calls this entrypoint
+        itself and the sp.sender has to be a valid source. Calls routed through the JobScheduler are rejected in this mode.
         """
-        sp.set_type(fulfill, Fulfill.get_type())
+        sp.set_type(fulfill, Fulfill.get_type(self.compact_scripts))
+        if self.direct_fulfill:
+            respondant = sp.sender
+        else:
+            respondant = sp.source
 
         sp.verify(self.data.valid_script == fulfill.script, message=Errors.INVALID_SCRIPT)
-        sp.verify(self.data.valid_sources.contains(sp.source), message=Errors.INVALID_SOURCE)
+        sp.verify(self.data.valid_sources.contains(respondant), message=Errors.INVALID_SOURCE)
         
-        response = sp.local("response", sp.unpack(fulfill.payload, Response.get_type()).open_some())
+        response = self.decode_response(fulfill.payload)
+
+        current_epoch = sp.local("current_epoch", response.value.timestamp // self.epoch_interval)
+        sp.verify(current_epoch.value == sp.as_nat(sp.now-sp.timestamp(0)) // self.epoch_interval, message=Errors.NOT_IN_EPOCH)
 
-        current_epoch = sp.local("current_epoch", response.value.timestamp // Constants.ORACLE_EPOCH_INTERVAL)
-        sp.verify(current_epoch.value == sp.as_nat(sp.now-sp.timestamp(0)) // Constants.ORACLE_EPOCH_INTERVAL, message=Errors.NOT_IN_EPOCH)
+        if self.aggregation == "median":
+            self.aggregate_median(respondant, response.value, current_epoch.value)
+        else:
+            self.aggregate_first(respondant, response.value, current_epoch.value)
 
-        with sp.if_((current_epoch.value != self.data.valid_epoch)):
+    def aggregate_first(self, respondant, response, current_epoch):
+        """Inlined into fulfill. The first response of an epoch sets the valid prices, every response within the precision margin
+        of them counts until the threshold is reached.
+        """
+        with sp.if_((current_epoch != self.data.valid_epoch)):
             self.data.valid_respondants = sp.set([])
-            self.data.valid_epoch = current_epoch.value
-            self.data.valid_defi_price = response.value.defi_price
-            self.data.valid_xtz_price = response.value.xtz_price
-            self.data.valid_btc_price = response.value.btc_price
+            self.data.valid_epoch = current_epoch
+            self.data.valid_defi_price = response.defi_price
+            self.data.valid_xtz_price = response.xtz_price
+            self.data.valid_btc_price = response.btc_price
 
         with sp.if_(sp.len(self.data.valid_respondants) < self.data.response_threshold):
             with sp.if_(
-                (self.data.valid_defi_price>>Constants.PRECISION_SHIFT >= abs(response.value.defi_price - self.data.valid_defi_price)) &
-                (self.data.valid_xtz_price>>Constants.PRECISION_SHIFT >= abs(response.value.xtz_price - self.data.valid_xtz_price)) &
-                (self.data.valid_btc_price>>Constants.PRECISION_SHIFT >= abs(response.value.btc_price - self.data.valid_btc_price))
+                (self.data.valid_defi_price>>Constants.PRECISION_SHIFT >= abs(response.defi_price - self.data.valid_defi_price)) &
+                (self.data.valid_xtz_price>>Constants.PRECISION_SHIFT >= abs(response.xtz_price - self.data.valid_xtz_price)) &
+                (self.data.valid_btc_price>>Constants.PRECISION_SHIFT >= abs(response.btc_price - self.data.valid_btc_price))
             ):    
-                self.data.valid_respondants.add(sp.source)
+                self.data.valid_respondants.add(respondant)
 
                 with sp.if_(sp.len(self.data.valid_respondants) >= self.data.response_threshold):
-                    self.data.prices['DEFI'] = self.smooth(sp.pair(self.data.prices.get('DEFI',0), self.data.valid_defi_price))
-                    self.data.prices['XTZ'] = self.smooth(sp.pair(self.data.prices.get('XTZ',0), self.data.valid_xtz_price))
-                    self.data.prices['BTC'] = self.smooth(sp.pair(self.data.prices.get('BTC',0), self.data.valid_btc_price))
+                    self.store_prices()
+
+                    self.data.last_epoch = current_epoch
 
-                    self.data.last_epoch = current_epoch.value
+    def aggregate_median(self, respondant, response, current_epoch):
+        """Inlined into fulfill. Buffers the response (one per respondant, at most max_responses per epoch) and, once there are
+        response_threshold of them, computes the median of every price by counting for each buffered response how many are below it,
+        O(max_responses**2) comparisons. The epoch is finalized with the medians as soon as response_threshold buffered responses are
+        within the precision margin of them. Responses arriving after the finalization are ignored.
+
+        The buffer of an epoch is a big_map value so that only fulfill loads it, the views and the other entrypoints do not pay for
+        deserializing up to max_responses responses. The buffer of the previous epoch is removed when a new epoch starts.
+        """
+        with sp.if_((current_epoch != self.data.valid_epoch)):
+            del self.data.valid_responses[self.data.valid_epoch]
+            self.data.valid_epoch = current_epoch
+
+        responses = sp.local("responses", self.data.valid_responses.get(current_epoch, default_value=sp.map(tkey=sp.TAddress, tvalue=Response.get_type())))
+        with sp.if_((self.data.last_epoch != current_epoch) & ~responses.value.contains(respondant) & (sp.len(responses.value) < self.data.max_responses)):
+            responses.value[respondant] = response
+            self.data.valid_responses[current_epoch] = responses.value
+
+            with sp.if_(sp.len(responses.value) >= self.data.response_threshold):
+                median_rank = sp.compute(sp.as_nat(sp.len(responses.value)-1)//2)
+                defi_price = sp.local("defi_price", sp.nat(0))
+                xtz_price = sp.local("xtz_price", sp.nat(0))
+                btc_price = sp.local("btc_price", sp.nat(0))
+                with sp.for_("candidate", responses.value.values()) as candidate:
+                    below = sp.local("below", sp.record(defi=sp.nat(0), xtz=sp.nat(0), btc=sp.nat(0)))
+                    not_above = sp.local("not_above", sp.record(defi=sp.nat(0), xtz=sp.nat(0), btc=sp.nat(0)))
+                    with sp.for_("other", responses.value.values()) as other:
+                        with sp.if_(other.defi_price < candidate.defi_price):
+                            below.value.defi += 1
+                        with sp.if_(other.defi_price <= candidate.defi_price):
+                            not_above.value.defi += 1
+                        with sp.if_(other.xtz_price < candidate.xtz_price):
+                            below.value.xtz += 1
+                        with sp.if_(other.xtz_price <= candidate.xtz_price):
+                            not_above.value.xtz += 1
+                        with sp.if_(other.btc_price < candidate.btc_price):
+                            below.value.btc += 1
+                        with sp.if_(other.btc_price <= candidate.btc_price):
+                            not_above.value.btc += 1
+                    with sp.if_((below.value.defi <= median_rank) & (median_rank < not_above.value.defi)):
+                        defi_price.value = candidate.defi_price
+                    with sp.if_((below.value.xtz <= median_rank) & (median_rank < not_above.value.xtz)):
+                        xtz_price.value = candidate.xtz_price
+                    with sp.if_((below.value.btc <= median_rank) & (median_rank < not_above.value.btc)):
+                        btc_price.value = candidate.btc_price
+
+                agreeing = sp.local("agreeing", sp.nat(0))
+                with sp.for_("candidate", responses.value.values()) as candidate:
+                    with sp.if_(
+                        (defi_price.value>>Constants.PRECISION_SHIFT >= abs(candidate.defi_price - defi_price.value)) &
+                        (xtz_price.value>>Constants.PRECISION_SHIFT >= abs(candidate.xtz_price - xtz_price.value)) &
+                        (btc_price.value>>Constants.PRECISION_SHIFT >= abs(candidate.btc_price - btc_price.value))
+                    ):
+                        agreeing.value += 1
+
+                with sp.if_(agreeing.value >= self.data.response_threshold):
+                    self.data.valid_defi_price = defi_price.value
+                    self.data.valid_xtz_price = xtz_price.value
+                    self.data.valid_btc_price = btc_price.value
+                    self.store_prices()
+
+                    self.data.last_epoch = current_epoch
+
+    def decode_response(self, payload):
+        """Inlined into fulfill. Decodes the payload in the payload format the oracle is compiled with into a Response local.
+        """
+        if self.payload_format == "fixed":
+            sp.verify(sp.len(payload) == Constants.FIXED_PAYLOAD_LENGTH, message=Errors.INVALID_PAYLOAD)
+            sp.verify(sp.slice(payload, 0, 1).open_some() == sp.bytes("0x%02x" % Constants.FIXED_PAYLOAD_VERSION), message=Errors.INVALID_PAYLOAD)
+            bytes_to_nat = sp.michelson("NAT", [sp.TBytes], [sp.TNat])
+            offset = 1 + Constants.FIXED_PAYLOAD_TIMESTAMP_BYTES
+            prices = [bytes_to_nat(sp.slice(payload, offset + index*Constants.FIXED_PAYLOAD_PRICE_BYTES, Constants.FIXED_PAYLOAD_PRICE_BYTES).open_some()) for index in range(3)]
+            return sp.local("response", Response.make(bytes_to_nat(sp.slice(payload, 1, Constants.FIXED_PAYLOAD_TIMESTAMP_BYTES).open_some()), prices[0], prices[1], prices[2]))
+        return sp.local("response", sp.unpack(payload, Response.get_type()).open_some())
+
+    def store_prices(self):
+        """Inlined into fulfill once the threshold is reached. Smooths the validated prices against the stored ones and writes
+        them to the prices big_map. Subclasses with a different prices layout override this.
+        """
+        self.data.prices['DEFI'] = self.smoothed(self.data.prices.get('DEFI',0), self.data.valid_defi_price)
+        self.data.prices['XTZ'] = self.smoothed(self.data.prices.get('XTZ',0), self.data.valid_xtz_price)
+        self.data.prices['BTC'] = self.smoothed(self.data.prices.get('BTC',0), self.data.valid_btc_price)
+
+    def read_price(self, key):
+        """Inlined into the views. Checks the validity window and reads the entry for key exactly once from the prices big_map.
+        """
+        current_epoch = sp.as_nat(sp.now-sp.timestamp(0)) // self.epoch_interval
+        sp.verify(self.data.last_epoch>sp.as_nat(current_epoch-self.data.validity_window_in_epochs), message=Errors.PRICE_TOO_OLD)
+        price = sp.compute(self.data.prices[key])
+        sp.verify(price>0, message=Errors.CANNOT_BE_ZERO)
+        return price
 
     @sp.onchain_view()
     def get_price(self, symbol):
@@ -144,18 +301,64 @@ class PriceOracle(sp.Contract):
         entry from storage to then return it. The price is only returned if it is not older than the validity window set in storage 
         expressed it interval integer. This
         """
-        current_epoch = sp.as_nat(sp.now-sp.timestamp(0)) // Constants.ORACLE_EPOCH_INTERVAL
-        sp.verify(self.data.last_epoch>sp.as_nat(current_epoch-self.data.validity_window_in_epochs), message=Errors.PRICE_TOO_OLD)
-        sp.verify(self.data.prices[symbol]>0, message=Errors.CANNOT_BE_ZERO)
-        sp.result(self.data.prices[symbol])
+        sp.result(self.read_price(symbol))
+
+    @sp.onchain_view()
+    def get_last_epoch(self):
+        """Onchain view returning the last finalized epoch, used by the PriceDispatcher to detect new prices.
+        """
+        sp.result(self.data.last_epoch)
+
+class CompactPriceOracle(PriceOracle):
+    """Same as the PriceOracle but the prices big_map is keyed by small nat symbol ids (see Constants.SYMBOL_IDS) instead of strings. 
+    Writes in fulfill and reads through get_price_by_id hash a nat instead of a string. The string to id mapping is only used by the 
+    admin and by the legacy get_price view, which keeps the PriceOracle interface for existing consumers.
+    """
+    def __init__(self, administrator, **kwargs):
+        PriceOracle.__init__(self, administrator, **kwargs)
+        self.update_initial_storage(
+            prices=sp.big_map(tkey=sp.TNat, tvalue=sp.TNat),
+            symbol_ids=sp.big_map(Constants.SYMBOL_IDS, tkey=sp.TString, tvalue=sp.TNat)
+        )
+
+    @sp.entry_point
+    def set_symbol_id(self, symbol, symbol_id):
+        """Entrypoint used by the admin to map a symbol to its id. Only admin is allowed to call this entrypoint.
+        """
+        sp.set_type(symbol, sp.TString)
+        sp.set_type(symbol_id, sp.TNat)
+        sp.verify(sp.sender==self.data.administrator, message=Errors.NOT_ADMIN)
+        self.data.symbol_ids[symbol] = symbol_id
+
+    def store_prices(self):
+        """Same as PriceOracle.store_prices but writes to the nat symbol ids.
+        """
+        self.data.prices[Constants.SYMBOL_IDS['DEFI']] = self.smoothed(self.data.prices.get(Constants.SYMBOL_IDS['DEFI'],0), self.data.valid_defi_price)
+        self.data.prices[Constants.SYMBOL_IDS['XTZ']] = self.smoothed(self.data.prices.get(Constants.SYMBOL_IDS['XTZ'],0), self.data.valid_xtz_price)
+        self.data.prices[Constants.SYMBOL_IDS['BTC']] = self.smoothed(self.data.prices.get(Constants.SYMBOL_IDS['BTC'],0), self.data.valid_btc_price)
+
+    @sp.onchain_view()
+    def get_price(self, symbol):
+        """Legacy onchain view taking the symbol as string. The symbol is resolved to its id first, prefer get_price_by_id.
+        """
+        sp.set_type(symbol, sp.TString)
+        sp.result(self.read_price(self.data.symbol_ids[symbol]))
+
+    @sp.onchain_view()
+    def get_price_by_id(self, symbol_id):
+        """Onchain view used to read the price out of storage by symbol id. Same validity rules as get_price apply.
+        """
+        sp.set_type(symbol_id, sp.TNat)
+        sp.result(self.read_price(symbol_id))
 
 class ProxyOracle(sp.Contract):
     """This smart contract is used for retrocompatibility. It allows contracts that used the pre-onchain-view callback "get_price(cb)" 
     entrypoint to read data from the new generic oracle that uses the onchain view standard. It's instantiated with the oracle's address
-    and symbol to request. 
+    and symbol to request. If use_symbol_ids is set the symbol is a nat id read through the get_price_by_id view of a CompactPriceOracle.
     """
-    def __init__(self, oracle, symbol, requires_flip=False):
+    def __init__(self, oracle, symbol, requires_flip=False, use_symbol_ids=False):
         self.requires_flip = requires_flip
+        self.price_view = "get_price_by_id" if use_symbol_ids else "get_price"
         self.init(
             oracle=oracle,
             symbol=symbol
@@ -175,7 +378,7 @@ class ProxyOracle(sp.Contract):
         by 1//"stored price" if the python variable self.requires_flip is set to True. This switch is evaluated at compiletime and will not be reflected
         in the resulting michelson.
         """
-        price = sp.view("get_price", self.data.oracle, self.data.symbol, t=sp.TNat).open_some(Errors.INVALID_VIEW)     
+        price = sp.view(self.price_view, self.data.oracle, self.data.symbol, t=sp.TNat).open_some(Errors.INVALID_VIEW)     
         if self.requires_flip:  
             sp.result(10**12//price)
         else:
@@ -184,10 +387,11 @@ class ProxyOracle(sp.Contract):
 class LegacyProxyOracle(sp.Contract):
     """This smart contract is used for retrocompatibility. It allows contracts that used the pre-onchain-view callback "get_price(cb)" 
     entrypoint to read data from the new generic oracle that uses the onchain view standard. It's instantiated with the oracle's address
-    and symbol to request. 
+    and symbol to request. If use_symbol_ids is set the symbol is a nat id read through the get_price_by_id view of a CompactPriceOracle.
     """
-    def __init__(self, oracle, symbol, requires_flip=False):
+    def __init__(self, oracle, symbol, requires_flip=False, use_symbol_ids=False):
         self.requires_flip = requires_flip
+        self.price_view = "get_price_by_id" if use_symbol_ids else "get_price"
         self.init(
             oracle=oracle,
             symbol=symbol
@@ -211,7 +415,7 @@ class LegacyProxyOracle(sp.Contract):
             callback (sp.TContract(sp.TNat)): callback where to receive the price
         """
         sp.set_type(callback, sp.TContract(sp.TNat))
-        price = sp.view("get_price", self.data.oracle, self.data.symbol, t=sp.TNat).open_some(Errors.INVALID_VIEW)     
+        price = sp.view(self.price_view, self.data.oracle, self.data.symbol, t=sp.TNat).open_some(Errors.INVALID_VIEW)     
         if self.requires_flip:  
             sp.transfer(10**12//price, sp.mutez(0), callback)
         else:
@@ -219,8 +423,10 @@ class LegacyProxyOracle(sp.Contract):
 
 class RelativeProxyOracle(sp.Contract):
     """This smart contract is used for the calculation of the right price. It takes the base symbol and puts it into relation with the quote symbol.
+    If use_symbol_ids is set both symbols are nat ids read through the get_price_by_id view of a CompactPriceOracle.
     """
-    def __init__(self, oracle, base_symbol, quote_symbol):
+    def __init__(self, oracle, base_symbol, quote_symbol, use_symbol_ids=False):
+        self.price_view = "get_price_by_id" if use_symbol_ids else "get_price"
         self.init(
             oracle=oracle,
             base_symbol=base_symbol,
@@ -256,8 +462,8 @@ class RelativeProxyOracle(sp.Contract):
         by 1//"stored price" if the python variable self.requires_flip is set to True. This switch is evaluated at compiletime and will not be reflected
         in the resulting michelson.
         """
-        base_price = sp.view("get_price", self.data.oracle, self.data.base_symbol, t=sp.TNat).open_some(Errors.INVALID_VIEW)     
-        quote_price = sp.view("get_price", self.data.oracle, self.data.quote_symbol, t=sp.TNat).open_some(Errors.INVALID_VIEW)     
+        base_price = sp.view(self.price_view, self.data.oracle, self.data.base_symbol, t=sp.TNat).open_some(Errors.INVALID_VIEW)     
+        quote_price = sp.view(self.price_view, self.data.oracle, self.data.quote_symbol, t=sp.TNat).open_some(Errors.INVALID_VIEW)     
 
         price = base_price * Constants.PRICE_PRECISION // quote_price
         sp.result(price)
@@ -265,7 +471,8 @@ class RelativeProxyOracle(sp.Contract):
 if "templates" not in __name__:
     from oracles.job_scheduler import JobScheduler, Job
     from utils.viewer import Viewer
-    @sp.add_test(name = "Generic Price Oracle")
+    from utils.testing import add_test, bootstrap_jobs, fulfill_all, return_contract, VALID_EXECUTORS, VALID_SCRIPT
+    @add_test(name = "Generic Price Oracle")
     def test():
         scenario = sp.test_scenario()
         scenario.h1("Job Scheduler")
@@ -306,6 +513,8 @@ if "templates" not in __name__:
         scenario += scheduler.publish(job).run(sender=administrator.address)
         job = Job.make_publish(alice.address, script, start, end, interval, fee, price_oracle.address)
         scenario += scheduler.publish(job).run(sender=administrator.address)
+        for executor in [valid_executor1, valid_executor2, valid_executor3, valid_executor4, alice.address]:
+            scenario += scheduler.ack(script).run(sender=executor)
 
         
         now=900
@@ -420,4 +629,233 @@ if "templates" not in __name__:
         scenario += scheduler.fulfill(Fulfill.make(script, sp.pack(Response.make(now, 3500000, 3500000, 38415000000)))).run(sender=valid_executor4, source=valid_executor4, now=sp.timestamp(now))
         scenario += relative_proxy_oracle.get_price(return_contract).run(now=sp.timestamp(now), valid=True)
         scenario.verify_equal(viewer.data.nat,882352)
-        #scenario.verify(relation_proxy_oracle.get_price()==10)
\ No newline at end of file
+        #scenario.verify(relation_proxy_oracle.get_price()==10)
+    @add_test(name = "Compact Price Oracle")
+    def test():
+        scenario = sp.test_scenario()
+        scenario.h1("Compact Price Oracle")
+
+        scenario.h2("Bootstrapping")
+        alice = sp.test_account("Alice")
+        fixture = bootstrap_jobs(scenario, lambda administrator: CompactPriceOracle(administrator))
+        administrator, price_oracle = fixture.administrator, fixture.contract
+
+        scenario.h2("Prices are stored under the symbol ids")
+        now=Constants.ORACLE_EPOCH_INTERVAL*20
+        fulfill_all(scenario, fixture, sp.pack(Response.make(now, 3500000, 3500000, 38415000000)), now)
+        scenario.verify_equal(price_oracle.data.prices[Constants.SYMBOL_IDS['XTZ']], 3500000)
+        scenario.verify_equal(price_oracle.data.prices[Constants.SYMBOL_IDS['BTC']], 38415000000)
+        scenario.verify_equal(price_oracle.get_price_by_id(Constants.SYMBOL_IDS['BTC']), 38415000000)
+
+        viewer, callback = return_contract(scenario)
+
+        scenario.h2("Legacy string proxy still works")
+        proxy = LegacyProxyOracle(price_oracle.address, "BTC")
+        scenario += proxy
+        scenario += proxy.get_price(callback).run(now=sp.timestamp(now))
+        scenario.verify_equal(viewer.data.nat, 38415000000)
+
+        scenario.h2("Symbol id proxies")
+        proxy = LegacyProxyOracle(price_oracle.address, sp.nat(Constants.SYMBOL_IDS['XTZ']), use_symbol_ids=True)
+        scenario += proxy
+        scenario += proxy.get_price(callback).run(now=sp.timestamp(now))
+        scenario.verify_equal(viewer.data.nat, 3500000)
+
+        relative_proxy_oracle = RelativeProxyOracle(price_oracle.address, sp.nat(Constants.SYMBOL_IDS['XTZ']), sp.nat(Constants.SYMBOL_IDS['BTC']), use_symbol_ids=True)
+        scenario += relative_proxy_oracle
+        scenario += relative_proxy_oracle.get_price(callback).run(now=sp.timestamp(now))
+        scenario.verify_equal(viewer.data.nat, 91)
+
+        scenario.h2("only admin can set a symbol id")
+        scenario += price_oracle.set_symbol_id(symbol="tzBTC", symbol_id=Constants.SYMBOL_IDS['BTC']).run(sender=alice, valid=False)
+        scenario += price_oracle.set_symbol_id(symbol="tzBTC", symbol_id=Constants.SYMBOL_IDS['BTC']).run(sender=administrator)
+        scenario.verify_equal(price_oracle.get_price("tzBTC"), 38415000000)
+        scenario.verify_equal(price_oracle.get_price("BTC"), 38415000000)
+
+    @add_test(name = "Lazy Price Oracle")
+    def test():
+        scenario = sp.test_scenario()
+        scenario.h1("Lazy Price Oracle")
+
+        scenario.h2("Lazy publish and non-lazy fulfill")
+        alice = sp.test_account("Alice")
+        fixture = bootstrap_jobs(scenario, lambda administrator: PriceOracle(administrator, lazy_entry_points=True), lazy_entry_points=True)
+        administrator, price_oracle = fixture.administrator, fixture.contract
+
+        now=Constants.ORACLE_EPOCH_INTERVAL*20
+        fulfill_all(scenario, fixture, sp.pack(Response.make(now, 3500000, 3500000, 38415000000)), now)
+        scenario.verify_equal(price_oracle.data.prices['BTC'], 38415000000)
+
+        scenario.h2("Lazy admin entrypoints")
+        scenario += price_oracle.add_valid_source(alice.address).run(sender=alice, valid=False)
+        scenario += price_oracle.add_valid_source(alice.address).run(sender=administrator)
+        scenario.verify_equal(price_oracle.data.valid_sources.contains(alice.address), True)
+        scenario += price_oracle.remove_valid_source(alice.address).run(sender=administrator)
+        scenario.verify_equal(price_oracle.data.valid_sources.contains(alice.address), False)
+
+    @add_test(name = "Direct Fulfill Price Oracle")
+    def test():
+        scenario = sp.test_scenario()
+        scenario.h1("Direct Fulfill Price Oracle")
+
+        scenario.h2("Bootstrapping")
+        alice = sp.test_account("Alice")
+        fixture = bootstrap_jobs(scenario, lambda administrator: PriceOracle(administrator, direct_fulfill=True))
+        price_oracle, script = fixture.contract, fixture.script
+
+        now=Constants.ORACLE_EPOCH_INTERVAL*20
+        payload = sp.pack(Response.make(now, 3500000, 3500000, 38415000000))
+
+        scenario.h2("Calls through the scheduler are rejected")
+        scenario += fixture.scheduler.fulfill(Fulfill.make(script, payload)).run(sender=fixture.executors[0], source=fixture.executors[0], now=sp.timestamp(now), valid=False)
+
+        scenario.h2("Invalid sources cannot call directly")
+        scenario += price_oracle.fulfill(Fulfill.make(script, payload)).run(sender=alice.address, source=alice.address, now=sp.timestamp(now), valid=False)
+
+        scenario.h2("Valid sources call directly")
+        for valid_executor in fixture.executors:
+            scenario += price_oracle.fulfill(Fulfill.make(script, payload)).run(sender=valid_executor, source=valid_executor, now=sp.timestamp(now))
+        scenario.verify_equal(price_oracle.data.prices['BTC'], 38415000000)
+        scenario.verify_equal(price_oracle.data.last_epoch, 20)
+
+    @add_test(name = "High Frequency Price Oracle")
+    def test():
+        scenario = sp.test_scenario()
+        scenario.h1("High Frequency Price Oracle")
+
+        scenario.h2("Bootstrapping")
+        interval = Constants.HIGH_FREQUENCY_EPOCH_INTERVAL
+        fixture = bootstrap_jobs(scenario, lambda administrator: PriceOracle(administrator, epoch_interval=interval, heartbeat=Constants.ORACLE_EPOCH_INTERVAL), interval=interval)
+        price_oracle = fixture.contract
+        scenario.verify_equal(price_oracle.data.validity_window_in_epochs, 4*Constants.ORACLE_EPOCH_INTERVAL//interval)
+
+        scenario.h2("Epochs are the short interval")
+        now=interval*100
+        price=sp.nat(6000000)
+        fulfill_all(scenario, fixture, sp.pack(Response.make(now, price, price, price)), now)
+        scenario.verify_equal(price_oracle.data.last_epoch, 100)
+        scenario.verify_equal(price_oracle.data.prices['DEFI'], price)
+
+        scenario.h2("Clamp is scaled by the elapsed time")
+        now=interval*101
+        fulfill_all(scenario, fixture, sp.pack(Response.make(now, price*2, price*2, price*2)), now)
+        scenario.verify_equal(price_oracle.data.prices['DEFI'], 6000000+(6000000>>4)*interval//Constants.ORACLE_EPOCH_INTERVAL)
+
+        scenario.p("After a heartbeat the full 6.25% apply")
+        now=interval*101+Constants.ORACLE_EPOCH_INTERVAL
+        fulfill_all(scenario, fixture, sp.pack(Response.make(now, price*2, price*2, price*2)), now)
+        scenario.verify_equal(price_oracle.data.prices['DEFI'], 6012500+(6012500>>4))
+
+        scenario.h2("Validity window covers 4 heartbeats")
+        viewer, callback = return_contract(scenario)
+        proxy = LegacyProxyOracle(price_oracle.address, "BTC")
+        scenario += proxy
+        scenario += proxy.get_price(callback).run(now=sp.timestamp(now+4*Constants.ORACLE_EPOCH_INTERVAL-interval))
+        scenario.verify_equal(viewer.data.nat, 6012500+(6012500>>4))
+        scenario += proxy.get_price(callback).run(now=sp.timestamp(now+4*Constants.ORACLE_EPOCH_INTERVAL), valid=False)
+
+    @add_test(name = "Median Price Oracle")
+    def test():
+        scenario = sp.test_scenario()
+        scenario.h1("Median Price Oracle")
+
+        scenario.h2("Bootstrapping")
+        executors = VALID_EXECUTORS + ["tz3cXew4V1uXDtxuQde5iFSKpxoiF5udC3L1"]
+        fixture = bootstrap_jobs(scenario, lambda administrator: PriceOracle(administrator, aggregation="median", max_responses=4), executors=executors)
+        price_oracle, script = fixture.contract, fixture.script
+
+        now=Constants.ORACLE_EPOCH_INTERVAL*20
+        honest = sp.pack(Response.make(now, 3500000, 3500000, 38415000000))
+        outlier = sp.pack(Response.make(now, 3500000, 7000000, 38415000000))
+
+        scenario.h2("An outlier arriving first does not stall the epoch")
+        scenario += fixture.scheduler.fulfill(Fulfill.make(script, outlier)).run(sender=fixture.executors[0], source=fixture.executors[0], now=sp.timestamp(now))
+        for executor in fixture.executors[1:3]:
+            scenario += fixture.scheduler.fulfill(Fulfill.make(script, honest)).run(sender=executor, source=executor, now=sp.timestamp(now))
+        scenario.p("Only 2 of 3 responses agree with the median, the epoch is not finalized yet")
+        scenario.verify_equal(price_oracle.data.last_epoch, 0)
+        scenario += fixture.scheduler.fulfill(Fulfill.make(script, honest)).run(sender=fixture.executors[3], source=fixture.executors[3], now=sp.timestamp(now))
+        scenario.verify_equal(price_oracle.data.last_epoch, 20)
+        scenario.verify_equal(price_oracle.data.prices['XTZ'], 3500000)
+        scenario.verify_equal(sp.len(price_oracle.data.valid_responses[20]), 4)
+
+        scenario.h2("Next epoch medians within the precision margin")
+        now=Constants.ORACLE_EPOCH_INTERVAL*21
+        for index, btc_price in enumerate([38415000000, 38420000000, 38410000000]):
+            payload = sp.pack(Response.make(now, 3500000, 3500000, btc_price))
+            scenario += fixture.scheduler.fulfill(Fulfill.make(script, payload)).run(sender=fixture.executors[index], source=fixture.executors[index], now=sp.timestamp(now))
+        scenario.verify_equal(price_oracle.data.last_epoch, 21)
+        scenario.verify_equal(price_oracle.data.prices['BTC'], 38415000000)
+        scenario.verify_equal(sp.len(price_oracle.data.valid_responses[21]), 3)
+        scenario.p("The buffer of the previous epoch was removed")
+        scenario.verify(~price_oracle.data.valid_responses.contains(20))
+
+    @add_test(name = "Compact Script Price Oracle")
+    def test():
+        scenario = sp.test_scenario()
+        scenario.h1("Compact Script Price Oracle")
+
+        scenario.h2("Bootstrapping")
+        alice = sp.test_account("Alice")
+        fixture = bootstrap_jobs(scenario, lambda administrator: PriceOracle(administrator, compact_scripts=True), compact_scripts=True)
+        price_oracle, scheduler = fixture.contract, fixture.scheduler
+        scenario.verify_equal(scheduler.data.scripts[0], sp.bytes(VALID_SCRIPT))
+        scenario.verify_equal(scheduler.data.script_ids[sp.bytes(VALID_SCRIPT)], 0)
+
+        scenario.h2("Script registry")
+        scenario.p("Only admin can register, a uri is registered once")
+        scenario += scheduler.register_script(sp.bytes("0x01")).run(sender=alice, valid=False)
+        scenario += scheduler.register_script(sp.bytes(VALID_SCRIPT)).run(sender=fixture.administrator, valid=False)
+        scenario += scheduler.register_script(sp.bytes("0x01")).run(sender=fixture.administrator)
+        scenario.verify_equal(scheduler.data.next_script_id, 2)
+        scenario.p("Jobs can only reference registered ids")
+        scenario += scheduler.publish(Job.make_publish(alice.address, sp.nat(2), sp.timestamp(0), sp.timestamp(1800), 900, 1700, price_oracle.address, True)).run(sender=fixture.administrator, valid=False)
+
+        scenario.h2("Fulfill by script id")
+        now=Constants.ORACLE_EPOCH_INTERVAL*20
+        fulfill_all(scenario, fixture, sp.pack(Response.make(now, 3500000, 3500000, 38415000000)), now)
+        scenario.verify_equal(price_oracle.data.prices['BTC'], 38415000000)
+        scenario.verify_equal(price_oracle.data.last_epoch, 20)
+
+        scenario.p("Responses of another script are rejected")
+        scenario += price_oracle.set_valid_script(sp.nat(1)).run(sender=alice, valid=False)
+        scenario += price_oracle.set_valid_script(sp.nat(1)).run(sender=fixture.administrator)
+        now=Constants.ORACLE_EPOCH_INTERVAL*21
+        payload = sp.pack(Response.make(now, 3500000, 3500000, 38415000000))
+        scenario += scheduler.fulfill(Fulfill.make(sp.nat(0), payload, True)).run(sender=fixture.executors[0], source=fixture.executors[0], now=sp.timestamp(now), valid=False)
+
+        scenario.h2("Plain scheduler with script ids")
+        scenario.p("Without a registry any id can be published")
+        plain_scheduler = JobScheduler(fixture.administrator.address, compact_scripts=True)
+        scenario += plain_scheduler
+        scenario += plain_scheduler.publish(Job.make_publish(alice.address, sp.nat(7), sp.timestamp(0), sp.timestamp(1800), 900, 1700, price_oracle.address, True)).run(sender=fixture.administrator)
+        scenario.verify_equal(plain_scheduler.data.jobs[alice.address].contains(7), True)
+
+    @add_test(name = "Fixed Payload Price Oracle")
+    def test():
+        from utils.payload import encode_fixed
+        scenario = sp.test_scenario()
+        scenario.h1("Fixed Payload Price Oracle")
+
+        scenario.h2("Bootstrapping")
+        fixture = bootstrap_jobs(scenario, lambda administrator: PriceOracle(administrator, payload_format="fixed"))
+        price_oracle, scheduler, script = fixture.contract, fixture.scheduler, fixture.script
+        executor = fixture.executors[0]
+
+        now=Constants.ORACLE_EPOCH_INTERVAL*20
+        payload = encode_fixed(now, 3500000, 3600000, 38415000000)
+
+        scenario.h2("Malformed payloads are rejected")
+        scenario.p("Packed responses")
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.pack(Response.make(now, 3500000, 3600000, 38415000000)))).run(sender=executor, source=executor, now=sp.timestamp(now), valid=False)
+        scenario.p("Unknown version")
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes("0x" + (bytes([Constants.FIXED_PAYLOAD_VERSION + 1]) + payload[1:]).hex()))).run(sender=executor, source=executor, now=sp.timestamp(now), valid=False)
+        scenario.p("Truncated payload")
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes("0x" + payload[:-1].hex()))).run(sender=executor, source=executor, now=sp.timestamp(now), valid=False)
+
+        scenario.h2("Fixed payloads of encode_fixed are decoded")
+        fulfill_all(scenario, fixture, sp.bytes("0x" + payload.hex()), now)
+        scenario.verify_equal(price_oracle.data.last_epoch, 20)
+        scenario.verify_equal(price_oracle.data.prices['DEFI'], 3500000)
+        scenario.verify_equal(price_oracle.data.prices['XTZ'], 3600000)
+        scenario.verify_equal(price_oracle.data.prices['BTC'], 38415000000)
@@ -1,21 +1,52 @@
 import smartpy as sp
+import oracles.constants as Constants
+
+class Script:
+    """Type of the script reference of jobs and fulfills.
+    """
+    def get_type(compact_script=False):
+        """The IPFS uri bytes, or with compact scripts the nat id the uri got in the script registry of the CompactJobScheduler.
+        """
+        return sp.TNat if compact_script else sp.TBytes
+
+class Slot:
+    """Type of the submission slot of an executor within a group of executors serving the same feed.
+    """
+    def get_type():
+        """The executor has rank in a group of group_size executors. In the n-th epoch of the job (n intervals after start) its
+        position is (rank + n) % group_size, so the roles rotate every epoch. The first primaries positions are due at the start
+        of the epoch, position p >= primaries is a backup due spacing*(p - primaries + 1) seconds later.
+        """
+        return sp.TRecord(rank=sp.TNat,
+                group_size=sp.TNat,
+                primaries=sp.TNat,
+                spacing=sp.TNat).layout(("rank", ("group_size", ("primaries", "spacing"))))
+
+    def make(rank=0, group_size=1, primaries=1, spacing=0):
+        """Courtesy function typing a record to Slot.get_type() for us, the default is an executor that is always a primary.
+        """
+        return sp.set_type_expr(sp.record(rank=rank,
+                group_size=group_size,
+                primaries=primaries,
+                spacing=spacing), Slot.get_type())
 
 class Job:
     """Type used to specify Jobs later used by the scheduler.
     """
-    def get_publish_type():
+    def get_publish_type(compact_script=False):
         """Type used for the publish entrypoint.
         """
         return sp.TRecord(
                 executor=sp.TAddress, 
-                script=sp.TBytes, 
+                script=Script.get_type(compact_script), 
                 start=sp.TTimestamp, 
                 end=sp.TTimestamp, 
                 interval=sp.TNat, 
                 fee=sp.TNat, 
-                contract=sp.TAddress).layout(("executor",("script", ("start", ("end", ("interval", ("fee", "contract")))))))
+                contract=sp.TAddress,
+                slot=Slot.get_type()).layout(("executor",("script", ("start", ("end", ("interval", ("fee", ("contract", "slot"))))))))
     
-    def make_publish(executor, script, start, end, interval, fee, contract):
+    def make_publish(executor, script, start, end, interval, fee, contract, compact_script=False, slot=None):
         """Courtesy function typing a record to Job.get_publish_type() for us
         """
         return sp.set_type_expr(sp.record(executor=executor, 
@@ -24,19 +55,23 @@ class Job:
                 end=end, 
                 interval=interval, 
                 fee=fee, 
-                contract=contract), Job.get_publish_type())
+                contract=contract,
+                slot=slot if slot is not None else Slot.make()), Job.get_publish_type(compact_script))
 
     def get_type():
-        """Type used for the storage
+        """Type used for the storage, last_paid_epoch is the last epoch of the job (see JobScheduler.job_epoch) the fee was accrued
+        for, -1 before the first paid fulfill.
         """
         return sp.TRecord(status=sp.TNat, 
                 start=sp.TTimestamp, 
                 end=sp.TTimestamp, 
                 interval=sp.TNat, 
                 fee=sp.TNat, 
-                contract=sp.TAddress).layout(("status", ("start", ("end", ("interval", ("fee", "contract"))))))
+                contract=sp.TAddress,
+                slot=Slot.get_type(),
+                last_paid_epoch=sp.TInt).layout(("status", ("start", ("end", ("interval", ("fee", ("contract", ("slot", "last_paid_epoch"))))))))
 
-    def make(status, start, end, interval, fee, contract):
+    def make(status, start, end, interval, fee, contract, slot=None, last_paid_epoch=-1):
         """Courtesy function typing a record to Job.get_type() for us
         """
         return sp.set_type_expr(sp.record(status=status, 
@@ -44,33 +79,79 @@ class Job:
                 end=end, 
                 interval=interval, 
                 fee=fee, 
-                contract=contract), Job.get_type())
+                contract=contract,
+                slot=slot if slot is not None else Slot.make(),
+                last_paid_epoch=sp.int(last_paid_epoch)), Job.get_type())
 
 class Fulfill:
     """Type used by the datatransmitter to fulfill a Job
     """
-    def get_type():
+    def get_type(compact_script=False):
         """Type used in the fulfill entrypoint.
         """
-        return sp.TRecord(script=sp.TBytes, payload=sp.TBytes).layout(("script","payload"))
+        return sp.TRecord(script=Script.get_type(compact_script), payload=sp.TBytes).layout(("script","payload"))
     
-    def make(script, payload):
+    def make(script, payload, compact_script=False):
         """Courtesy function typing a record to Fulfill.get_type() for us
         """
         return sp.set_type_expr(sp.record(script=script, 
-                payload=payload), Fulfill.get_type())
+                payload=payload), Fulfill.get_type(compact_script))
+
+class ScheduledJob:
+    """Type returned by the JobScheduler views: a job of an executor with its next due slot.
+    """
+    def get_type(compact_script=False):
+        """next_due is the first slot of the executor (start + n*interval plus its Slot offset in epoch n) at or after the time asked
+        for, none if the job ends before it.
+        """
+        return sp.TRecord(script=Script.get_type(compact_script),
+                job=Job.get_type(),
+                next_due=sp.TOption(sp.TTimestamp)).layout(("script", ("job", "next_due")))
+
+    def make(script, job, next_due, compact_script=False):
+        """Courtesy function typing a record to ScheduledJob.get_type() for us
+        """
+        return sp.set_type_expr(sp.record(script=script,
+                job=job,
+                next_due=next_due), ScheduledJob.get_type(compact_script))
 
 class JobScheduler(sp.Contract):
     """Scheduler used to point the data transmitter to. This is where they fetch jobs and fulfill them.
+
+    Receiving contracts built for direct fulfill (i.e. PriceOracle(direct_fulfill=True)) are not called through the fulfill entrypoint.
+    For those the scheduler only keeps the bookkeeping: the executor fetches and acks its job here, then sends the Fulfill straight
+    to the job's contract while the job's start, interval and end are respected off-chain.
+
+    Every job is indexed in expiries by the epoch of its end, so that jobs which expired without their final fulfill can be found
+    and removed by anyone with prune.
+
+    The fee (in mutez) of a job is accrued to the executor in fees once per epoch of the job, by its first fulfill in the epoch,
+    owed_fees is the sum of all fees. Only acknowledged jobs can be fulfilled, and not before their start. Executors are paid out with
+    claim from the tez sent to the default entrypoint, the admin can withdraw what is not owed to them.
+
+    Executors sharing a feed can be given staggered slots (see Slot): primaries fulfill at the start of the epoch, backups only
+    later in it, and fulfill rejects a staggered job before the executor's slot. Backups check the receiving contract's state off-chain
+    (utils.slots.should_submit) and skip the epoch once it finalized, so an epoch gets about response_threshold fulfills. A backup
+    fulfill after the finalization is still forwarded but not paid (see receiver_finalized).
+
+    If compact_scripts is set jobs and fulfills reference the script by a nat id instead of the uri (see CompactJobScheduler).
     """
-    def __init__(self, admin):
-        """Initialises the storage with jobs and the admin mechanism
+    def __init__(self, admin, lazy_entry_points=False, compact_scripts=False):
+        """Initialises the storage with jobs and the admin mechanism. If lazy_entry_points is set every entrypoint but
+        fulfill is compiled into a lazily loaded big_map lambda.
         """
+        self.compact_scripts = compact_scripts
         self.init(
             admin=admin,
             proposed_admin=admin,
-            jobs=sp.big_map(tkey=sp.TAddress, tvalue=sp.TMap(sp.TBytes, Job.get_type()))
+            jobs=sp.big_map(tkey=sp.TAddress, tvalue=sp.TMap(Script.get_type(compact_scripts), Job.get_type())),
+            expiries=sp.big_map(tkey=sp.TNat, tvalue=sp.TSet(sp.TPair(sp.TAddress, Script.get_type(compact_scripts)))),
+            fees=sp.big_map(tkey=sp.TAddress, tvalue=sp.TNat),
+            owed_fees=sp.nat(0)
         )
+        if lazy_entry_points:
+            self.add_flag("lazy-entry-points")
+
     
     @sp.entry_point
     def publish(self, job):
@@ -78,20 +159,42 @@ class JobScheduler(sp.Contract):
         will overwrite the previous definition. Once it's published the data transmitter first ack's the job and then at the requested
         timestamp will fulfill it. Only Admin can do this.
         """
-        sp.set_type(job, Job.get_publish_type())
+        sp.set_type(job, Job.get_publish_type(self.compact_scripts))
         sp.verify(sp.sender==self.data.admin)
+        self.verify_script(job.script)
+        sp.verify((job.slot.rank < job.slot.group_size) & (job.slot.primaries <= job.slot.group_size))
+        sp.verify(sp.as_nat(job.slot.group_size - job.slot.primaries) * job.slot.spacing < sp.max(job.interval, 1))
 
         with sp.if_(~self.data.jobs.contains(job.executor)):
             self.data.jobs[job.executor] = {}
-        self.data.jobs[job.executor][job.script] = Job.make(0, job.start, job.end, job.interval, job.fee, job.contract)
+        with sp.if_(self.data.jobs[job.executor].contains(job.script)):
+            self.unindex_job(job.executor, job.script, self.data.jobs[job.executor][job.script].end)
+        self.data.jobs[job.executor][job.script] = Job.make(0, job.start, job.end, job.interval, job.fee, job.contract, job.slot)
+        self.index_job(job.executor, job.script, job.end)
 
     @sp.entry_point
     def delete(self, executor, script):
-        """Delete a job. Only Admin can do this.
+        """Delete a job, deleting a job that does not exist does nothing. Only Admin can do this.
         """
         sp.verify(sp.sender==self.data.admin)
         
-        del self.data.jobs[executor][script]
+        self.remove_job(executor, script)
+
+    @sp.entry_point
+    def prune(self, jobs):
+        """Delete the expired jobs (end reached) of the (executor, script) list, at most Constants.JOB_PRUNE_BATCH per call. Anyone
+        can do this, the candidates are read off-chain from the expiries of past epochs. Jobs which are gone or not expired are skipped
+        so that concurrent prunes do not fail each other.
+        """
+        sp.set_type(jobs, sp.TList(sp.TPair(sp.TAddress, Script.get_type(self.compact_scripts))))
+        sp.verify(sp.len(jobs) <= Constants.JOB_PRUNE_BATCH)
+
+        with sp.for_("job", jobs) as job:
+            executor = sp.fst(job)
+            script = sp.snd(job)
+            with sp.if_(self.data.jobs.get(executor, sp.map(tkey=Script.get_type(self.compact_scripts), tvalue=Job.get_type())).contains(script)):
+                with sp.if_(self.data.jobs[executor][script].end <= sp.now):
+                    self.remove_job(executor, script)
 
     @sp.entry_point
     def propose_admin(self, proposed_admin):
@@ -107,23 +210,227 @@ class JobScheduler(sp.Contract):
         sp.verify(sp.sender==self.data.proposed_admin)
         self.data.admin = self.data.proposed_admin
 
+    @sp.entry_point
+    def default(self):
+        """Fund the fee payouts. Anyone can do this.
+        """
+        pass
+
+    @sp.entry_point
+    def withdraw(self, amount):
+        """Send amount of the balance not owed to executors (balance - owed_fees) to Admin. Only Admin can do this.
+        """
+        sp.set_type(amount, sp.TMutez)
+        sp.verify(sp.sender==self.data.admin)
+        sp.verify(amount + sp.utils.nat_to_mutez(self.data.owed_fees) <= sp.balance)
+        sp.send(self.data.admin, amount)
+
+    @sp.entry_point
+    def claim(self, executor):
+        """Pay out all fees accrued by the executor to the executor. Only the executor or Admin can do this.
+        """
+        sp.set_type(executor, sp.TAddress)
+        sp.verify((sp.sender==executor) | (sp.sender==self.data.admin))
+        amount = sp.compute(self.data.fees.get(executor, 0))
+        sp.verify(amount > 0)
+
+        del self.data.fees[executor]
+        self.data.owed_fees = sp.as_nat(self.data.owed_fees - amount)
+        sp.send(executor, sp.utils.nat_to_mutez(amount))
+
     @sp.entry_point
     def ack(self, script):
         """Acknowledge a job. Sender needs to be an executor and script needs to match the published jobs.
         """
         self.data.jobs[sp.sender][script].status = 1
 
-    @sp.entry_point
+    @sp.entry_point(lazify=False)
     def fulfill(self, fulfill):
-        """Fulfill a job and provide the expected payload to the receiving contract.
+        """Fulfill an acknowledged job and provide the expected payload to the receiving contract. The fee is accrued by the first
+        fulfill of each epoch of the job, further fulfills in the same epoch are forwarded without paying again. A backup of a staggered
+        job is not paid once the receiving contract finalized its epoch.
         """
-        sp.set_type(fulfill, Fulfill.get_type())
+        sp.set_type(fulfill, Fulfill.get_type(self.compact_scripts))
         job = sp.local("job", self.data.jobs[sp.sender][fulfill.script])  
-        callback_contract = sp.contract(Fulfill.get_type(), job.value.contract, "fulfill").open_some()
+        sp.verify((job.value.status == 1) & (sp.now >= job.value.start))
+        epoch = sp.compute(self.job_epoch(job.value, sp.now))
+        paid = sp.local("paid", job.value.last_paid_epoch < sp.to_int(epoch))
+        with sp.if_(job.value.slot.group_size > 1):
+            sp.verify(sp.now >= self.epoch_slot(job.value, epoch))
+            with sp.if_(paid.value & (self.slot_position(job.value, epoch) >= job.value.slot.primaries)):
+                paid.value = ~self.receiver_finalized(job.value)
+        callback_contract = sp.contract(Fulfill.get_type(self.compact_scripts), job.value.contract, "fulfill").open_some()
         sp.transfer(fulfill, sp.mutez(0), callback_contract)
+        with sp.if_(paid.value):
+            self.data.fees[sp.sender] = self.data.fees.get(sp.sender, 0) + job.value.fee
+            self.data.owed_fees += job.value.fee
+            self.data.jobs[sp.sender][fulfill.script].last_paid_epoch = sp.to_int(epoch)
         with sp.if_(job.value.end <= sp.now.add_seconds(sp.to_int(job.value.interval))):
             del self.data.jobs[sp.sender][fulfill.script]
+            with sp.if_(sp.len(self.data.jobs[sp.sender]) == 0):
+                del self.data.jobs[sp.sender]
+            self.unindex_job(sp.sender, fulfill.script, job.value.end)
 
+    def verify_script(self, script):
+        """Inlined into publish, checks the script of a published job. Any uri is accepted here, CompactJobScheduler only accepts
+        registered ids.
+        """
+        pass
+
+    def expiry_epoch(self, end):
+        return sp.as_nat(end - sp.timestamp(0)) // Constants.ORACLE_EPOCH_INTERVAL
+
+    def index_job(self, executor, script, end):
+        """Inlined, adds the job to the expiries of the epoch of end.
+        """
+        epoch = sp.compute(self.expiry_epoch(end))
+        with sp.if_(~self.data.expiries.contains(epoch)):
+            self.data.expiries[epoch] = sp.set([])
+        self.data.expiries[epoch].add(sp.pair(executor, script))
+
+    def unindex_job(self, executor, script, end):
+        """Inlined, removes the job from the expiries of the epoch of end and drops the epoch once it is empty.
+        """
+        epoch = sp.compute(self.expiry_epoch(end))
+        with sp.if_(self.data.expiries.contains(epoch)):
+            self.data.expiries[epoch].remove(sp.pair(executor, script))
+            with sp.if_(sp.len(self.data.expiries[epoch]) == 0):
+                del self.data.expiries[epoch]
+
+    def remove_job(self, executor, script):
+        """Inlined, deletes the job and its expiry entry, nothing if the job does not exist. The jobs map of the executor is
+        dropped once its last job is gone.
+        """
+        with sp.if_(self.data.jobs.get(executor, sp.map(tkey=Script.get_type(self.compact_scripts), tvalue=Job.get_type())).contains(script)):
+            self.unindex_job(executor, script, self.data.jobs[executor][script].end)
+            del self.data.jobs[executor][script]
+            with sp.if_(sp.len(self.data.jobs[executor]) == 0):
+                del self.data.jobs[executor]
+
+    def job_epoch(self, job, timestamp):
+        """Inlined, the epoch of the job timestamp falls into (intervals since start), 0 before start.
+        """
+        epoch = sp.local("epoch", sp.nat(0))
+        with sp.if_(timestamp > job.start):
+            epoch.value = sp.as_nat(timestamp - job.start) // sp.max(job.interval, 1)
+        return epoch.value
+
+    def slot_position(self, job, epoch):
+        """Inlined, the position of the executor of job in epoch, positions from job.slot.primaries on are backups.
+        """
+        return (job.slot.rank + epoch) % job.slot.group_size
+
+    def epoch_slot(self, job, epoch):
+        """Inlined, the time the executor of job is due in epoch, its Slot offset after the start of the epoch.
+        """
+        position = sp.compute(self.slot_position(job, epoch))
+        offset = sp.as_nat(sp.max(position + 1, job.slot.primaries) - job.slot.primaries) * job.slot.spacing
+        return job.start.add_seconds(sp.to_int(epoch * sp.max(job.interval, 1) + offset))
+
+    def receiver_finalized(self, job):
+        """Inlined into fulfill, whether the receiving contract of job already finalized the epoch of sp.now. It is read with the
+        get_last_epoch view of the PriceOracle, before the forwarded fulfill runs, and the receiver's epochs are taken to be job
+        intervals counted from timestamp 0 (the PriceOracle epoch_interval). A receiver without the view counts as finalized, so
+        backups of such jobs are never paid.
+        """
+        last_epoch = sp.compute(sp.view("get_last_epoch", job.contract, sp.unit, t=sp.TNat))
+        finalized = sp.local("finalized", True)
+        with sp.if_(last_epoch.is_some()):
+            finalized.value = last_epoch.open_some() >= sp.as_nat(sp.now - sp.timestamp(0)) // sp.max(job.interval, 1)
+        return finalized.value
+
+    def scheduled_jobs(self, executor, since, until=None):
+        """Inlined into the views. Lists the jobs of executor (in script order) with their first slot at or after since, only the
+        ones with a slot before until if it is given. A job with interval 0 is due every second.
+        """
+        scheduled = sp.local("scheduled", sp.list([], t=ScheduledJob.get_type(self.compact_scripts)))
+        with sp.for_("item", self.data.jobs.get(executor, sp.map(tkey=Script.get_type(self.compact_scripts), tvalue=Job.get_type())).items()) as item:
+            job = item.value
+            epoch = sp.compute(self.job_epoch(job, since))
+            slot = sp.local("slot", self.epoch_slot(job, epoch))
+            with sp.if_(slot.value < since):
+                slot.value = self.epoch_slot(job, epoch + 1)
+            next_due = sp.local("next_due", sp.none)
+            with sp.if_(slot.value < job.end):
+                next_due.value = sp.some(slot.value)
+            if until is None:
+                scheduled.value.push(ScheduledJob.make(item.key, job, next_due.value, self.compact_scripts))
+            else:
+                with sp.if_(next_due.value.is_some() & (slot.value < until)):
+                    scheduled.value.push(ScheduledJob.make(item.key, job, next_due.value, self.compact_scripts))
+        return scheduled.value.rev()
+
+    @sp.onchain_view()
+    def get_jobs(self, executor):
+        """Onchain view returning all jobs of the executor with their status and next due slot computed from sp.now, executors
+        read their schedule with one run_script_view instead of walking the jobs big_map.
+        """
+        sp.set_type(executor, sp.TAddress)
+        sp.result(self.scheduled_jobs(executor, sp.now))
+
+    @sp.onchain_view()
+    def get_fee_balance(self, executor):
+        """Onchain view returning the fees in mutez the executor can claim.
+        """
+        sp.set_type(executor, sp.TAddress)
+        sp.result(self.data.fees.get(executor, 0))
+
+    @sp.onchain_view()
+    def get_owed_fees(self):
+        """Onchain view returning the fees in mutez of all executors not claimed yet, the balance the scheduler needs to pay them.
+        """
+        sp.result(self.data.owed_fees)
+
+    @sp.onchain_view()
+    def get_due_jobs(self, window):
+        """Onchain view returning only the jobs of the executor with a slot in [since, until).
+        """
+        sp.set_type(window, sp.TRecord(executor=sp.TAddress, since=sp.TTimestamp, until=sp.TTimestamp).layout(("executor", ("since", "until"))))
+        sp.result(self.scheduled_jobs(window.executor, window.since, window.until))
+
+class CompactJobScheduler(JobScheduler):
+    """Same as the JobScheduler with a script registry: the admin registers every script uri once and the uri gets the next nat id.
+    Jobs, fulfills and the receiving contract (i.e. PriceOracle(compact_scripts=True)) reference the script by that id, which saves
+    the ~53 bytes uri in every fulfill and hashes a nat instead of the uri in the job lookup.
+    """
+    def __init__(self, admin, **kwargs):
+        JobScheduler.__init__(self, admin, compact_scripts=True, **kwargs)
+        self.update_initial_storage(
+            scripts=sp.big_map(tkey=sp.TNat, tvalue=sp.TBytes),
+            script_ids=sp.big_map(tkey=sp.TBytes, tvalue=sp.TNat),
+            next_script_id=sp.nat(0)
+        )
+
+    def verify_script(self, script):
+        """Inlined into publish, only registered script ids can be published.
+        """
+        sp.verify(self.data.scripts.contains(script))
+
+    @sp.entry_point
+    def register_script(self, script):
+        """Register a script uri under the next id. A uri is only registered once. Only Admin can do this.
+        """
+        sp.set_type(script, sp.TBytes)
+        sp.verify(sp.sender==self.data.admin)
+        sp.verify(~self.data.script_ids.contains(script))
+
+        self.data.scripts[self.data.next_script_id] = script
+        self.data.script_ids[script] = self.data.next_script_id
+        self.data.next_script_id += 1
+
+    @sp.onchain_view()
+    def get_script(self, script_id):
+        """Onchain view returning the uri of a script id.
+        """
+        sp.set_type(script_id, sp.TNat)
+        sp.result(self.data.scripts[script_id])
+
+    @sp.onchain_view()
+    def get_script_id(self, script):
+        """Onchain view returning the id of a registered script uri.
+        """
+        sp.set_type(script, sp.TBytes)
+        sp.result(self.data.script_ids[script])
 
 class Fulfiller(sp.Contract):
     """This is a dummy contract that can be used to 'receive' and inspect the payload you receive from 
@@ -151,7 +458,8 @@ class Fulfiller(sp.Contract):
         self.data.payload = fulfill.payload
 
 if "templates" not in __name__:
-    @sp.add_test(name = "Job Scheduler")
+    from utils.testing import add_test
+    @add_test(name = "Job Scheduler")
     def test():
         scenario = sp.test_scenario()
         scenario.h1("Job Scheduler")
@@ -217,6 +525,11 @@ if "templates" not in __name__:
         scenario += scheduler.delete(executor=executor.address, script=script).run(sender=administrator.address)
         scenario.verify_equal(scheduler.data.jobs[executor.address].contains(script), False)
 
+        scenario.p("Deleting a job that does not exist does nothing")
+        scenario += scheduler.delete(executor=executor.address, script=script).run(sender=administrator.address)
+        scenario += scheduler.delete(executor=alice.address, script=script).run(sender=administrator.address)
+        scenario.verify_equal(scheduler.data.jobs[executor.address].contains(sp.bytes('0x00')), True)
+
         scenario.h2("Ack Jobs")
         script = sp.bytes('0x00')
         scenario.p("Alice cannot acknowledge a job")
@@ -246,4 +559,281 @@ if "templates" not in __name__:
         payload = sp.pack(sp.address("tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83"))
         scenario += scheduler.fulfill(Fulfill.make(script, payload)).run(sender=executor.address, now=end)
         scenario.verify_equal(fulfiller.data.payload, payload)
-        scenario.verify_equal(scheduler.data.jobs[executor.address].contains(script), False)
\ No newline at end of file
+        scenario.verify_equal(scheduler.data.jobs.contains(executor.address), False)
+
+    class JobReader(sp.Contract):
+        """Test contract storing the result of the scheduler views at the time of the call.
+        """
+        def __init__(self, scheduler):
+            self.init(scheduler=scheduler, jobs=sp.list([], t=ScheduledJob.get_type()))
+
+        @sp.entry_point
+        def read_jobs(self, executor):
+            self.data.jobs = sp.view("get_jobs", self.data.scheduler, executor, t=sp.TList(ScheduledJob.get_type())).open_some()
+
+        @sp.entry_point
+        def read_due_jobs(self, window):
+            self.data.jobs = sp.view("get_due_jobs", self.data.scheduler, window, t=sp.TList(ScheduledJob.get_type())).open_some()
+
+    @add_test(name = "Job Scheduler Views")
+    def test():
+        scenario = sp.test_scenario()
+        scenario.h1("Job Scheduler Views")
+
+        scenario.h2("Bootstrapping")
+        administrator = sp.test_account("Administrator")
+        executor = sp.test_account("Executor")
+        scheduler = JobScheduler(administrator.address)
+        scenario += scheduler
+        reader = JobReader(scheduler.address)
+        scenario += reader
+
+        fulfiller = sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83')
+        scenario += scheduler.publish(Job.make_publish(executor.address, sp.bytes('0x00'), sp.timestamp(0), sp.timestamp(1800), 900, 1700, fulfiller)).run(sender=administrator.address)
+        scenario += scheduler.publish(Job.make_publish(executor.address, sp.bytes('0x01'), sp.timestamp(1000), sp.timestamp(5000), 600, 1700, fulfiller)).run(sender=administrator.address)
+        job_0 = Job.make(0, sp.timestamp(0), sp.timestamp(1800), 900, 1700, fulfiller)
+        job_1 = Job.make(0, sp.timestamp(1000), sp.timestamp(5000), 600, 1700, fulfiller)
+
+        scenario.h2("Jobs with their next due slot")
+        scenario += reader.read_jobs(executor.address).run(now=sp.timestamp(100))
+        scenario.verify_equal(reader.data.jobs, [ScheduledJob.make(sp.bytes('0x00'), job_0, sp.some(sp.timestamp(900))), ScheduledJob.make(sp.bytes('0x01'), job_1, sp.some(sp.timestamp(1000)))])
+        scenario += reader.read_jobs(executor.address).run(now=sp.timestamp(1601))
+        scenario.verify_equal(reader.data.jobs, [ScheduledJob.make(sp.bytes('0x00'), job_0, sp.none), ScheduledJob.make(sp.bytes('0x01'), job_1, sp.some(sp.timestamp(2200)))])
+        scenario.p("Executors without jobs get an empty list")
+        scenario += reader.read_jobs(administrator.address).run(now=sp.timestamp(100))
+        scenario.verify_equal(reader.data.jobs, [])
+
+        scenario.h2("Jobs due in a window")
+        scenario += reader.read_due_jobs(sp.record(executor=executor.address, since=sp.timestamp(100), until=sp.timestamp(1000)))
+        scenario.verify_equal(reader.data.jobs, [ScheduledJob.make(sp.bytes('0x00'), job_0, sp.some(sp.timestamp(900)))])
+        scenario += reader.read_due_jobs(sp.record(executor=executor.address, since=sp.timestamp(1801), until=sp.timestamp(2200)))
+        scenario.verify_equal(reader.data.jobs, [])
+
+    @add_test(name = "Job Scheduler Pruning")
+    def test():
+        scenario = sp.test_scenario()
+        scenario.h1("Job Scheduler Pruning")
+
+        scenario.h2("Bootstrapping")
+        administrator = sp.test_account("Administrator")
+        alice = sp.test_account("Alice")
+        executor = sp.test_account("Executor")
+        scheduler = JobScheduler(administrator.address)
+        scenario += scheduler
+
+        fulfiller = sp.address('tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83')
+        scenario += scheduler.publish(Job.make_publish(executor.address, sp.bytes('0x00'), sp.timestamp(0), sp.timestamp(1800), 900, 1700, fulfiller)).run(sender=administrator.address)
+        scenario += scheduler.publish(Job.make_publish(executor.address, sp.bytes('0x01'), sp.timestamp(0), sp.timestamp(1900), 900, 1700, fulfiller)).run(sender=administrator.address)
+        scenario += scheduler.publish(Job.make_publish(executor.address, sp.bytes('0x02'), sp.timestamp(0), sp.timestamp(9000), 900, 1700, fulfiller)).run(sender=administrator.address)
+
+        scenario.h2("Expiry index")
+        scenario.verify_equal(scheduler.data.expiries[2], sp.set([sp.pair(executor.address, sp.bytes('0x00')), sp.pair(executor.address, sp.bytes('0x01'))]))
+        scenario.verify_equal(scheduler.data.expiries[10], sp.set([sp.pair(executor.address, sp.bytes('0x02'))]))
+        scenario.p("Republishing moves the job to the epoch of its new end")
+        scenario += scheduler.publish(Job.make_publish(executor.address, sp.bytes('0x02'), sp.timestamp(0), sp.timestamp(9900), 900, 1700, fulfiller)).run(sender=administrator.address)
+        scenario.verify_equal(scheduler.data.expiries.contains(10), False)
+        scenario.verify_equal(scheduler.data.expiries[11], sp.set([sp.pair(executor.address, sp.bytes('0x02'))]))
+
+        scenario.h2("Prune")
+        jobs = [sp.pair(executor.address, sp.bytes('0x00')), sp.pair(executor.address, sp.bytes('0x01')), sp.pair(executor.address, sp.bytes('0x02')), sp.pair(alice.address, sp.bytes('0x00'))]
+        scenario.p("Anyone can prune, only expired jobs are deleted and unknown jobs are skipped")
+        scenario += scheduler.prune(jobs).run(sender=alice.address, now=sp.timestamp(1800))
+        scenario.verify_equal(scheduler.data.jobs[executor.address].contains(sp.bytes('0x00')), False)
+        scenario.verify_equal(scheduler.data.jobs[executor.address].contains(sp.bytes('0x01')), True)
+        scenario.verify_equal(scheduler.data.jobs[executor.address].contains(sp.bytes('0x02')), True)
+        scenario.verify_equal(scheduler.data.expiries[2], sp.set([sp.pair(executor.address, sp.bytes('0x01'))]))
+        scenario += scheduler.prune(jobs).run(sender=alice.address, now=sp.timestamp(1900))
+        scenario.verify_equal(scheduler.data.jobs[executor.address].contains(sp.bytes('0x01')), False)
+        scenario.verify_equal(scheduler.data.expiries.contains(2), False)
+
+        scenario.p("Batches are bounded")
+        scenario += scheduler.prune([sp.pair(executor.address, sp.bytes('0x02'))] * (Constants.JOB_PRUNE_BATCH + 1)).run(sender=alice.address, now=sp.timestamp(9900), valid=False)
+
+        scenario.p("Pruning the last job of an executor drops its jobs map")
+        scenario += scheduler.prune([sp.pair(executor.address, sp.bytes('0x02'))]).run(sender=alice.address, now=sp.timestamp(9900))
+        scenario.verify_equal(scheduler.data.jobs.contains(executor.address), False)
+        scenario.verify_equal(scheduler.data.expiries.contains(11), False)
+
+        scenario.h2("Delete and final fulfill leave the index")
+        scenario += scheduler.publish(Job.make_publish(executor.address, sp.bytes('0x02'), sp.timestamp(0), sp.timestamp(9900), 900, 1700, fulfiller)).run(sender=administrator.address)
+        scenario += scheduler.delete(executor=executor.address, script=sp.bytes('0x02')).run(sender=administrator.address)
+        scenario.verify_equal(scheduler.data.expiries.contains(11), False)
+        scenario.verify_equal(scheduler.data.jobs.contains(executor.address), False)
+        fulfiller = Fulfiller()
+        scenario += fulfiller
+        scenario += scheduler.publish(Job.make_publish(executor.address, sp.bytes('0x03'), sp.timestamp(0), sp.timestamp(1800), 900, 1700, fulfiller.address)).run(sender=administrator.address)
+        scenario += scheduler.ack(sp.bytes('0x03')).run(sender=executor.address)
+        scenario += scheduler.fulfill(Fulfill.make(sp.bytes('0x03'), sp.bytes('0x00'))).run(sender=executor.address, now=sp.timestamp(1800))
+        scenario.verify_equal(scheduler.data.expiries.contains(2), False)
+        scenario.verify_equal(scheduler.data.jobs.contains(executor.address), False)
+
+    class FeeReader(sp.Contract):
+        """Test contract storing the results of the scheduler fee views.
+        """
+        def __init__(self, scheduler):
+            self.init(scheduler=scheduler, balance=sp.nat(0), owed=sp.nat(0))
+
+        @sp.entry_point
+        def read(self, executor):
+            self.data.balance = sp.view("get_fee_balance", self.data.scheduler, executor, t=sp.TNat).open_some()
+            self.data.owed = sp.view("get_owed_fees", self.data.scheduler, sp.unit, t=sp.TNat).open_some()
+
+    @add_test(name = "Job Scheduler Fees")
+    def test():
+        scenario = sp.test_scenario()
+        scenario.h1("Job Scheduler Fees")
+
+        scenario.h2("Bootstrapping")
+        administrator = sp.test_account("Administrator")
+        alice = sp.test_account("Alice")
+        executor = sp.test_account("Executor")
+        scheduler = JobScheduler(administrator.address)
+        scenario += scheduler
+        fulfiller = Fulfiller()
+        scenario += fulfiller
+        reader = FeeReader(scheduler.address)
+        scenario += reader
+
+        script = sp.bytes('0x00')
+        scenario += scheduler.publish(Job.make_publish(executor.address, script, sp.timestamp(900), sp.timestamp(9900), 900, 1700, fulfiller.address)).run(sender=administrator.address)
+
+        scenario.h2("Only acknowledged jobs are fulfilled, from their start on")
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes('0x00'))).run(sender=executor.address, now=sp.timestamp(900), valid=False)
+        scenario += scheduler.ack(script).run(sender=executor.address)
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes('0x00'))).run(sender=executor.address, now=sp.timestamp(899), valid=False)
+
+        scenario.h2("Fees accrue once per epoch")
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes('0x00'))).run(sender=executor.address, now=sp.timestamp(900))
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes('0x00'))).run(sender=executor.address, now=sp.timestamp(1800))
+        scenario.verify_equal(scheduler.data.fees[executor.address], 3400)
+        scenario.verify_equal(scheduler.data.jobs[executor.address][script].last_paid_epoch, 1)
+        scenario.p("Fulfilling again in the same epoch is forwarded but not paid")
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes('0x01'))).run(sender=executor.address, now=sp.timestamp(1801))
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes('0x02'))).run(sender=executor.address, now=sp.timestamp(2699))
+        scenario.verify_equal(fulfiller.data.payload, sp.bytes('0x02'))
+        scenario.verify_equal(scheduler.data.fees[executor.address], 3400)
+        scenario.verify_equal(scheduler.data.owed_fees, 3400)
+        scenario += reader.read(executor.address)
+        scenario.verify_equal(reader.data.balance, 3400)
+        scenario.verify_equal(reader.data.owed, 3400)
+        scenario += reader.read(alice.address)
+        scenario.verify_equal(reader.data.balance, 0)
+
+        scenario.h2("Claim")
+        scenario.p("Claims fail until the scheduler is funded")
+        scenario += scheduler.claim(executor.address).run(sender=executor.address, valid=False)
+        scenario += scheduler.default().run(sender=alice.address, amount=sp.mutez(10000))
+        scenario.p("Alice cannot claim the fees of the executor")
+        scenario += scheduler.claim(executor.address).run(sender=alice.address, valid=False)
+        scenario.p("Executor claims the fees of both epochs at once")
+        scenario += scheduler.claim(executor.address).run(sender=executor.address)
+        scenario.verify_equal(scheduler.balance, sp.mutez(6600))
+        scenario.verify_equal(scheduler.data.fees.contains(executor.address), False)
+        scenario.verify_equal(scheduler.data.owed_fees, 0)
+        scenario.p("Nothing left to claim")
+        scenario += scheduler.claim(executor.address).run(sender=executor.address, valid=False)
+
+        scenario.p("Admin can settle on behalf of the executor")
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes('0x00'))).run(sender=executor.address, now=sp.timestamp(2700))
+        scenario += scheduler.claim(executor.address).run(sender=administrator.address)
+        scenario.verify_equal(scheduler.balance, sp.mutez(4900))
+
+        scenario.h2("Withdraw")
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes('0x00'))).run(sender=executor.address, now=sp.timestamp(3600))
+        scenario.verify_equal(scheduler.data.owed_fees, 1700)
+        scenario.p("Alice cannot withdraw")
+        scenario += scheduler.withdraw(sp.mutez(100)).run(sender=alice.address, valid=False)
+        scenario.p("Admin cannot withdraw the fees owed to the executors")
+        scenario += scheduler.withdraw(sp.mutez(3201)).run(sender=administrator.address, valid=False)
+        scenario += scheduler.withdraw(sp.mutez(3200)).run(sender=administrator.address)
+        scenario.verify_equal(scheduler.balance, sp.mutez(1700))
+        scenario += scheduler.claim(executor.address).run(sender=executor.address)
+        scenario.verify_equal(scheduler.balance, sp.mutez(0))
+
+    class EpochFulfiller(Fulfiller):
+        """Test receiver with the get_last_epoch view of the PriceOracle, the finalized epoch is set with set_last_epoch.
+        """
+        def __init__(self):
+            Fulfiller.__init__(self)
+            self.update_initial_storage(last_epoch=sp.nat(0))
+
+        @sp.entry_point
+        def set_last_epoch(self, last_epoch):
+            self.data.last_epoch = last_epoch
+
+        @sp.onchain_view()
+        def get_last_epoch(self):
+            sp.result(self.data.last_epoch)
+
+    @add_test(name = "Job Scheduler Slots")
+    def test():
+        scenario = sp.test_scenario()
+        scenario.h1("Job Scheduler Slots")
+
+        scenario.h2("Bootstrapping")
+        administrator = sp.test_account("Administrator")
+        executors = [sp.test_account("Executor {}".format(rank)) for rank in range(3)]
+        scheduler = JobScheduler(administrator.address)
+        scenario += scheduler
+        fulfiller = Fulfiller()
+        scenario += fulfiller
+        reader = JobReader(scheduler.address)
+        scenario += reader
+
+        script = sp.bytes('0x00')
+        scenario.p("Ranks have to fit in the group and the backups in the interval")
+        scenario += scheduler.publish(Job.make_publish(executors[0].address, script, sp.timestamp(0), sp.timestamp(9000), 900, 1700, fulfiller.address, slot=Slot.make(3, 3, 2, 60))).run(sender=administrator.address, valid=False)
+        scenario += scheduler.publish(Job.make_publish(executors[0].address, script, sp.timestamp(0), sp.timestamp(9000), 900, 1700, fulfiller.address, slot=Slot.make(0, 3, 2, 900))).run(sender=administrator.address, valid=False)
+        for rank in range(3):
+            scenario += scheduler.publish(Job.make_publish(executors[rank].address, script, sp.timestamp(0), sp.timestamp(9000), 900, 1700, fulfiller.address, slot=Slot.make(rank, 3, 2, 60))).run(sender=administrator.address)
+            scenario += scheduler.ack(script).run(sender=executors[rank].address)
+
+        scenario.h2("Primaries fulfill at the epoch start, the backup from its slot on")
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes('0x00'))).run(sender=executors[0].address, now=sp.timestamp(0))
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes('0x00'))).run(sender=executors[1].address, now=sp.timestamp(0))
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes('0x00'))).run(sender=executors[2].address, now=sp.timestamp(59), valid=False)
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes('0x01'))).run(sender=executors[2].address, now=sp.timestamp(60))
+        scenario.p("The receiver has no get_last_epoch view, so the backup is forwarded but not paid")
+        scenario.verify_equal(fulfiller.data.payload, sp.bytes('0x01'))
+        scenario.verify_equal(scheduler.data.fees[executors[0].address], 1700)
+        scenario.verify_equal(scheduler.data.fees[executors[1].address], 1700)
+        scenario.verify_equal(scheduler.data.fees.contains(executors[2].address), False)
+        scenario.verify_equal(scheduler.data.jobs[executors[2].address][script].last_paid_epoch, -1)
+
+        scenario.h2("Roles rotate every epoch")
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes('0x00'))).run(sender=executors[2].address, now=sp.timestamp(900))
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes('0x00'))).run(sender=executors[1].address, now=sp.timestamp(930), valid=False)
+        scenario += scheduler.fulfill(Fulfill.make(script, sp.bytes('0x00'))).run(sender=executors[1].address, now=sp.timestamp(960))
+        scenario.verify_equal(scheduler.data.fees[executors[2].address], 1700)
+        scenario.verify_equal(scheduler.data.fees[executors[1].address], 1700)
+
+        scenario.h2("Views return the slot of the executor")
+        job = Job.make(1, sp.timestamp(0), sp.timestamp(9000), 900, 1700, fulfiller.address, Slot.make(1, 3, 2, 60), last_paid_epoch=0)
+        scenario += reader.read_jobs(executors[1].address).run(now=sp.timestamp(100))
+        scenario.verify_equal(reader.data.jobs, [ScheduledJob.make(script, job, sp.some(sp.timestamp(960)))])
+        scenario += reader.read_jobs(executors[1].address).run(now=sp.timestamp(960))
+        scenario.verify_equal(reader.data.jobs, [ScheduledJob.make(script, job, sp.some(sp.timestamp(960)))])
+        scenario += reader.read_jobs(executors[1].address).run(now=sp.timestamp(961))
+        scenario.verify_equal(reader.data.jobs, [ScheduledJob.make(script, job, sp.some(sp.timestamp(1800)))])
+
+        scenario.h2("Backups are paid until the receiver finalizes the epoch")
+        receiver = EpochFulfiller()
+        scenario += receiver
+        paid_script = sp.bytes('0x01')
+        for rank in range(3):
+            scenario += scheduler.publish(Job.make_publish(executors[rank].address, paid_script, sp.timestamp(0), sp.timestamp(9000), 900, 1700, receiver.address, slot=Slot.make(rank, 3, 2, 60))).run(sender=administrator.address)
+            scenario += scheduler.ack(paid_script).run(sender=executors[rank].address)
+        scenario.p("Epoch 2 is not finalized yet when the backup of rank 0 fulfills")
+        scenario += receiver.set_last_epoch(1)
+        scenario += scheduler.fulfill(Fulfill.make(paid_script, sp.bytes('0x02'))).run(sender=executors[0].address, now=sp.timestamp(1860))
+        scenario.verify_equal(scheduler.data.jobs[executors[0].address][paid_script].last_paid_epoch, 2)
+        scenario.p("The primaries finalized epoch 3, the primary is paid regardless and the late backup of rank 2 is not")
+        scenario += receiver.set_last_epoch(3)
+        scenario += scheduler.fulfill(Fulfill.make(paid_script, sp.bytes('0x03'))).run(sender=executors[0].address, now=sp.timestamp(2700))
+        scenario.verify_equal(scheduler.data.jobs[executors[0].address][paid_script].last_paid_epoch, 3)
+        scenario += scheduler.fulfill(Fulfill.make(paid_script, sp.bytes('0x04'))).run(sender=executors[2].address, now=sp.timestamp(2760))
+        scenario.verify_equal(receiver.data.payload, sp.bytes('0x04'))
+        scenario.verify_equal(scheduler.data.jobs[executors[2].address][paid_script].last_paid_epoch, -1)
+        scenario.verify_equal(scheduler.data.fees[executors[0].address], 5100)
+        scenario.verify_equal(scheduler.data.fees[executors[2].address], 1700)
+        scenario.verify_equal(scheduler.data.owed_fees, 8500)
@@ -117,7 +117,8 @@ if "templates" not in __name__:
             sp.result(self.data.price)
 
     from utils.viewer import Viewer
-    @sp.add_test(name = "LP Price Oracle")
+    from utils.testing import add_test
+    @add_test(name = "LP Price Oracle")
     def test():
         scenario = sp.test_scenario()
         scenario.h1("LP Price Oracle")
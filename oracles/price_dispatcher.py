@@ -0,0 +1,243 @@
+import smartpy as sp
+import oracles.constants as Constants
+import oracles.errors as Errors
+
+class Subscription:
+    """Type used to store the consumers the PriceDispatcher pushes prices to.
+    """
+    def get_type():
+        """Type used for the storage, target is the callback address including its entrypoint.
+        """
+        return sp.TRecord(
+                symbol=sp.TString,
+                target=sp.TAddress,
+                requires_flip=sp.TBool).layout(("symbol", ("target", "requires_flip")))
+
+    def make(symbol, target, requires_flip):
+        """Courtesy function typing a record to Subscription.get_type() for us
+        """
+        return sp.set_type_expr(sp.record(symbol=symbol,
+                target=target,
+                requires_flip=requires_flip), Subscription.get_type())
+
+class PriceDispatcher(sp.Contract):
+    """Companion contract of the PriceOracle that pushes the finalized prices to subscribed consumers instead of having them pull
+    through the LegacyProxyOracle. A keeper calls dispatch after every finalized epoch, each call pushes to at most batch_size
+    subscriptions until all of them received the prices of that epoch. Only the administrator manages the subscriptions.
+
+    Subscriptions whose target is not (or no longer) a contract nat are skipped. A target that fails makes the whole call fail, so
+    anyone can skip the subscription at the cursor once the round made no progress for skip_delay seconds (counted from the start
+    of the dispatched epoch and from the last push). The keeper finds it by pushing one subscription at a time with dispatch_batch.
+    """
+    def __init__(self, administrator, oracle, batch_size=20, epoch_interval=Constants.ORACLE_EPOCH_INTERVAL, skip_delay=None):
+        """epoch_interval has to be the one of the oracle, skip_delay defaults to a third of it.
+        """
+        self.epoch_interval = epoch_interval
+        self.skip_delay = skip_delay if skip_delay is not None else epoch_interval // 3
+        self.init(
+            administrator=administrator,
+            oracle=oracle,
+            subscriptions=sp.big_map(tkey=sp.TNat, tvalue=Subscription.get_type()),
+            next_subscription_id=sp.nat(0),
+            dispatched_epoch=sp.nat(0),
+            cursor=sp.nat(0),
+            batch_size=sp.nat(batch_size),
+            last_progress=sp.timestamp(0)
+        )
+
+    @sp.entry_point
+    def subscribe(self, symbol, callback, requires_flip):
+        """Entrypoint used by the admin to add a consumer. The callback receives the price of symbol once per epoch, flipped by
+        1//"stored price" like the flipped proxies if requires_flip is set. Only admin is allowed to call this entrypoint.
+        """
+        sp.set_type(symbol, sp.TString)
+        sp.set_type(callback, sp.TContract(sp.TNat))
+        sp.set_type(requires_flip, sp.TBool)
+        sp.verify(sp.sender==self.data.administrator, message=Errors.NOT_ADMIN)
+        self.data.subscriptions[self.data.next_subscription_id] = Subscription.make(symbol, sp.to_address(callback), requires_flip)
+        self.data.next_subscription_id += 1
+
+    @sp.entry_point
+    def unsubscribe(self, subscription_id):
+        """Entrypoint used by the admin to remove a consumer. Only admin is allowed to call this entrypoint.
+        """
+        sp.set_type(subscription_id, sp.TNat)
+        sp.verify(sp.sender==self.data.administrator, message=Errors.NOT_ADMIN)
+        del self.data.subscriptions[subscription_id]
+
+    @sp.entry_point
+    def set_batch_size(self, batch_size):
+        """Entrypoint used by the admin to set the max subscriptions served per dispatch. Only admin is allowed to call this entrypoint.
+        """
+        sp.set_type(batch_size, sp.TNat)
+        sp.verify(sp.sender==self.data.administrator, message=Errors.NOT_ADMIN)
+        self.data.batch_size = batch_size
+
+    @sp.entry_point
+    def set_administrator(self, administrator):
+        """Entrypoint used by the admin to set the new admin. Only admin is allowed to call this entrypoint.
+        """
+        sp.verify(sp.sender==self.data.administrator, message=Errors.NOT_ADMIN)
+        self.data.administrator = administrator
+
+    def start_round(self):
+        """Inlined, starts a new round as soon as the oracle finalized a new epoch.
+        """
+        last_epoch = sp.view("get_last_epoch", self.data.oracle, sp.unit, t=sp.TNat).open_some(Errors.INVALID_VIEW)
+        with sp.if_(last_epoch > self.data.dispatched_epoch):
+            self.data.dispatched_epoch = last_epoch
+            self.data.cursor = 0
+
+    def push(self, size):
+        """Inlined, pushes the prices to the next size subscriptions (at most batch_size).
+        """
+        self.start_round()
+        end = sp.local("end", sp.min(self.data.cursor + sp.min(size, self.data.batch_size), self.data.next_subscription_id))
+        sp.verify(self.data.cursor < end.value, message=Errors.NOTHING_TO_DISPATCH)
+        with sp.while_(self.data.cursor < end.value):
+            with sp.if_(self.data.subscriptions.contains(self.data.cursor)):
+                subscription = sp.local("subscription", self.data.subscriptions[self.data.cursor])
+                target = sp.local("target", sp.contract(sp.TNat, subscription.value.target))
+                with sp.if_(target.value.is_some()):
+                    price = sp.local("price", sp.view("get_price", self.data.oracle, subscription.value.symbol, t=sp.TNat).open_some(Errors.INVALID_VIEW))
+                    with sp.if_(subscription.value.requires_flip):
+                        price.value = Constants.PRICE_PRECISION**2//price.value
+                    sp.transfer(price.value, sp.mutez(0), target.value.open_some())
+            self.data.cursor += 1
+        self.data.last_progress = sp.now
+
+    @sp.entry_point
+    def dispatch(self):
+        """Pushes the prices to the next batch of subscriptions. Everyone can call this entrypoint (usually the keeper). A new round
+        starts as soon as the oracle finalized a new epoch, the call fails with NOTHING_TO_DISPATCH if the current round is done.
+        """
+        self.push(self.data.batch_size)
+
+    @sp.entry_point
+    def dispatch_batch(self, size):
+        """Same as dispatch for at most size subscriptions, the keeper pushes one at a time to find a failing target.
+        """
+        sp.set_type(size, sp.TNat)
+        self.push(size)
+
+    @sp.entry_point
+    def skip(self):
+        """Skips the subscription at the cursor without pushing to it. Everyone can call this entrypoint once the round made no
+        progress for skip_delay seconds, it fails with SKIP_TOO_EARLY before.
+        """
+        self.start_round()
+        sp.verify(self.data.cursor < self.data.next_subscription_id, message=Errors.NOTHING_TO_DISPATCH)
+        epoch_start = sp.timestamp(0).add_seconds(sp.to_int(self.data.dispatched_epoch * self.epoch_interval))
+        sp.verify(sp.now >= epoch_start.add_seconds(self.skip_delay), message=Errors.SKIP_TOO_EARLY)
+        sp.verify(sp.now >= self.data.last_progress.add_seconds(self.skip_delay), message=Errors.SKIP_TOO_EARLY)
+        self.data.cursor += 1
+        self.data.last_progress = sp.now
+
+if "templates" not in __name__:
+    from oracles.generic_oracle import PriceOracle, Response
+    from utils.testing import add_test, bootstrap_jobs, fulfill_all, return_contract
+
+    class FailingConsumer(sp.Contract):
+        """Test consumer whose callback always fails.
+        """
+        def __init__(self):
+            self.init(nat=sp.nat(0))
+
+        @sp.entry_point
+        def default(self, value):
+            sp.set_type(value, sp.TNat)
+            sp.failwith("FAILING_CONSUMER")
+
+    @add_test(name = "Price Dispatcher")
+    def test():
+        scenario = sp.test_scenario()
+        scenario.h1("Price Dispatcher")
+
+        scenario.h2("Bootstrapping")
+        alice = sp.test_account("Alice")
+        keeper = sp.test_account("Keeper")
+
+        fixture = bootstrap_jobs(scenario, lambda administrator: PriceOracle(administrator))
+        administrator, price_oracle = fixture.administrator, fixture.contract
+
+        dispatcher = PriceDispatcher(administrator.address, price_oracle.address, batch_size=1)
+        scenario += dispatcher
+
+        btc_consumer, btc_callback = return_contract(scenario)
+        flipped_xtz_consumer, xtz_callback = return_contract(scenario)
+
+        scenario.h2("Subscriptions")
+        scenario.p("Alice cannot subscribe, she is not admin")
+        scenario += dispatcher.subscribe(symbol="BTC", callback=btc_callback, requires_flip=False).run(sender=alice, valid=False)
+        scenario += dispatcher.subscribe(symbol="BTC", callback=btc_callback, requires_flip=False).run(sender=administrator)
+        scenario += dispatcher.subscribe(symbol="XTZ", callback=xtz_callback, requires_flip=True).run(sender=administrator)
+        scenario.verify_equal(dispatcher.data.next_subscription_id, 2)
+
+        scenario.h2("Dispatch in batches")
+        now=Constants.ORACLE_EPOCH_INTERVAL*20
+        fulfill_all(scenario, fixture, sp.pack(Response.make(now, 3500000, 3500000, 38415000000)), now)
+
+        scenario += dispatcher.dispatch().run(sender=keeper, now=sp.timestamp(now))
+        scenario.verify_equal(btc_consumer.data.nat, 38415000000)
+        scenario.verify_equal(flipped_xtz_consumer.data.nat, 0)
+        scenario += dispatcher.dispatch().run(sender=keeper, now=sp.timestamp(now))
+        scenario.verify_equal(flipped_xtz_consumer.data.nat, Constants.PRICE_PRECISION**2//3500000)
+        scenario.p("Round is done until the next epoch is finalized")
+        scenario += dispatcher.dispatch().run(sender=keeper, now=sp.timestamp(now), valid=False)
+
+        scenario.h2("Next epoch starts a new round")
+        now=Constants.ORACLE_EPOCH_INTERVAL*21
+        fulfill_all(scenario, fixture, sp.pack(Response.make(now, 3600000, 3600000, 38415000000)), now)
+        scenario.p("Removed subscriptions are skipped")
+        scenario += dispatcher.unsubscribe(0).run(sender=alice, valid=False)
+        scenario += dispatcher.unsubscribe(0).run(sender=administrator)
+        scenario += dispatcher.dispatch().run(sender=keeper, now=sp.timestamp(now))
+        scenario += dispatcher.dispatch().run(sender=keeper, now=sp.timestamp(now))
+        scenario.verify_equal(flipped_xtz_consumer.data.nat, Constants.PRICE_PRECISION**2//3600000)
+        scenario += dispatcher.dispatch().run(sender=keeper, now=sp.timestamp(now), valid=False)
+
+    @add_test(name = "Price Dispatcher Failing Subscriber")
+    def test():
+        scenario = sp.test_scenario()
+        scenario.h1("Price Dispatcher Failing Subscriber")
+
+        scenario.h2("Bootstrapping")
+        keeper = sp.test_account("Keeper")
+        fixture = bootstrap_jobs(scenario, lambda administrator: PriceOracle(administrator))
+        administrator, price_oracle = fixture.administrator, fixture.contract
+        dispatcher = PriceDispatcher(administrator.address, price_oracle.address, batch_size=3)
+        scenario += dispatcher
+
+        first_consumer, first_callback = return_contract(scenario)
+        failing_consumer = FailingConsumer()
+        scenario += failing_consumer
+        last_consumer, last_callback = return_contract(scenario)
+        scenario += dispatcher.subscribe(symbol="BTC", callback=first_callback, requires_flip=False).run(sender=administrator)
+        scenario += dispatcher.subscribe(symbol="BTC", callback=sp.contract(sp.TNat, failing_consumer.address).open_some(), requires_flip=False).run(sender=administrator)
+        scenario += dispatcher.subscribe(symbol="BTC", callback=last_callback, requires_flip=False).run(sender=administrator)
+
+        now=Constants.ORACLE_EPOCH_INTERVAL*20
+        fulfill_all(scenario, fixture, sp.pack(Response.make(now, 3500000, 3500000, 38415000000)), now)
+
+        scenario.h2("A failing target fails the batch")
+        scenario += dispatcher.dispatch().run(sender=keeper, now=sp.timestamp(now), valid=False)
+        scenario.p("The keeper pushes one subscription at a time until it reaches the failing one")
+        scenario += dispatcher.dispatch_batch(1).run(sender=keeper, now=sp.timestamp(now))
+        scenario.verify_equal(first_consumer.data.nat, 38415000000)
+        scenario += dispatcher.dispatch_batch(1).run(sender=keeper, now=sp.timestamp(now), valid=False)
+
+        scenario.h2("Skip")
+        scenario.p("Nobody can skip before the round made no progress for skip_delay")
+        scenario += dispatcher.skip().run(sender=keeper, now=sp.timestamp(now + dispatcher.skip_delay - 1), valid=False)
+        scenario += dispatcher.skip().run(sender=keeper, now=sp.timestamp(now + dispatcher.skip_delay))
+        scenario.verify_equal(dispatcher.data.cursor, 2)
+        scenario += dispatcher.dispatch().run(sender=keeper, now=sp.timestamp(now + dispatcher.skip_delay))
+        scenario.verify_equal(last_consumer.data.nat, 38415000000)
+        scenario += dispatcher.skip().run(sender=keeper, now=sp.timestamp(now + 3*dispatcher.skip_delay), valid=False)
+
+        scenario.h2("The next round still reaches the failing target first, the admin unsubscribes it for good")
+        now=Constants.ORACLE_EPOCH_INTERVAL*21
+        fulfill_all(scenario, fixture, sp.pack(Response.make(now, 3600000, 3600000, 38415000000)), now)
+        scenario += dispatcher.unsubscribe(1).run(sender=administrator)
+        scenario += dispatcher.dispatch().run(sender=keeper, now=sp.timestamp(now))
+        scenario.verify_equal(dispatcher.data.cursor, 3)
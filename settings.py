@@ -1,2 +1,29 @@
-import mainnet_settings as settings
-#import hangzhou_settings as settings
\ No newline at end of file
+import importlib
+import os
+
+NETWORK_VARIABLE = "ORACLES_NETWORK"
+DEFAULT_NETWORK = "mainnet"
+
+_network = None
+
+def select(network):
+    """Selects the network profile: `from settings import settings` then loads <network>_settings.py (i.e. mainnet_settings.py or
+    hangzhou_settings.py). Defaults to the ORACLES_NETWORK environment variable or mainnet. The choice only applies to this process,
+    the environment (and the subprocesses inheriting it) is left untouched.
+    """
+    global _network
+    _network = network
+    globals().pop("settings", None)
+
+def network():
+    """Name of the selected network profile.
+    """
+    return _network or os.environ.get(NETWORK_VARIABLE, DEFAULT_NETWORK)
+
+def __getattr__(name):
+    # the profile is only imported on first access, so importing this module is free and the network can be chosen at runtime
+    if name != "settings":
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    module = importlib.import_module("{}_settings".format(network()))
+    globals()["settings"] = module
+    return module
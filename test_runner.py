@@ -0,0 +1,211 @@
+import argparse
+import ast
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+TEST_CASE_VARIABLE = "ORACLES_TEST_CASE" # same as utils.testing.TEST_CASE_VARIABLE, not imported to not depend on smartpy
+TEST_MODULES = "oracles"
+UNIT_TEST_MODULES = "tests" # unittest modules of the off-chain tools, run with the python of the runner instead of SmartPy
+UNIT_TEST_FIXTURES = os.path.join(UNIT_TEST_MODULES, "fixtures") # recorded data read by the unittest modules
+CACHE_FILE = ".test_cache.json"
+LOCAL_PACKAGES = ("oracles", "utils")
+
+def discover(root):
+    """Finds every test case registered with utils.testing.add_test (or sp.add_test) with a literal name.
+
+    Returns:
+        list: (module_path, case_name) tuples
+    """
+    cases = []
+    directory = os.path.join(root, TEST_MODULES)
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".py"):
+            continue
+        path = os.path.join(directory, filename)
+        with open(path) as source:
+            tree = ast.parse(source.read(), filename=path)
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.FunctionDef):
+                continue
+            for decorator in node.decorator_list:
+                if not isinstance(decorator, ast.Call):
+                    continue
+                function = decorator.func
+                function_name = function.attr if isinstance(function, ast.Attribute) else getattr(function, "id", None)
+                if function_name != "add_test":
+                    continue
+                for keyword in decorator.keywords:
+                    if keyword.arg == "name" and isinstance(keyword.value, ast.Constant):
+                        cases.append((os.path.relpath(path, root), keyword.value.value))
+    return cases
+
+def discover_unit_tests(root):
+    """Finds the unittest modules (tests/test_*.py), every module is one case named after its path.
+
+    Returns:
+        list: (module_path, case_name) tuples
+    """
+    directory = os.path.join(root, UNIT_TEST_MODULES)
+    if not os.path.isdir(directory):
+        return []
+    paths = [os.path.join(UNIT_TEST_MODULES, filename) for filename in sorted(os.listdir(directory))
+        if filename.startswith("test_") and filename.endswith(".py")]
+    return [(path, path) for path in paths]
+
+def local_imports(root, path):
+    """Returns the files of the modules of this project imported by path.
+    """
+    with open(os.path.join(root, path)) as source:
+        tree = ast.parse(source.read())
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.add(node.module)
+    files = []
+    for module in modules:
+        package = module.split(".")[0]
+        # project packages and the scripts at the root (i.e. load_test imported by its unit tests)
+        if package not in LOCAL_PACKAGES and not os.path.exists(os.path.join(root, package + ".py")):
+            continue
+        candidate = module.replace(".", os.sep) + ".py"
+        if os.path.exists(os.path.join(root, candidate)):
+            files.append(candidate)
+    return files
+
+def fixture_files(root):
+    """Returns the files under UNIT_TEST_FIXTURES, which every unittest module may read.
+    """
+    files = []
+    for directory, _, filenames in os.walk(os.path.join(root, UNIT_TEST_FIXTURES)):
+        files.extend(os.path.relpath(os.path.join(directory, filename), root) for filename in filenames)
+    return files
+
+def smartpy_version(smartpy):
+    """Identifies the installed SmartPy: the content of the executable and its --version output, so that upgrading SmartPy in
+    place invalidates the cache even if the path stays the same.
+    """
+    digest = hashlib.sha256()
+    executable = shutil.which(smartpy) or smartpy
+    if os.path.isfile(executable):
+        with open(executable, "rb") as executable_file:
+            digest.update(executable_file.read())
+    else:
+        digest.update(smartpy.encode())
+    try:
+        process = subprocess.run([smartpy, "--version"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=60)
+        digest.update(process.stdout)
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return digest.hexdigest()
+
+def fingerprint(root, path, name, smartpy):
+    """Hashes the case name, the SmartPy version (see smartpy_version) and the content of the test module and of every project
+    module it (transitively) imports, plus the fixtures for unittest modules. A case only needs to run again if this changes.
+    """
+    pending, seen = [path], set()
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        pending.extend(local_imports(root, current))
+    if path.startswith(UNIT_TEST_MODULES + os.sep):
+        seen.update(fixture_files(root))
+    digest = hashlib.sha256()
+    digest.update(name.encode())
+    digest.update(smartpy.encode())
+    for current in sorted(seen):
+        digest.update(current.encode())
+        with open(os.path.join(root, current), "rb") as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+def slug(name):
+    return re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_").lower()
+
+def run_case(root, path, name, output, smartpy, html):
+    """Runs a single case in its own SmartPy process. ORACLES_TEST_CASE makes utils.testing.add_test skip all other cases. Unit
+    test modules run with python -m unittest.
+    """
+    environment = dict(os.environ)
+    environment[TEST_CASE_VARIABLE] = name
+    environment["PYTHONPATH"] = os.pathsep.join(filter(None, [root, environment.get("PYTHONPATH")]))
+    if path.startswith(UNIT_TEST_MODULES + os.sep):
+        command = [sys.executable, "-m", "unittest", path[:-len(".py")].replace(os.sep, ".")]
+    else:
+        command = [smartpy, "test", path, os.path.join(output, slug(name))]
+    if html and command[0] == smartpy:
+        command.append("--html")
+    started = time.time()
+    process = subprocess.run(command, cwd=root, env=environment, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    return process.returncode == 0, time.time() - started, process.stdout
+
+def main():
+    """This script runs the SmartPy scenarios case by case on a pool of SmartPy processes, together with the unittest modules of the
+    off-chain tools in tests/ (one case per module). Cases whose fingerprint (test module, imported sources, SmartPy version) did not
+    change since their last successful run are skipped.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("filter", nargs="*", help="only run cases whose name contains one of these strings")
+    parser.add_argument("--output", default="out", help="SmartPy output directory, each case gets its own sub folder")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="number of SmartPy processes running in parallel")
+    parser.add_argument("--smartpy", default="SmartPy.sh", help="SmartPy CLI executable")
+    parser.add_argument("--html", action="store_true", help="also write the html output")
+    parser.add_argument("--force", action="store_true", help="ignore the cache and run every selected case")
+    parser.add_argument("--list", action="store_true", help="only list the discovered cases")
+    arguments = parser.parse_args()
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    cases = [case for case in discover(root) + discover_unit_tests(root) if not arguments.filter or any(pattern in case[1] for pattern in arguments.filter)]
+    if arguments.list:
+        for path, name in cases:
+            print("{}: {}".format(path, name))
+        return 0
+
+    cache_path = os.path.join(root, CACHE_FILE)
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path) as cache_file:
+            cache = json.load(cache_file)
+
+    pending = []
+    smartpy = smartpy_version(arguments.smartpy)
+    for path, name in cases:
+        case_fingerprint = fingerprint(root, path, name, smartpy)
+        if not arguments.force and cache.get(name) == case_fingerprint:
+            print("cached  {}".format(name))
+        else:
+            pending.append((path, name, case_fingerprint))
+
+    failures = []
+    started = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, arguments.jobs)) as pool:
+        futures = {pool.submit(run_case, root, path, name, arguments.output, arguments.smartpy, arguments.html): (name, case_fingerprint) for path, name, case_fingerprint in pending}
+        for future in concurrent.futures.as_completed(futures):
+            name, case_fingerprint = futures[future]
+            passed, duration, log = future.result()
+            if passed:
+                cache[name] = case_fingerprint
+                print("passed  {} ({:.1f}s)".format(name, duration))
+            else:
+                cache.pop(name, None)
+                failures.append(name)
+                print("FAILED  {} ({:.1f}s)\n{}".format(name, duration, log))
+
+    with open(cache_path, "w") as cache_file:
+        json.dump(cache, cache_file, indent=2, sort_keys=True)
+
+    print("{} cases, {} run, {} cached, {} failed in {:.1f}s".format(len(cases), len(pending), len(cases)-len(pending), len(failures), time.time()-started))
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+import os
+import sys
+import types
+import unittest
+
+import cli
+import settings as network_settings
+
+class ShimArgumentsTest(unittest.TestCase):
+    def test_network_moves_before_the_subcommand(self):
+        self.assertEqual(cli.shim_arguments(["deploy", "lp"], ["--network", "ghostnet", "--timeout", "60"]),
+            ["--network", "ghostnet", "deploy", "lp", "--timeout", "60"])
+        self.assertEqual(cli.shim_arguments(["deploy", "lp"], ["--checkpoint", "a.json", "--network=ghostnet"]),
+            ["--network", "ghostnet", "deploy", "lp", "--checkpoint", "a.json"])
+
+    def test_other_arguments_are_kept(self):
+        self.assertEqual(cli.shim_arguments(["deploy", "oracle"], []), ["deploy", "oracle"])
+        self.assertEqual(cli.shim_arguments(["deploy", "oracle"], ["--help"]), ["deploy", "oracle", "--help"])
+
+class SelectTest(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, network_settings, "_network", network_settings._network)
+        self.addCleanup(network_settings.__dict__.pop, "settings", None)
+        profile = types.ModuleType("unittest_settings")
+        profile.SHELL = "http://localhost:20000"
+        sys.modules["unittest_settings"] = profile
+        self.addCleanup(sys.modules.pop, "unittest_settings")
+
+    def test_select_loads_the_profile_without_touching_the_environment(self):
+        environment = dict(os.environ)
+        network_settings.select("unittest")
+        self.assertEqual(network_settings.network(), "unittest")
+        self.assertEqual(network_settings.settings.SHELL, "http://localhost:20000")
+        self.assertEqual(dict(os.environ), environment)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+try:
+    from utils.deployment_utils import Step, Checkpoint, Deployer, PENDING, DONE, EXPIRED
+except ImportError as error:
+    IMPORT_ERROR = error
+else:
+    IMPORT_ERROR = None
+
+CHAIN_ID = "NetXtestchain"
+
+def origination_result(operation_hash, address, status="applied"):
+    result = {"status": status}
+    if status == "applied":
+        result["originated_contracts"] = [address]
+    return {"hash": operation_hash, "contents": [{"kind": "origination", "metadata": {"operation_result": result}}]}
+
+class FakeChain:
+    """Node of the fake client: a head level and the operation groups included so far (hash -> (level, operation group)).
+    """
+    def __init__(self, level=100, chain_id=CHAIN_ID):
+        self.level = level
+        self.chain_id = chain_id
+        self.included = {}
+
+    def find_operation(self, since, operation_hash):
+        included = self.included.get(operation_hash)
+        if included is None or included[0] < since:
+            raise StopIteration
+        return included[1]
+
+class FakeBlocks:
+    def __init__(self, chain):
+        self.chain = chain
+
+    def __getitem__(self, levels):
+        chain = self.chain
+        class Range:
+            def find_operation(self, operation_hash):
+                return chain.find_operation(levels.start, operation_hash)
+        return Range()
+
+class FakeShell:
+    def __init__(self, chain):
+        self.chain = chain
+        self.blocks = FakeBlocks(chain)
+
+    @property
+    def head(self):
+        chain = self.chain
+        class Head:
+            def header(self):
+                return {"level": chain.level}
+        return Head()
+
+    @property
+    def chains(self):
+        chain = self.chain
+        class Main:
+            def chain_id(self):
+                return chain.chain_id
+        class Chains:
+            main = Main()
+        return Chains()
+
+class FakeOperationGroup:
+    def __init__(self, client, script):
+        self.client = client
+        self.script = script
+        self.operation_hash = "op{}".format(len(client.injected) + 1)
+
+    def sign(self):
+        return self
+
+    def hash(self):
+        return self.operation_hash
+
+    def inject(self):
+        self.client.injected.append(self)
+        outcome = self.client.outcomes.pop(0) if self.client.outcomes else "applied"
+        if outcome != "lost":
+            address = "KT1{}".format(self.script["name"])
+            self.client.chain.included[self.operation_hash] = (self.client.chain.level + 1, origination_result(self.operation_hash, address, outcome))
+        self.client.chain.level += 1
+
+class FakeClient:
+    """Client originating the fake scripts of FakeStep. outcomes lists what happens to the next injections: "applied", "failed"
+    or "lost" (never included).
+    """
+    def __init__(self, chain, outcomes=()):
+        self.chain = chain
+        self.shell = FakeShell(chain)
+        self.outcomes = list(outcomes)
+        self.injected = []
+
+    def origination(self, script):
+        return script
+
+class FakeTuner:
+    def __init__(self, client):
+        self.client = client
+
+    def prepare(self, script, ttl):
+        return FakeOperationGroup(self.client, script)
+
+class FakeStep(Step if IMPORT_ERROR is None else object):
+    """Step with a script built from the storage fields instead of a compiled artifact.
+    """
+    def code_hash(self, output):
+        return "hash-" + self.target
+
+    def script(self, output, addresses):
+        fields = self.storage(addresses) if callable(self.storage) else self.storage
+        return self.code_hash(output), {"name": self.name, "fields": fields}
+
+@unittest.skipIf(IMPORT_ERROR is not None, "needs pytezos: {}".format(IMPORT_ERROR))
+class DeployerTest(unittest.TestCase):
+    def setUp(self):
+        # the deployer reports every step on stdout
+        quiet = contextlib.redirect_stdout(io.StringIO())
+        quiet.__enter__()
+        self.addCleanup(quiet.__exit__, None, None, None)
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, "test.checkpoint.json")
+        self.plan = [
+            FakeStep("oracle", "PriceOracle", {"administrator": "tz1admin"}),
+            FakeStep("proxy", "LegacyProxyOracle", lambda addresses: {"oracle": addresses["oracle"]}),
+        ]
+
+    def deployer(self, client, **kwargs):
+        return Deployer(client, Checkpoint(self.path), tuner=FakeTuner(client), interval=0, ttl=5, **kwargs)
+
+    def test_run_originates_the_plan_and_records_it(self):
+        client = FakeClient(FakeChain())
+        addresses = self.deployer(client).run(self.plan)
+        self.assertEqual(addresses, {"oracle": "KT1oracle", "proxy": "KT1proxy"})
+        self.assertEqual(client.injected[1].script["fields"], {"oracle": "KT1oracle"})
+        checkpoint = Checkpoint(self.path)
+        self.assertEqual(checkpoint.chain_id, CHAIN_ID)
+        self.assertEqual({name: step["status"] for name, step in checkpoint.steps.items()}, {"oracle": DONE, "proxy": DONE})
+
+    def test_rerun_skips_done_steps(self):
+        chain = FakeChain()
+        self.deployer(FakeClient(chain)).run(self.plan)
+        client = FakeClient(chain)
+        addresses = self.deployer(client).run(self.plan)
+        self.assertEqual(client.injected, [])
+        self.assertEqual(addresses["proxy"], "KT1proxy")
+
+    def test_pending_step_included_meanwhile_is_not_originated_again(self):
+        chain = FakeChain()
+        checkpoint = Checkpoint(self.path)
+        checkpoint.chain_id = CHAIN_ID
+        checkpoint.record("oracle", status=PENDING, operation_hash="opX", level=100, expires_at=105, code_hash="hash-PriceOracle", address=None)
+        chain.included["opX"] = (101, origination_result("opX", "KT1earlier"))
+        client = FakeClient(chain)
+        addresses = self.deployer(client).run(self.plan)
+        self.assertEqual(addresses["oracle"], "KT1earlier")
+        self.assertEqual([group.script["name"] for group in client.injected], ["proxy"])
+
+    def test_expired_step_is_originated_again(self):
+        chain = FakeChain(level=110)
+        checkpoint = Checkpoint(self.path)
+        checkpoint.chain_id = CHAIN_ID
+        checkpoint.record("oracle", status=PENDING, operation_hash="opX", level=100, expires_at=105, code_hash="hash-PriceOracle", address=None)
+        client = FakeClient(chain)
+        addresses = self.deployer(client).run(self.plan)
+        self.assertEqual(addresses["oracle"], "KT1oracle")
+        self.assertEqual([group.script["name"] for group in client.injected], ["oracle", "proxy"])
+
+    def test_failed_origination_stops_the_run(self):
+        client = FakeClient(FakeChain(), outcomes=["applied", "failed"])
+        with self.assertRaises(RuntimeError):
+            self.deployer(client).run(self.plan)
+        steps = Checkpoint(self.path).steps
+        self.assertEqual(steps["oracle"]["status"], DONE)
+        self.assertEqual(steps["proxy"]["status"], "failed")
+        client = FakeClient(client.chain)
+        self.assertEqual(self.deployer(client).run(self.plan)["proxy"], "KT1proxy")
+
+    def test_lost_origination_expires(self):
+        client = FakeClient(FakeChain(), outcomes=["lost"])
+        deployer = self.deployer(client)
+        original = deployer.find_operation
+        def find_operation(operation_hash, level):
+            # every poll is one block later
+            client.chain.level += 1
+            return original(operation_hash, level)
+        deployer.find_operation = find_operation
+        with self.assertRaises(RuntimeError):
+            deployer.run(self.plan)
+        self.assertEqual(Checkpoint(self.path).steps["oracle"]["status"], EXPIRED)
+
+    def test_checkpoint_of_another_chain_is_rejected(self):
+        self.deployer(FakeClient(FakeChain())).run(self.plan)
+        with self.assertRaises(ValueError):
+            self.deployer(FakeClient(FakeChain(chain_id="NetXother"))).run(self.plan)
+
+    def test_checkpoint_is_written_atomically(self):
+        checkpoint = Checkpoint(self.path)
+        checkpoint.chain_id = CHAIN_ID
+        checkpoint.record("oracle", status=PENDING)
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+        self.assertEqual(Checkpoint(self.path).steps, {"oracle": {"status": PENDING}})
+
+if __name__ == '__main__':
+    unittest.main()
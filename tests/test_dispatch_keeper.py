@@ -0,0 +1,84 @@
+import unittest
+from unittest import mock
+
+import oracles.errors as Errors
+
+try:
+    from pytezos.rpc.node import RpcError
+    import dispatch_keeper
+except ImportError as error:
+    IMPORT_ERROR = error
+else:
+    IMPORT_ERROR = None
+
+def rejected(code, location=100):
+    """The error pytezos raises for an operation whose script failed with code.
+    """
+    return RpcError.from_errors([
+        {"kind": "temporary", "id": "proto.alpha.michelson_v1.runtime_error", "contract_handle": "KT1Dispatcher"},
+        {"kind": "temporary", "id": "proto.alpha.michelson_v1.script_rejected", "location": location, "with": {"int": str(code)}},
+    ])
+
+class FakeTuner:
+    """Sends the operations of the fake dispatcher: each entrypoint call raises or returns the next outcome of its queue.
+    """
+    def send(self, call, min_confirmations=None):
+        if isinstance(call, Exception):
+            raise call
+        return call
+
+class FakeDispatcher:
+    def __init__(self, dispatch_batch, skip):
+        self.outcomes = {"dispatch_batch": list(dispatch_batch), "skip": list(skip)}
+        self.calls = []
+
+    def dispatch_batch(self, size):
+        self.calls.append(("dispatch_batch", size))
+        return self.outcomes["dispatch_batch"].pop(0)
+
+    def skip(self):
+        self.calls.append(("skip",))
+        return self.outcomes["skip"].pop(0)
+
+@unittest.skipIf(IMPORT_ERROR is not None, "needs pytezos: {}".format(IMPORT_ERROR))
+class FailwithTest(unittest.TestCase):
+    def test_failwith(self):
+        self.assertEqual(dispatch_keeper.failwith(rejected(Errors.NOTHING_TO_DISPATCH)), Errors.NOTHING_TO_DISPATCH)
+        self.assertEqual(dispatch_keeper.failwith(RpcError([{"with": {"int": "506"}}])), Errors.SKIP_TOO_EARLY)
+        self.assertIsNone(dispatch_keeper.failwith(RpcError({"id": "proto.alpha.michelson_v1.script_rejected", "with": {"string": "504"}})))
+        self.assertIsNone(dispatch_keeper.failwith(RpcError("<html>502 Bad Gateway</html>")))
+
+    def test_codes_are_compared_exactly(self):
+        # the substring match took 5040 or a failure at location 504 for NOTHING_TO_DISPATCH
+        self.assertNotEqual(dispatch_keeper.failwith(rejected(5040)), Errors.NOTHING_TO_DISPATCH)
+        self.assertEqual(dispatch_keeper.failwith(rejected(Errors.SKIP_TOO_EARLY, location=Errors.NOTHING_TO_DISPATCH)), Errors.SKIP_TOO_EARLY)
+
+@unittest.skipIf(IMPORT_ERROR is not None, "needs pytezos: {}".format(IMPORT_ERROR))
+class IsolateTest(unittest.TestCase):
+    def test_skips_the_failing_subscription(self):
+        dispatcher = FakeDispatcher([mock.Mock(), rejected(123)], [rejected(Errors.SKIP_TOO_EARLY), mock.Mock()])
+        with mock.patch("dispatch_keeper.time.sleep") as sleep, mock.patch("builtins.print"):
+            self.assertTrue(dispatch_keeper.isolate(FakeTuner(), dispatcher))
+        self.assertEqual(dispatcher.calls, [("dispatch_batch", 1), ("dispatch_batch", 1), ("skip",), ("skip",)])
+        sleep.assert_called_once_with(dispatch_keeper.SKIP_RETRY_INTERVAL)
+
+    def test_round_done(self):
+        dispatcher = FakeDispatcher([rejected(Errors.NOTHING_TO_DISPATCH)], [])
+        self.assertFalse(dispatch_keeper.isolate(FakeTuner(), dispatcher))
+        self.assertEqual(dispatcher.calls, [("dispatch_batch", 1)])
+
+    def test_skip_failing_with_a_location_of_the_code(self):
+        dispatcher = FakeDispatcher([rejected(123)], [rejected(Errors.NOT_ADMIN, location=Errors.SKIP_TOO_EARLY)])
+        with mock.patch("dispatch_keeper.time.sleep") as sleep, mock.patch("builtins.print"):
+            self.assertFalse(dispatch_keeper.isolate(FakeTuner(), dispatcher))
+        sleep.assert_not_called()
+
+@unittest.skipIf(IMPORT_ERROR is not None, "needs pytezos: {}".format(IMPORT_ERROR))
+class NextRoundTest(unittest.TestCase):
+    def test_next_round(self):
+        self.assertEqual(dispatch_keeper.next_round(18000, 900, 60), 960)
+        self.assertEqual(dispatch_keeper.next_round(18850, 900, 60), 110)
+        self.assertEqual(dispatch_keeper.next_round(18010, 30, 15), 35)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,208 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import gas_profiler
+
+# counter.tz is written the way SmartPy.sh compile writes a contract, add.trace is octez-client run script --trace-stack output of
+# its add entrypoint in the same format (locations of counter.tz, the first entry carries the typechecking)
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "gas_profiler")
+SCRIPT = os.path.join(FIXTURE, "counter.tz")
+TRACE = os.path.join(FIXTURE, "add.trace")
+ADMIN = "tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83"
+
+# canonical locations of counter.tz numbered by hand: pre-order over every node, 0 is the toplevel sequence
+LOCATIONS = {
+    14: ("{}", "<dispatch>", gas_profiler.UNKNOWN),
+    15: ("UNPAIR", "<dispatch>", gas_profiler.UNKNOWN),
+    16: ("IF_LEFT", "<dispatch>", gas_profiler.UNKNOWN),
+    17: ("{}", "<dispatch>", gas_profiler.UNKNOWN),
+    18: ("SWAP", "add", "self.data.total += params"),
+    23: ("DIG", "add", "self.data.total += params"),
+    25: ("ADD", "add", "self.data.total += params"),
+    29: ("PAIR", "add", "self.data.total += params"),
+    31: ("DROP", "reset", "self.data.total = 0"),
+    35: ("PUSH", "reset", "self.data.total = 0"),
+    41: ("PAIR", "reset", "self.data.total = 0"),
+    42: ("NIL", "<dispatch>", gas_profiler.UNKNOWN),
+    44: ("PAIR", "<dispatch>", gas_profiler.UNKNOWN),
+    45: ("view", "<dispatch>", gas_profiler.UNKNOWN),
+    50: ("UNPAIR", "view get_price", gas_profiler.UNKNOWN),
+    51: ("SWAP", "view get_price", "sp.result(self.data.prices[symbol])"),
+    55: ("GET", "view get_price", "sp.result(self.data.prices[symbol])"),
+    61: ("FAILWITH", "view get_price", "sp.result(self.data.prices[symbol])"),
+}
+
+def read(path):
+    with open(path) as fixture_file:
+        return fixture_file.read()
+
+def run_main(*argv):
+    """Output and exit code of gas_profiler.main with the command line argv.
+    """
+    output = io.StringIO()
+    with mock.patch.object(sys, "argv", ["gas_profiler.py"] + list(argv)), contextlib.redirect_stdout(output):
+        code = gas_profiler.main()
+    return output.getvalue(), code
+
+class ParserTest(unittest.TestCase):
+    def setUp(self):
+        self.index = gas_profiler.locations(gas_profiler.Parser(read(SCRIPT)).parse())
+
+    def test_numbers_the_nodes_like_octez(self):
+        for location, (instruction, entrypoint, statement) in LOCATIONS.items():
+            node = self.index[location]
+            self.assertEqual((node.value, node.context), (instruction, (entrypoint, statement)), "location {}".format(location))
+        self.assertEqual(max(self.index), 62)
+
+    def test_literals_have_no_location_entry(self):
+        # the 3 of DIG 3, the nat 0 of the PUSH and the view name
+        for location in (24, 37, 46):
+            self.assertNotIn(location, self.index)
+
+class TraceTest(unittest.TestCase):
+    def test_just_consumed_gas(self):
+        samples = gas_profiler.parse_trace(read(TRACE))
+        self.assertEqual(samples[:3], [(15, 8402), (15, 10), (16, 10)])
+        self.assertEqual(len(samples), 17)
+        self.assertEqual(sum(milligas for _, milligas in samples), 8612)
+
+    def test_remaining_gas(self):
+        output = "\n".join([
+            "  - location: 15 (remaining gas: 1039991.598 units remaining)",
+            "    [ (Pair (Left 5) \"{}\" 7 7) ]".format(ADMIN),
+            "  - location: 15 (remaining gas: 1039991.588 units remaining)",
+            "  - location: 16 (remaining gas: 1039991.573 units remaining)",
+        ])
+        self.assertEqual(gas_profiler.parse_trace(output), [(15, 0), (15, 10), (16, 15)])
+
+    def test_trace_code_json(self):
+        trace = json.dumps({"trace": [{"location": 15, "gas": "1039991.598"}, {"location": 16, "gas": "1039991.588"}]})
+        self.assertEqual(gas_profiler.parse_trace(trace), [(15, 0), (16, 10)])
+
+class ProfileTest(unittest.TestCase):
+    def setUp(self):
+        self.costs = gas_profiler.profile(read(SCRIPT), gas_profiler.parse_trace(read(TRACE)))
+
+    def test_attributes_the_gas_to_the_statements(self):
+        self.assertEqual(gas_profiler.total(self.costs), 8612)
+        self.assertEqual(self.costs[("<dispatch>", gas_profiler.UNKNOWN, "UNPAIR")], 8412)
+        self.assertEqual(self.costs[("<dispatch>", gas_profiler.UNKNOWN, "IF_LEFT")], 25)
+        self.assertEqual(self.costs[("add", "self.data.total += params", "ADD")], 35)
+        self.assertEqual(self.costs[("add", "self.data.total += params", "SWAP")], 50)
+        report = gas_profiler.report(self.costs, 5).splitlines()
+        self.assertEqual(report[1].split(), ["8.457", "98.2%", "[<dispatch>]"] + gas_profiler.UNKNOWN.split())
+        self.assertEqual(report[2].split()[:3], ["0.155", "1.8%", "[add]"])
+        self.assertEqual(report[-1].split(), ["8.612", "total"])
+
+    def test_folded(self):
+        self.assertIn("add;self.data.total += params;DIG 30", gas_profiler.folded(self.costs).splitlines())
+
+    def test_compare(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, "baseline.trace")
+            with open(baseline, "w") as trace_file:
+                trace_file.write(read(TRACE).replace("location: 25 (just consumed gas: 0.035)", "location: 25 (just consumed gas: 1.035)"))
+            output, code = run_main(SCRIPT, "--trace", TRACE, "--compare", SCRIPT, "--compare-trace", baseline)
+        self.assertEqual(code, 0)
+        lines = output.splitlines()
+        self.assertIn("1.155      0.155   -1.000  add", [line.strip() for line in lines])
+        self.assertEqual(lines[-1].split()[:4], ["9.612", "8.612", "-1.000", "total"])
+        self.assertEqual(lines[-1].split()[-1], "(-10.4%)")
+
+class RunScriptTest(unittest.TestCase):
+    def test_passes_the_call_options(self):
+        arguments = mock.Mock(client="octez-client", endpoint="http://localhost:8732", entrypoint="fulfill", view=None,
+            source="KT1Scheduler", payer="tz3S9uYxmGahffYfcYURijrCGm1VBqiH4mPe", now="18000", self_address=None)
+        with mock.patch("gas_profiler.subprocess.run", return_value=mock.Mock(returncode=0, stdout="trace")) as run:
+            self.assertEqual(gas_profiler.run_script(arguments, SCRIPT, "Unit", "Unit"), "trace")
+        command = run.call_args[0][0]
+        self.assertEqual(command[command.index("--source") + 1], "KT1Scheduler")
+        self.assertEqual(command[command.index("--payer") + 1], "tz3S9uYxmGahffYfcYURijrCGm1VBqiH4mPe")
+        self.assertEqual(command[command.index("--entrypoint") + 1], "fulfill")
+        self.assertNotIn("--self-address", command)
+
+class StorageTest(unittest.TestCase):
+    def test_micheline_round_trip(self):
+        for expression in ('Pair "tz1a" {Elt "XTZ" 3500000 ; Elt "BTC" 1} 7', "Some (Left 0x05)", "{}", "-3",
+                "pair (address %admin) (pair (big_map %prices string nat) (nat %total))"):
+            self.assertEqual(gas_profiler.michelson(gas_profiler.micheline(expression)), expression)
+
+    def test_set_fields_by_annotation(self):
+        source = read(SCRIPT)
+        storage = 'Pair "{}" {{}} 0'.format(ADMIN)
+        self.assertEqual(gas_profiler.set_fields(source, storage, {"total": "7", "prices": '{Elt "XTZ" 3}'}),
+            'Pair "{}" {{Elt "XTZ" 3}} 7'.format(ADMIN))
+        self.assertEqual(gas_profiler.set_fields(source, '(Pair "{}" (Pair {{}} 0))'.format(ADMIN), {"admin": '"tz1b"'}),
+            'Pair "tz1b" (Pair {} 0)')
+        with self.assertRaises(ValueError):
+            gas_profiler.set_fields(source, storage, {"supply": "1"})
+
+class ViewTest(unittest.TestCase):
+    def test_view_script_runs_the_view_code_on_the_storage(self):
+        script = gas_profiler.view_script(read(SCRIPT), "get_price")
+        parsed = gas_profiler.micheline(script.replace(";\ncode", "; code").join(["{", "}"]))
+        self.assertEqual([section["prim"] for section in parsed], ["parameter", "storage", "code"])
+        self.assertEqual(parsed[0]["args"], [{"prim": "string"}])
+        self.assertEqual(gas_profiler.michelson(parsed[1]["args"][0]),
+            "pair (address %admin) (pair (big_map %prices string nat) (nat %total))")
+        code = parsed[2]["args"][0]
+        self.assertEqual([item["prim"] if isinstance(item, dict) else "{view}" for item in code],
+            ["DUP", "CDR", "SWAP", "{view}", "DROP", "NIL", "PAIR"])
+
+        index = gas_profiler.locations(gas_profiler.Parser(script).parse())
+        contexts = {node.context for node in index.values() if node.value == "GET"}
+        self.assertEqual(contexts, {("view get_price", "sp.result(self.data.prices[symbol])")})
+        self.assertIn(("view get_price", "view wrapper"), {node.context for node in index.values() if node.value == "DROP"})
+
+    def test_unknown_view(self):
+        with self.assertRaises(ValueError):
+            gas_profiler.view_script(read(SCRIPT), "get_prices")
+
+class SuiteTest(unittest.TestCase):
+    def test_table_with_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cheaper = os.path.join(directory, "cheaper.trace")
+            with open(cheaper, "w") as trace_file:
+                trace_file.write(read(TRACE).replace("just consumed gas: 8.402", "just consumed gas: 7.402"))
+            suite = os.path.join(directory, "benchmarks.json")
+            with open(suite, "w") as suite_file:
+                json.dump({"cases": [
+                    {"name": "add", "script": os.path.join(FIXTURE, "counter.*"), "trace": TRACE},
+                    {"name": "add cheaper", "script": SCRIPT, "trace": cheaper, "baseline": "add"},
+                    {"name": "missing", "script": os.path.join(directory, "missing.tz"), "trace": TRACE},
+                ]}, suite_file)
+            output, code = run_main("--suite", suite)
+        lines = output.splitlines()
+        self.assertEqual(code, 1)
+        self.assertEqual(lines[2], "| add | 8.612 | | |")
+        self.assertEqual(lines[3], "| add cheaper | 7.612 | add | -1.000 (-11.6%) |")
+        self.assertTrue(lines[4].startswith("| missing | failed: "))
+
+    def test_benchmarks(self):
+        # gas_benchmarks.json only runs where the contracts are compiled, check that its cases are well formed
+        with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gas_benchmarks.json")) as suite_file:
+            cases = json.load(suite_file)["cases"]
+        names = set()
+        for case in cases:
+            self.assertLessEqual(set(case), set(gas_profiler.CASE_OPTIONS), case["name"])
+            self.assertNotIn(case["name"], names)
+            self.assertTrue(case.get("baseline") is None or case["baseline"] in names, case["name"])
+            self.assertTrue(case.get("entrypoint") or case.get("view"), case["name"])
+            for expression in [case["input"]] + list(case.get("set", {}).values()):
+                if not expression.startswith("@"):
+                    gas_profiler.micheline(expression)
+            names.add(case["name"])
+
+    def test_unknown_option(self):
+        arguments = mock.Mock(client="octez-client", endpoint=None, base_dir=None)
+        with self.assertRaises(ValueError):
+            gas_profiler.suite(arguments, [{"name": "typo", "script": SCRIPT, "trace": TRACE, "inputs": "1"}])
+
+if __name__ == '__main__':
+    unittest.main()
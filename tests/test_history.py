@@ -0,0 +1,122 @@
+import array
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from utils.columns import ColumnStore, STRING
+from utils.history import SCHEMA, Exporter, RecordedRpc
+
+# blocks 100 to 108 recorded in the RecordingRpc layout: fulfills through KT1Scheduler and direct to KT1Oracle, an undecodable payload,
+# a failed late fulfill, two finalized epochs (compact symbol id and symbol keys) and two LPPriceOracle ratio updates. Blocks 103 and
+# 104 also hold three fulfills of the median oracle KT1Median, each writing its valid_responses buffer, the last one finalizing.
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "history")
+ORACLE = "KT1Oracle"
+MEDIAN_ORACLE = "KT1Median"
+LP_ORACLE = "KT1LP"
+TIMESTAMP = 1641000000
+BLOCK_TIMESTAMP = 1640995200 + 3600 # 2022-01-01T01:00:00Z, the fixture blocks are one minute apart from level 90 on
+
+RESPONSES = [
+    (101, "tz1ExecutorA", TIMESTAMP, 3500000, 2100000, 38415000000, 1),
+    (101, "tz1ExecutorB", TIMESTAMP, 3510000, 2110000, 38420000000, 1),
+    (102, "tz1ExecutorC", TIMESTAMP, 3490000, 2090000, 38410000000, 1),
+    (104, "tz1ExecutorB", TIMESTAMP, 3520000, 2120000, 38430000000, 0),
+    (105, "tz1ExecutorB", TIMESTAMP + 900, 3600000, 2200000, 38500000000, 1),
+]
+EPOCHS = [
+    (102, 1823333, 3500000, 2100000, 38415000000),
+    (105, 1823334, 3600000, 2200000, 38500000000),
+]
+LP_RATIOS = [
+    (102, 1000000, 2000000, 500000, 1640999700),
+    (104, 1000000, 2040000, 510000, 1641000600),
+]
+
+def read(directory):
+    """Rows of every table of an export as dicts, string columns decoded with the state dictionaries.
+    """
+    store = ColumnStore(directory, SCHEMA)
+    tables = {}
+    for name, columns in SCHEMA.items():
+        table = store.tables[name]
+        values = {}
+        for column, typecode in columns:
+            column_values = array.array(table.typecode(column))
+            with open(table.path(column), "rb") as column_file:
+                column_values.frombytes(column_file.read())
+            if typecode == STRING:
+                column_values = [table.dictionaries[column][code] for code in column_values]
+            values[column] = list(column_values)
+        tables[name] = [dict(zip(values, row)) for row in zip(*values.values())]
+    return tables, store.state
+
+def exporter(directory, oracles=(ORACLE,), **kwargs):
+    return Exporter(RecordedRpc(FIXTURE), ColumnStore(directory, SCHEMA), oracles, [LP_ORACLE], **kwargs)
+
+class ExporterTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def assertExported(self, tables):
+        self.assertEqual([(row["level"], row["respondent"], row["response_timestamp"], row["defi_price"], row["xtz_price"],
+            row["btc_price"], row["applied"]) for row in tables["responses"]], RESPONSES)
+        self.assertEqual({row["oracle"] for row in tables["responses"]}, {ORACLE})
+        self.assertEqual([(row["level"], row["epoch"], row["defi_price"], row["xtz_price"], row["btc_price"]) for row in tables["epochs"]],
+            EPOCHS)
+        self.assertEqual([(row["level"], row["lpt_total_supply"], row["value_token_balance"], row["ratio"], row["last_update"])
+            for row in tables["lp_ratios"]], LP_RATIOS)
+
+    def test_exports_the_recorded_blocks(self):
+        self.assertEqual(exporter(self.directory).sync(start=100), 106)
+        tables, state = read(self.directory)
+        self.assertExported(tables)
+        self.assertEqual(tables["epochs"][0]["timestamp"], BLOCK_TIMESTAMP + 12 * 60)
+        self.assertEqual(state["level"], 106)
+        self.assertEqual(state["extra"]["undecoded"], 1)
+        self.assertEqual(state["rows"], {"responses": 5, "epochs": 2, "lp_ratios": 2})
+
+    def test_resumes_after_the_last_committed_level(self):
+        self.assertEqual(exporter(self.directory).sync(start=100, until=102), 102)
+        tables, state = read(self.directory)
+        self.assertEqual(state["rows"], {"responses": 3, "epochs": 1, "lp_ratios": 1})
+        # start is ignored once the export has a level
+        self.assertEqual(exporter(self.directory).sync(start=100), 106)
+        tables, state = read(self.directory)
+        self.assertExported(tables)
+        self.assertEqual(state["extra"]["undecoded"], 1)
+
+    def test_drops_the_rows_of_an_interrupted_commit(self):
+        exporter(self.directory, commit_every=2).sync(start=100, until=102)
+        # the column files of 103 and 104 are written but the crash loses the state, so the rows never count
+        with mock.patch("utils.columns.os.replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                exporter(self.directory, commit_every=2).sync(until=104)
+        levels = os.path.join(self.directory, "responses.level.bin")
+        self.assertEqual(os.path.getsize(levels), 4 * 8)
+
+        # reopening the store truncates the columns to the committed rows
+        tables, state = read(self.directory)
+        self.assertEqual(state["level"], 102)
+        self.assertEqual(os.path.getsize(levels), 3 * 8)
+        self.assertEqual(exporter(self.directory).sync(), 106)
+        tables, state = read(self.directory)
+        self.assertExported(tables)
+        self.assertEqual(state["extra"]["undecoded"], 1)
+
+    def test_median_oracle_buffer_is_not_a_price(self):
+        # the valid_responses diffs are keyed by epoch and hold maps of responses, only the prices big_map makes the epoch row
+        self.assertEqual(exporter(self.directory, oracles=(ORACLE, MEDIAN_ORACLE)).sync(start=100), 106)
+        tables, state = read(self.directory)
+        self.assertEqual([(row["level"], row["respondent"], row["defi_price"]) for row in tables["responses"] if row["oracle"] == MEDIAN_ORACLE],
+            [(103, "tz1ExecutorA", 3600000), (103, "tz1ExecutorC", 3590000), (104, "tz1ExecutorB", 3610000)])
+        self.assertEqual([(row["level"], row["epoch"], row["defi_price"], row["xtz_price"], row["btc_price"]) for row in tables["epochs"]
+            if row["oracle"] == MEDIAN_ORACLE], [(104, 1823334, 3600000, 2200000, 38500000000)])
+        self.assertEqual([(row["level"], row["epoch"], row["defi_price"], row["xtz_price"], row["btc_price"]) for row in tables["epochs"]
+            if row["oracle"] == ORACLE], EPOCHS)
+        self.assertEqual(state["extra"]["last"][MEDIAN_ORACLE], 1823334)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+try:
+    import load_test
+except ImportError as error:
+    IMPORT_ERROR = error
+else:
+    IMPORT_ERROR = None
+
+def included(operation_hash, *results):
+    """Operation group as returned by the block RPC, one transaction per result.
+    """
+    return {"hash": operation_hash, "contents": [{"kind": "transaction", "metadata": {"operation_result": result}} for result in results]}
+
+@unittest.skipIf(IMPORT_ERROR is not None, "needs pytezos: {}".format(IMPORT_ERROR))
+class HelpersTest(unittest.TestCase):
+    def test_percentile(self):
+        self.assertIsNone(load_test.percentile([], 0.5))
+        values = list(range(100, 0, -1))
+        self.assertEqual(load_test.percentile(values, 0.5), 50)
+        self.assertEqual(load_test.percentile(values, 0.99), 99)
+        self.assertEqual(load_test.percentile(values, 1), 100)
+        self.assertEqual(load_test.percentile(values, 0), 1)
+        self.assertEqual(load_test.percentile([7], 0.9), 7)
+
+    def test_error_name(self):
+        self.assertEqual(load_test.error_name([{"id": "proto.michelson_v1.runtime_error"},
+            {"id": "proto.michelson_v1.script_rejected", "with": {"int": "903"}}]), "NOT_IN_EPOCH")
+        self.assertEqual(load_test.error_name([{"id": "proto.michelson_v1.script_rejected", "with": {"int": "999"}}]), "999")
+        self.assertEqual(load_test.error_name([{"id": "proto.michelson_v1.script_rejected", "with": {"prim": "Unit"}}]), "script_rejected")
+        self.assertEqual(load_test.error_name([]), "unknown")
+
+    def test_in_batches(self):
+        batches = list(load_test.in_batches(list(range(7)), size=3))
+        self.assertEqual(batches, [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual(list(load_test.in_batches([], size=3)), [])
+
+@unittest.skipIf(IMPORT_ERROR is not None, "needs pytezos: {}".format(IMPORT_ERROR))
+class RecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.recorder = load_test.Recorder()
+
+    def test_include_records_status_and_gas_once(self):
+        self.recorder.sent("fulfill", "op1")
+        self.assertEqual(self.recorder.pending(), 1)
+        self.recorder.include(included("op1", {"status": "applied", "consumed_milligas": "1500"}, {"status": "applied", "consumed_milligas": "500"}), 10)
+        self.recorder.include(included("op1", {"status": "applied", "consumed_milligas": "9000"}), 20)
+        record = self.recorder.operations["op1"]
+        self.assertEqual((record["included"], record["status"], record["milligas"], record["error"]), (10, "applied", 2000, None))
+        self.assertEqual(self.recorder.pending(), 0)
+
+    def test_include_names_the_failure(self):
+        self.recorder.sent("fulfill", "op1")
+        self.recorder.include(included("op1", {"status": "backtracked"}, {"status": "failed",
+            "errors": [{"id": "proto.michelson_v1.script_rejected", "with": {"int": "903"}}]}), 10)
+        record = self.recorder.operations["op1"]
+        self.assertEqual((record["status"], record["error"]), ("failed", "NOT_IN_EPOCH"))
+
+    def test_include_ignores_foreign_operations(self):
+        self.recorder.include(included("other", {"status": "applied"}), 10)
+        self.assertEqual(self.recorder.operations, {})
+
+    def test_reject_parses_the_failwith_code(self):
+        self.recorder.reject("read", Exception("({'id': 'proto.michelson_v1.script_rejected', 'with': {'int': '903'}},)"))
+        self.recorder.reject("read", TimeoutError())
+        self.assertEqual(self.recorder.rejected, [{"kind": "read", "error": "NOT_IN_EPOCH"}, {"kind": "read", "error": "TimeoutError"}])
+
+    def test_report(self):
+        for index, latency in enumerate((1, 2, 3)):
+            self.recorder.sent("fulfill", "op{}".format(index))
+            self.recorder.operations["op{}".format(index)]["sent"] = 100
+            self.recorder.include(included("op{}".format(index), {"status": "applied", "consumed_milligas": str(1000 * latency)}), 100 + latency)
+        self.recorder.sent("fulfill", "lost")
+        self.recorder.reject("fulfill", Exception("'with': {'int': '903'}"))
+        summary = load_test.report(self.recorder, 60)
+        fulfill = summary["kinds"]["fulfill"]
+        self.assertEqual((fulfill["sent"], fulfill["included"], fulfill["applied"], fulfill["not_included"]), (4, 3, 3, 1))
+        self.assertEqual(fulfill["throughput_per_minute"], 3)
+        self.assertEqual(fulfill["latency_seconds"], {"p50": 2, "p90": 3, "p99": 3, "max": 3})
+        self.assertEqual(fulfill["gas"]["max"], 3)
+        self.assertEqual(fulfill["failures"], {"NOT_IN_EPOCH": 1})
+
+if __name__ == '__main__':
+    unittest.main()
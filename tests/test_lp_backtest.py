@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+
+from lp_backtest import ratio_of, clamp, price_of, load_series, replay, analyse
+
+# the "LP Price Oracle" scenario of oracles/lp_oracle.py: tzBTC balance, LP total supply and the BTC price of its DummyOracle
+BALANCE = 20775622511
+SUPPLY = 177550279
+BTC_PRICE = 47403660000
+DECIMALS = 8
+
+# balance set by the scenario before each group of get_price calls, the calls of a group are 0, 1, 30, 900, 1800 and 3600 seconds
+# after its start. The call at 0 seconds does not move the ratio (nothing elapsed) and is left out of the replay, the new balance
+# is recorded one second later instead so that the first read of the group sees it.
+GROUPS = [
+    (0, BALANCE//2),
+    (3600, BALANCE*2),
+    (7200, 20716121970+(20716121970>>5)),
+    (10800, 21363500781-(21363500781>>5)),
+]
+# (timestamp, value_token_per_lpt_ratio, price sent to the callback) of every get_price of the flipped oracle, as the contract
+# computes them
+CALLS = [
+    (0, 117012615, 9014163),
+    (1, 117008553, 9014476),
+    (30, 116890732, 9023562),
+    (900, 113359659, 9304640),
+    (1800, 109817170, 9604790),
+    (3600, 106385384, 9914622),
+    (3601, 106389077, 9914277),
+    (3630, 106496204, 9904304),
+    (4500, 109713276, 9613885),
+    (5400, 113141815, 9322555),
+    (7200, 116677496, 9040054),
+    (7201, 116681547, 9039740),
+    (7230, 116799038, 9030646),
+    (8100, 120323667, 8766113),
+    (9000, 120323667, 8766113),
+    (10800, 120323667, 8766113),
+    (10801, 120319490, 8766417),
+    (10830, 120198335, 8775253),
+    (11700, 116567345, 9048596),
+    (12600, 116563553, 9048890),
+    (14400, 116563553, 9048890),
+]
+
+def scenario_series():
+    pool = [(0, BALANCE, SUPPLY)] + [(start + 1, balance, SUPPLY) for start, balance in GROUPS]
+    return pool, [(0, BTC_PRICE)], [timestamp for timestamp, _, _ in CALLS]
+
+class ContractMathTest(unittest.TestCase):
+    def test_scenario_prices(self):
+        # the two verify_equal of the scenario
+        ratio = ratio_of(BALANCE, SUPPLY)
+        self.assertEqual(price_of(ratio, BTC_PRICE, DECIMALS, False), 10**12//9014163)
+        self.assertEqual(price_of(ratio, BTC_PRICE, DECIMALS, True), 9014163)
+
+    def test_clamp(self):
+        ratio = 117012615
+        self.assertEqual(clamp(0, 58506307, 0), (58506307, False))
+        self.assertEqual(clamp(ratio, 58506307, 0), (ratio, True))
+        self.assertEqual(clamp(ratio, 58506307, 900), (ratio - (ratio>>5), True))
+        self.assertEqual(clamp(ratio, 58506307, 3600), (ratio - (ratio>>5), True))
+        self.assertEqual(clamp(ratio, ratio + 1000, 1), (ratio + 1000, False))
+        self.assertEqual(clamp(ratio, 2*ratio, 30), (ratio + (ratio>>5)*30//900, True))
+
+class ReplayTest(unittest.TestCase):
+    def test_replays_the_scenario(self):
+        pool, prices, reads = scenario_series()
+        steps = list(replay(pool, prices, reads))
+        self.assertEqual([(timestamp, ratio) for timestamp, _, _, ratio, _ in steps], [(timestamp, ratio) for timestamp, ratio, _ in CALLS])
+        self.assertEqual([price_of(ratio, price, DECIMALS, True) for _, price, _, ratio, _ in steps], [price for _, _, price in CALLS])
+        self.assertEqual([saturated for _, _, _, _, saturated in steps],
+            [False] + [True]*10 + [True, True, False, False, False] + [True, True, True, False, False])
+
+    def test_reads_before_the_series_are_skipped(self):
+        pool, prices, _ = scenario_series()
+        self.assertEqual([step[0] for step in replay(pool, [(30, BTC_PRICE)], [0, 1, 30])], [30])
+
+    def test_analyse(self):
+        pool, prices, reads = scenario_series()
+        summary = analyse(list(replay(pool, prices, reads)), DECIMALS, True)
+        self.assertEqual(summary["reads"], len(CALLS))
+        self.assertEqual(summary["replayed_seconds"], 14400)
+        self.assertEqual(summary["saturated_episodes"], 2)
+        self.assertEqual(summary["unfinished_episode_seconds"], 0)
+        self.assertEqual(summary["lag_seconds"]["max"], 8100 - 1)
+        self.assertEqual(summary["saturated_seconds"], (8100 - 1) + (12600 - 10801))
+
+class LoadSeriesTest(unittest.TestCase):
+    def write(self, content):
+        series_file = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False)
+        self.addCleanup(os.remove, series_file.name)
+        with series_file:
+            series_file.write(content)
+        return series_file.name
+
+    def test_plain_csv(self):
+        path = self.write("timestamp,value_token_balance,lpt_total_supply\n30,2,3\n0,1,3\n")
+        self.assertEqual(load_series(path, ("timestamp", "value_token_balance", "lpt_total_supply")), [(0, 1, 3), (30, 2, 3)])
+
+    def test_reordered_and_quoted_columns(self):
+        path = self.write('price,timestamp,source\r\n"5",0,"a"\r\n6,900,b\r\n')
+        self.assertEqual(load_series(path, ("timestamp", "price")), [(0, 5), (900, 6)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+import unittest
+
+from utils import migration, micheline
+
+try:
+    from pytezos.michelson.forge import forge_micheline
+    from pytezos.michelson.types import MichelsonType
+except ImportError as error:
+    IMPORT_ERROR = error
+else:
+    IMPORT_ERROR = None
+
+ADMIN = "tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83"
+SANDBOX_ADMIN = "tz1VSUr8wwNhLAzempoch5d6hLRiTh8Cjcjb"
+ENTRIES = 200
+INLINE_LIMIT = 600 # bytes left in the origination for the storage
+
+def annotated(micheline, name):
+    return dict(micheline, annots=["%" + name])
+
+def pair(left, right):
+    return {"prim": "pair", "args": [left, right]}
+
+NAT = {"prim": "nat"}
+ENTRIES_TYPE = {"prim": "big_map", "args": [NAT, NAT]}
+
+OLD_STORAGE_TYPE = pair(
+    pair(annotated({"prim": "address"}, "admin"), annotated(NAT, "owed")),
+    pair(annotated(ENTRIES_TYPE, "entries"), annotated(NAT, "legacy"))
+)
+NEW_STORAGE_TYPE = pair(
+    pair(annotated({"prim": "address"}, "admin"), annotated(NAT, "owed")),
+    pair(annotated(ENTRIES_TYPE, "entries"), pair(annotated({"prim": "int"}, "legacy"), annotated(NAT, "added")))
+)
+
+def snapshot(owed=0):
+    return {"contract": "KT1Old", "level": 1000, "storage_type": OLD_STORAGE_TYPE, "fields": {
+        "admin": {"string": ADMIN},
+        "owed": {"int": str(owed)},
+        "entries": [{"prim": "Elt", "args": [{"int": str(key)}, {"int": str(key * 1000)}]} for key in range(ENTRIES)],
+        "legacy": {"int": "150"},
+    }}
+
+def code(padding):
+    return [
+        {"prim": "parameter", "args": [{"prim": "unit"}]},
+        {"prim": "storage", "args": [NEW_STORAGE_TYPE]},
+        {"prim": "code", "args": [[{"prim": "PUSH", "args": [{"prim": "string"}, {"string": "x" * padding}]}, {"prim": "FAILWITH"}]]}
+    ]
+
+def sized_code(available):
+    """Code leaving available bytes to the storage of the origination, padded with a string literal.
+    """
+    target = migration.MAX_OPERATION_DATA_LENGTH - migration.ORIGINATION_OVERHEAD - available
+    low, high = 0, target * 4
+    while low < high:
+        middle = (low + high) // 2
+        if len(micheline.forge(code(middle))) < target:
+            low = middle + 1
+        else:
+            high = middle
+    return code(low)
+
+def set_entry(key, value):
+    return [("set_entry", {"key": key, "value": value})], value
+
+def make_migration(**kwargs):
+    return migration.Migration(("admin",), replays={"entries": set_entry}, upgrades={"legacy": lambda value: value - 200}, **kwargs)
+
+class PlanTest(unittest.TestCase):
+    def setUp(self):
+        self.code = sized_code(INLINE_LIMIT)
+
+    def test_carries_fields_of_the_same_type_and_upgrades_the_others(self):
+        storage, replays, expected = migration.plan(snapshot(), make_migration(), self.code)
+        self.assertEqual(storage["admin"], ADMIN)
+        self.assertEqual(storage["owed"], 0)
+        self.assertEqual(storage["legacy"], -50)
+        self.assertNotIn("added", storage)
+        self.assertNotIn("added", expected)
+
+    def test_administrator_replaces_the_admin_fields(self):
+        storage, replays, expected = migration.plan(snapshot(), make_migration(), self.code, administrator=SANDBOX_ADMIN)
+        self.assertEqual(storage["admin"], SANDBOX_ADMIN)
+        self.assertEqual(expected["admin"], SANDBOX_ADMIN)
+
+    def test_splits_big_map_entries_between_origination_and_replays(self):
+        storage, replays, expected = migration.plan(snapshot(), make_migration(), self.code)
+        inlined = set(storage["entries"])
+        replayed = [parameter["key"] for entrypoint, parameter in replays]
+        self.assertTrue(inlined and replayed, "the limit should leave entries on both sides")
+        self.assertEqual(inlined | set(replayed), set(range(ENTRIES)))
+        self.assertFalse(inlined & set(replayed))
+        self.assertLess(max(inlined), min(replayed))
+        self.assertEqual(replayed, sorted(replayed))
+        self.assertEqual({entrypoint for entrypoint, parameter in replays}, {"set_entry"})
+        self.assertEqual(expected["entries"], {key: key * 1000 for key in range(ENTRIES)})
+
+        types = migration.field_types(NEW_STORAGE_TYPE)
+        used = sum(migration.size(types[name], value) for name, value in storage.items())
+        self.assertLessEqual(used, INLINE_LIMIT)
+
+    def test_everything_is_inlined_when_it_fits(self):
+        storage, replays, expected = migration.plan(snapshot(), make_migration(), code(0))
+        self.assertEqual(replays, [])
+        self.assertEqual(storage["entries"], expected["entries"])
+
+    def test_unsettled_balance_is_refused(self):
+        with self.assertRaises(ValueError):
+            migration.plan(snapshot(owed=1700), make_migration(settled=("owed",)), self.code)
+        storage, replays, expected = migration.plan(snapshot(owed=0), make_migration(settled=("owed",)), self.code)
+        self.assertEqual(storage["owed"], 0)
+
+class JobsTest(unittest.TestCase):
+    def test_replay_jobs_publishes_unacknowledged_unpaid_jobs(self):
+        job = {"status": 1, "start": 0, "end": 1800, "interval": 900, "fee": 1700, "contract": "KT1Oracle",
+            "slot": {"rank": 0, "group_size": 1, "primaries": 1, "spacing": 0}, "last_paid_epoch": 1}
+        calls, jobs = migration.replay_jobs("tz1Executor", {b"\x00": job})
+        self.assertEqual(calls, [("publish", {"executor": "tz1Executor", "script": b"\x00", "start": 0, "end": 1800, "interval": 900,
+            "fee": 1700, "contract": "KT1Oracle", "slot": job["slot"]})])
+        self.assertEqual(jobs, {b"\x00": dict(job, status=0, last_paid_epoch=-1)})
+
+    def test_upgrade_jobs_adds_the_new_fields(self):
+        jobs = migration.upgrade_jobs({"tz1Executor": {b"\x00": {"status": 1, "start": 0, "end": 1800}}})
+        self.assertEqual(jobs["tz1Executor"][b"\x00"]["slot"], {"rank": 0, "group_size": 1, "primaries": 1, "spacing": 0})
+        self.assertEqual(jobs["tz1Executor"][b"\x00"]["last_paid_epoch"], -1)
+
+JOB_TYPE = pair(
+    pair(annotated({"prim": "address"}, "contract"), annotated({"prim": "timestamp"}, "end")),
+    pair(annotated(pair(annotated(NAT, "rank"), annotated({"prim": "option", "args": [NAT]}, "spacing")), "slot"),
+        annotated({"prim": "int"}, "last_paid_epoch"))
+)
+JOBS_TYPE = {"prim": "big_map", "args": [{"prim": "address"}, {"prim": "map", "args": [{"prim": "bytes"}, JOB_TYPE]}]}
+EXPIRIES_TYPE = {"prim": "big_map", "args": [{"prim": "int"}, {"prim": "set", "args": [pair({"prim": "address"}, {"prim": "bytes"})]}]}
+JOBS = {
+    "tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83": {b"\x01": {"contract": "KT1QkVQRiT62qpWnHrm8UMWYtJemmTnAjoD9", "end": 1800,
+        "slot": {"rank": 1, "spacing": None}, "last_paid_epoch": -1}},
+    "tz3S9uYxmGahffYfcYURijrCGm1VBqiH4mPe": {b"\x00": {"contract": "KT1QkVQRiT62qpWnHrm8UMWYtJemmTnAjoD9", "end": 0,
+        "slot": {"rank": 0, "spacing": 30}, "last_paid_epoch": 2}},
+}
+EXPIRIES = {2: {("KT1QkVQRiT62qpWnHrm8UMWYtJemmTnAjoD9", b"\x01"), ("tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83", b"\x00")}}
+
+def as_map(big_map_type):
+    return dict(big_map_type, prim="map")
+
+class MichelineTest(unittest.TestCase):
+    def test_address(self):
+        self.assertEqual(micheline.forge_address("tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83").hex(), "0000c9d9d3dc6dfb6fdfc86063eeda184e20fd506717")
+        for address in ("tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83", "tz3S9uYxmGahffYfcYURijrCGm1VBqiH4mPe", "KT1QkVQRiT62qpWnHrm8UMWYtJemmTnAjoD9",
+                "KT1QkVQRiT62qpWnHrm8UMWYtJemmTnAjoD9%fulfill"):
+            self.assertEqual(micheline.unforge_address(micheline.forge_address(address)), address)
+        with self.assertRaises(ValueError):
+            micheline.forge_address("tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz84")
+
+    def test_sets_are_sorted_like_michelson(self):
+        # implicit accounts before originated ones, pairs compared field by field
+        value = micheline.to_micheline(EXPIRIES_TYPE, {2: {("KT1QkVQRiT62qpWnHrm8UMWYtJemmTnAjoD9", b"\x00"), ("tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83", b"\x01")}})
+        self.assertEqual([micheline.to_python(EXPIRIES_TYPE["args"][1]["args"][0], item) for item in value[0]["args"][1]],
+            [("tz1e3KTbvFmjfxjfse1RdEg2deoYjqoqgz83", b"\x01"), ("KT1QkVQRiT62qpWnHrm8UMWYtJemmTnAjoD9", b"\x00")])
+
+    def test_round_trip(self):
+        for value_type, value in ((JOBS_TYPE, JOBS), (EXPIRIES_TYPE, EXPIRIES)):
+            self.assertEqual(micheline.to_python(value_type, micheline.to_micheline(value_type, value)), value)
+
+    def test_readable_and_flattened_forms(self):
+        readable = [{"prim": "Elt", "args": [{"string": "tz3S9uYxmGahffYfcYURijrCGm1VBqiH4mPe"}, [{"prim": "Elt", "args": [{"bytes": "00"},
+            [{"prim": "Pair", "args": [{"string": "KT1QkVQRiT62qpWnHrm8UMWYtJemmTnAjoD9"}, {"string": "1970-01-01T00:00:00Z"}]},
+            {"prim": "Pair", "args": [{"int": "0"}, {"prim": "Some", "args": [{"int": "30"}]}]}, {"int": "2"}]]}]]}]
+        self.assertEqual(micheline.to_python(JOBS_TYPE, readable), {"tz3S9uYxmGahffYfcYURijrCGm1VBqiH4mPe": JOBS["tz3S9uYxmGahffYfcYURijrCGm1VBqiH4mPe"]})
+        with self.assertRaises(ValueError):
+            micheline.to_python(JOBS_TYPE, {"int": "12"})
+
+    def test_forge(self):
+        self.assertEqual(micheline.forge({"int": "-64"}).hex(), "00c001")
+        self.assertEqual(micheline.forge({"prim": "pair", "args": [NAT, NAT], "annots": ["%a"]}).hex(), "086503620362000000022561")
+
+    @unittest.skipIf(IMPORT_ERROR is not None, "needs pytezos: {}".format(IMPORT_ERROR))
+    def test_matches_pytezos(self):
+        # pytezos only writes big_maps by id, their entries are written like a map
+        for value_type, value in ((as_map(JOBS_TYPE), JOBS), (as_map(EXPIRIES_TYPE), EXPIRIES), (pair(NEW_STORAGE_TYPE["args"][0],
+                pair(annotated(as_map(ENTRIES_TYPE), "entries"), NEW_STORAGE_TYPE["args"][1]["args"][1])),
+                {"admin": ADMIN, "owed": 3, "entries": {2: 5, 1: 8}, "legacy": -150, "added": 0})):
+            expected = MichelsonType.match(value_type).from_python_object(value).to_micheline_value(mode="optimized")
+            self.assertEqual(micheline.to_micheline(value_type, value), expected)
+            self.assertEqual(micheline.forge(expected), forge_micheline(expected))
+        for script in (code(0), code(300), sized_code(INLINE_LIMIT), [{"prim": "DIP", "args": [{"int": "2"}, [{"prim": "DROP"}]],
+                "annots": ["@x"]}, {"prim": "Pair", "args": [{"int": "1"}, {"int": "2"}, {"int": "-3"}]}]):
+            self.assertEqual(micheline.forge(script), forge_micheline(script))
+
+if __name__ == '__main__':
+    unittest.main()
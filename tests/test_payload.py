@@ -0,0 +1,83 @@
+import contextlib
+import io
+import json
+import os
+import re
+import unittest
+
+import oracles.constants as Constants
+from utils.payload import pack_response, unpack_response, encode_fixed, decode_fixed, encode, decode, benchmark
+
+try:
+    from pytezos.michelson.forge import forge_micheline
+except ImportError as error:
+    IMPORT_ERROR = error
+else:
+    IMPORT_ERROR = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+README = os.path.join(ROOT, "readme.md")
+RESPONSE = (18000, 3500000, 2100000, 38415000000)
+LARGE_RESPONSE = (1650000000, 900000000000, 900000000000, 250000000000000)
+
+def readme_sizes():
+    """(packed, fixed, saved) of every row of the payload size table in the readme.
+    """
+    with open(README) as readme_file:
+        section = readme_file.read().split("## Payload formats")[1].split("\n## ")[0]
+    return [tuple(int(cell) for cell in row) for row in re.findall(r"^\|[^|]+\|\s*(\d+)\s*\|\s*(\d+)\s*\|\s*(\d+)\s*\|$", section, re.M)]
+
+class PayloadTest(unittest.TestCase):
+    def test_round_trip(self):
+        for response in (RESPONSE, LARGE_RESPONSE, (0, 0, 0, 0)):
+            self.assertEqual(unpack_response(pack_response(*response)), response)
+            self.assertEqual(decode_fixed(encode_fixed(*response)), response)
+            self.assertEqual(decode(encode("packed", *response)), response)
+            self.assertEqual(decode(encode("fixed", *response)), response)
+
+    def test_fixed_layout(self):
+        payload = encode_fixed(*RESPONSE)
+        self.assertEqual(len(payload), Constants.FIXED_PAYLOAD_LENGTH)
+        self.assertEqual(payload.hex(), "01" "00004650" "0000003567e0" "000000200b20" "0008f1b661c0")
+        with self.assertRaises(OverflowError):
+            encode_fixed(18000, 2**48, 0, 0)
+
+    def test_format_detection(self):
+        # packed payloads start with the 0x05 pack prefix, fixed ones with the version byte
+        self.assertEqual(pack_response(*RESPONSE)[:1], b"\x05")
+        self.assertEqual(encode_fixed(*RESPONSE)[:1], bytes([Constants.FIXED_PAYLOAD_VERSION]))
+        self.assertNotEqual(Constants.FIXED_PAYLOAD_VERSION, 5)
+        with self.assertRaises(ValueError):
+            decode(b"\x05" + encode_fixed(*RESPONSE)[1:])
+        with self.assertRaises(ValueError):
+            decode(encode_fixed(*RESPONSE)[:-1])
+        with self.assertRaises(ValueError):
+            decode(pack_response(*RESPONSE) + b"\x00")
+        with self.assertRaises(ValueError):
+            decode(b"\x02" + encode_fixed(*RESPONSE)[1:])
+
+    def test_readme_sizes(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            benchmark()
+        printed = [tuple(int(cell) for cell in line.split()[-3:]) for line in output.getvalue().splitlines()[1:]]
+        self.assertEqual(readme_sizes(), printed)
+        self.assertEqual(printed, [(28, 23, 5), (30, 23, 7), (35, 23, 12)])
+
+    def test_benchmark_payloads(self):
+        # the fixed and packed fulfill cases of gas_benchmarks.json have to decode the same response
+        with open(os.path.join(ROOT, "gas_benchmarks.json")) as suite_file:
+            cases = {case["name"]: case for case in json.load(suite_file)["cases"]}
+        for name, payload_format in (("PriceOracle fulfill", "packed"), ("FixedPayloadPriceOracle fulfill", "fixed")):
+            self.assertEqual(cases[name]["input"].split()[-1], "0x" + encode(payload_format, *RESPONSE).hex())
+
+    @unittest.skipIf(IMPORT_ERROR is not None, "needs pytezos: {}".format(IMPORT_ERROR))
+    def test_pack_matches_michelson(self):
+        for response in (RESPONSE, LARGE_RESPONSE):
+            value = {"int": str(response[-1])}
+            for field in reversed(response[:-1]):
+                value = {"prim": "Pair", "args": [{"int": str(field)}, value]}
+            self.assertEqual(pack_response(*response), b"\x05" + forge_micheline(value))
+
+if __name__ == '__main__':
+    unittest.main()
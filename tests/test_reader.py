@@ -0,0 +1,155 @@
+import unittest
+
+import oracles.errors as Errors
+from utils.reader import OracleReader, OracleError, storage_fields, batch_script
+from utils.rpc import RpcError
+
+ORACLE = "KT1Oracle"
+PROXY = "KT1Proxy"
+EPOCH_INTERVAL = 900
+
+STORAGE_TYPE = {"prim": "pair", "args": [
+    {"prim": "address", "annots": ["%administrator"]},
+    {"prim": "pair", "args": [
+        {"prim": "nat", "annots": ["%last_epoch"]},
+        {"prim": "nat", "annots": ["%validity_window_in_epochs"]}
+    ]}
+]}
+
+def requests_of(script):
+    """(contract, view, argument) of every VIEW of a batch_script, in order.
+    """
+    code = next(section for section in script if section["prim"] == "code")["args"][0]
+    requests, pushed = [], []
+    for instruction in code:
+        if instruction["prim"] == "PUSH":
+            literal = instruction["args"][1]
+            pushed.append(int(literal["int"]) if "int" in literal else literal["string"])
+        elif instruction["prim"] == "UNIT":
+            pushed.append(None)
+        elif instruction["prim"] == "VIEW":
+            argument, contract = pushed.pop(), pushed.pop()
+            requests.append((contract, instruction["args"][0]["string"], argument))
+    return requests
+
+class FakeRpc:
+    """Node serving the oracle storage and the view results (request -> nat, or an oracles/errors.py code to fail with), counting
+    the calls of every method.
+    """
+    def __init__(self, last_epoch, validity_window_in_epochs=2):
+        self.last_epoch = last_epoch
+        self.validity_window_in_epochs = validity_window_in_epochs
+        self.views = {}
+        self.failing = {}
+        self.calls = {"contract_script": 0, "contract_storage": 0, "run_code": 0, "run_view": 0}
+
+    def storage(self):
+        # flattened right comb, the way the node writes it
+        return {"prim": "Pair", "args": [{"string": "tz1admin"}, {"int": str(self.last_epoch)}, {"int": str(self.validity_window_in_epochs)}]}
+
+    def contract_script(self, contract):
+        self.calls["contract_script"] += 1
+        return {"code": [{"prim": "parameter", "args": [{"prim": "unit"}]}, {"prim": "storage", "args": [STORAGE_TYPE]}], "storage": self.storage()}
+
+    def contract_storage(self, contract):
+        self.calls["contract_storage"] += 1
+        return self.storage()
+
+    def view(self, request):
+        if request in self.failing:
+            raise RpcError("/run_view", [{"id": "proto.michelson_v1.script_rejected", "with": {"int": str(self.failing[request])}}])
+        return {"int": str(self.views[request])}
+
+    def run_code(self, script, storage):
+        self.calls["run_code"] += 1
+        # CONS pushes every result in front of the list
+        return list(reversed([self.view(request) for request in requests_of(script)]))
+
+    def run_view(self, contract, view, argument):
+        self.calls["run_view"] += 1
+        argument = None if argument is None else int(argument["int"]) if "int" in argument else argument["string"]
+        return self.view((contract, view, argument))
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class StorageFieldsTest(unittest.TestCase):
+    def test_flattened_and_nested_combs(self):
+        nested = {"prim": "Pair", "args": [{"string": "tz1admin"}, {"prim": "Pair", "args": [{"int": "7"}, {"int": "2"}]}]}
+        flattened = {"prim": "Pair", "args": [{"string": "tz1admin"}, {"int": "7"}, {"int": "2"}]}
+        sequence = [{"string": "tz1admin"}, {"int": "7"}, {"int": "2"}]
+        for value in (nested, flattened, sequence):
+            fields = storage_fields(STORAGE_TYPE, value, ("last_epoch", "validity_window_in_epochs"))
+            self.assertEqual(fields, {"last_epoch": {"int": "7"}, "validity_window_in_epochs": {"int": "2"}})
+
+    def test_batch_script_round_trip(self):
+        requests = [(ORACLE, "get_price", "XTZ-USD"), (ORACLE, "get_price_by_id", 3), (PROXY, "view_price", None)]
+        self.assertEqual(requests_of(batch_script(requests)), requests)
+
+class OracleReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock(100 * EPOCH_INTERVAL + 10)
+        self.rpc = FakeRpc(last_epoch=99)
+        self.rpc.views = {(ORACLE, "get_price", "XTZ-USD"): 3500000, (ORACLE, "get_price", "BTC-USD"): 38415000000,
+            (PROXY, "view_price", None): 91110}
+        self.reader = OracleReader(self.rpc, ORACLE, epoch_interval=EPOCH_INTERVAL, poll_interval=10, clock=self.clock)
+
+    def test_reads_in_one_round_trip_and_caches(self):
+        self.assertEqual(self.reader.get_prices(["XTZ-USD", "BTC-USD"]), {"XTZ-USD": 3500000, "BTC-USD": 38415000000})
+        self.assertEqual(self.reader.get_relative_price(PROXY), 91110)
+        self.assertEqual(self.rpc.calls["run_code"], 2)
+        self.assertEqual(self.reader.get_price("XTZ-USD"), 3500000)
+        self.assertEqual(self.rpc.calls["run_code"], 2)
+
+    def test_polls_until_the_epoch_is_finalized(self):
+        self.reader.get_price("XTZ-USD")
+        self.assertEqual((self.rpc.calls["contract_script"], self.rpc.calls["contract_storage"]), (1, 0))
+        self.clock.now += 5
+        self.reader.get_price("XTZ-USD")
+        self.assertEqual(self.rpc.calls["contract_storage"], 0)
+        self.clock.now += 10
+        self.reader.get_price("XTZ-USD")
+        self.assertEqual(self.rpc.calls["contract_storage"], 1)
+        self.assertEqual(self.rpc.calls["run_code"], 1)
+
+        self.rpc.last_epoch = 100
+        self.rpc.views[(ORACLE, "get_price", "XTZ-USD")] = 3600000
+        self.clock.now += 10
+        self.assertEqual(self.reader.get_price("XTZ-USD"), 3600000)
+        self.assertEqual(self.rpc.calls["run_code"], 2)
+        # finalized: nothing can change before the next epoch
+        self.clock.now += 600
+        self.reader.get_price("XTZ-USD")
+        self.assertEqual((self.rpc.calls["contract_storage"], self.rpc.calls["run_code"]), (2, 2))
+        self.clock.now += 300
+        self.reader.get_price("XTZ-USD")
+        self.assertEqual(self.rpc.calls["contract_storage"], 3)
+
+    def test_stale_prices_fail_locally(self):
+        self.rpc.last_epoch = 98
+        with self.assertRaises(OracleError) as context:
+            self.reader.get_price("XTZ-USD")
+        self.assertEqual(context.exception.code, Errors.PRICE_TOO_OLD)
+        self.assertEqual(self.rpc.calls["run_code"], 0)
+
+    def test_zero_fails(self):
+        self.rpc.views[(ORACLE, "get_price", "XTZ-USD")] = 0
+        with self.assertRaises(OracleError) as context:
+            self.reader.get_price("XTZ-USD")
+        self.assertEqual(context.exception.code, Errors.CANNOT_BE_ZERO)
+
+    def test_failing_view_only_fails_its_request(self):
+        self.rpc.failing[(ORACLE, "get_price", "ETH-USD")] = Errors.NULL_VALUE
+        with self.assertRaises(OracleError) as context:
+            self.reader.get_prices(["XTZ-USD", "ETH-USD"])
+        self.assertEqual(context.exception.code, Errors.NULL_VALUE)
+        self.assertEqual(self.rpc.calls["run_view"], 2)
+        self.assertEqual(self.reader.get_price("XTZ-USD"), 3500000)
+        self.assertEqual(self.rpc.calls["run_view"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
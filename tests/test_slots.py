@@ -0,0 +1,78 @@
+import itertools
+import unittest
+
+from utils.slots import default_slot, assign, job_epoch, position, slot_time, should_submit, submitting
+
+# the "Job Scheduler Slots" scenario of oracles/job_scheduler.py: three executors, two primaries, backups 60 seconds apart
+SLOTS = [{"rank": rank, "group_size": 3, "primaries": 2, "spacing": 60} for rank in range(3)]
+
+def job(slot, start=0, interval=900):
+    return {"start": start, "interval": interval, "slot": slot}
+
+def epoch_slot(job, epoch):
+    """JobScheduler.epoch_slot step by step: slot_position, then the nat offset max(position + 1, primaries) - primaries spacings
+    after the start of the epoch.
+    """
+    slot = job["slot"]
+    position = (slot["rank"] + epoch) % slot["group_size"]
+    offset = (max(position + 1, slot["primaries"]) - slot["primaries"]) * slot["spacing"]
+    return job["start"] + epoch * max(job["interval"], 1) + offset
+
+def valid_slots(interval):
+    """Every slot publish accepts for interval with group sizes up to 4."""
+    for group_size in range(1, 5):
+        for rank, primaries, spacing in itertools.product(range(group_size), range(group_size + 1), (0, 1, 30, 60, 299)):
+            if (group_size - primaries) * spacing < max(interval, 1):
+                yield {"rank": rank, "group_size": group_size, "primaries": primaries, "spacing": spacing}
+
+class SlotTimeTest(unittest.TestCase):
+    def test_matches_the_contract(self):
+        for start, interval in ((0, 900), (1650000000, 900), (100, 30), (5, 0)):
+            for slot in valid_slots(interval):
+                for epoch in range(2 * slot["group_size"]):
+                    scheduled = job(slot, start, interval)
+                    self.assertEqual(slot_time(scheduled, epoch), epoch_slot(scheduled, epoch), (slot, start, interval, epoch))
+
+    def test_scenario_slots(self):
+        # (rank, epoch, due) of the fulfills and views of the scenario
+        for rank, epoch, due in ((0, 0, 0), (1, 0, 0), (2, 0, 60), (2, 1, 900), (1, 1, 960), (1, 2, 1800), (0, 2, 1860),
+                (0, 3, 2700), (2, 3, 2760)):
+            self.assertEqual(slot_time(job(SLOTS[rank]), epoch), due)
+            self.assertEqual(slot_time(job(SLOTS[rank]), epoch), epoch_slot(job(SLOTS[rank]), epoch))
+
+    def test_primaries_and_backups(self):
+        for epoch in range(3):
+            positions = sorted(position(slot, epoch) for slot in SLOTS)
+            self.assertEqual(positions, [0, 1, 2])
+            due = sorted(slot_time(job(slot), epoch) - epoch * 900 for slot in SLOTS)
+            self.assertEqual(due, [0, 0, 60])
+
+    def test_default_slot_is_always_a_primary(self):
+        for epoch in range(5):
+            self.assertEqual(slot_time(job(default_slot(), 900, 900), epoch), 900 + epoch * 900)
+        self.assertEqual(assign(["a", "b"], 1, 60)["b"], {"rank": 1, "group_size": 2, "primaries": 1, "spacing": 60})
+
+class JobEpochTest(unittest.TestCase):
+    def test_job_epoch(self):
+        self.assertEqual(job_epoch(job(SLOTS[0], 900), 0), 0)
+        self.assertEqual(job_epoch(job(SLOTS[0], 900), 900), 0)
+        self.assertEqual(job_epoch(job(SLOTS[0], 900), 1799), 0)
+        self.assertEqual(job_epoch(job(SLOTS[0], 900), 1800), 1)
+        self.assertEqual(job_epoch(job(SLOTS[0], 0, 0), 7), 7)
+
+class ShouldSubmitTest(unittest.TestCase):
+    def test_scenario_fulfills(self):
+        # the backup of rank 2 is refused at 59 and accepted at 60, rank 1 is a backup in epoch 1
+        self.assertFalse(should_submit(job(SLOTS[2]), -1, 59))
+        self.assertTrue(should_submit(job(SLOTS[2]), -1, 60))
+        self.assertFalse(should_submit(job(SLOTS[1]), 0, 930))
+        self.assertTrue(should_submit(job(SLOTS[1]), 0, 960))
+        self.assertFalse(should_submit(job(SLOTS[1]), 1, 960))
+
+    def test_submitting(self):
+        self.assertEqual(submitting(SLOTS, {0, 1, 2}, 0), [0, 1])
+        self.assertEqual(submitting(SLOTS, {0, 2}, 0), [0, 2])
+        self.assertEqual(submitting(SLOTS, {2}, 1), [2])
+
+if __name__ == '__main__':
+    unittest.main()
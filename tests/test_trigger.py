@@ -0,0 +1,59 @@
+import unittest
+
+import oracles.constants as Constants
+from utils.trigger import (epoch_of, deviation_bps, heartbeat_expired, should_submit, max_submissions_per_day,
+    heartbeat_submissions_per_day)
+
+HF_INTERVAL = Constants.HIGH_FREQUENCY_EPOCH_INTERVAL
+HEARTBEAT = Constants.ORACLE_EPOCH_INTERVAL
+PRICES = {"DEFI": 3500000, "XTZ": 2100000, "BTC": 38415000000}
+
+def submit(observed, last_epoch, now, **kwargs):
+    return should_submit(PRICES, dict(PRICES, **observed), last_epoch, now, epoch_interval=HF_INTERVAL, heartbeat=HEARTBEAT, **kwargs)
+
+class EpochTest(unittest.TestCase):
+    def test_epoch_of(self):
+        self.assertEqual(epoch_of(18000), 20)
+        self.assertEqual(epoch_of(18899), 20)
+        self.assertEqual(epoch_of(18900), 21)
+        self.assertEqual(epoch_of(18000, HF_INTERVAL), 600)
+        self.assertEqual(epoch_of(18029, HF_INTERVAL), 600)
+
+    def test_heartbeat_counts_from_the_start_of_the_last_epoch(self):
+        # epoch 600 starts at 18000, the heartbeat expires 900 seconds later whatever the epoch length
+        self.assertFalse(heartbeat_expired(600, 18899, HF_INTERVAL, HEARTBEAT))
+        self.assertTrue(heartbeat_expired(600, 18900, HF_INTERVAL, HEARTBEAT))
+        self.assertTrue(heartbeat_expired(20, 18900))
+        self.assertFalse(heartbeat_expired(21, 18900))
+
+class DeviationTest(unittest.TestCase):
+    def test_deviation_bps(self):
+        self.assertEqual(deviation_bps(3500000, 3517500), 50)
+        self.assertEqual(deviation_bps(3500000, 3482500), 50)
+        self.assertEqual(deviation_bps(3500000, 3517499), 49)
+        self.assertIsNone(deviation_bps(0, 3500000))
+
+    def test_should_submit(self):
+        # epoch 600 is finalized, 18030 is the first second of epoch 601
+        self.assertFalse(submit({}, 600, 18029))
+        self.assertFalse(submit({"BTC": 40000000000}, 600, 18029))
+        self.assertFalse(submit({}, 600, 18030))
+        self.assertFalse(submit({"XTZ": 2110499}, 600, 18030))
+        self.assertTrue(submit({"XTZ": 2110500}, 600, 18030))
+        self.assertTrue(submit({"DEFI": 3482500}, 600, 18030))
+        self.assertFalse(submit({"XTZ": 2110500}, 600, 18030, deviation_threshold_bps=100))
+        # a flat market only submits with the heartbeat
+        self.assertFalse(submit({}, 600, 18899))
+        self.assertTrue(submit({}, 600, 18900))
+
+    def test_missing_onchain_price_submits(self):
+        self.assertTrue(should_submit({}, PRICES, 600, 18030, epoch_interval=HF_INTERVAL, heartbeat=HEARTBEAT))
+
+class ThroughputTest(unittest.TestCase):
+    def test_readme_table(self):
+        self.assertEqual([max_submissions_per_day(5, interval) for interval in (900, 60, 30)], [480, 7200, 14400])
+        self.assertEqual(heartbeat_submissions_per_day(5), 480)
+        self.assertEqual(max_submissions_per_day(5, HF_INTERVAL), 5 * 2880)
+
+if __name__ == '__main__':
+    unittest.main()
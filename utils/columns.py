@@ -0,0 +1,105 @@
+import array
+import json
+import os
+import sys
+
+STRING = "s"
+NUMPY_TYPES = {"q": "<i8", "b": "i1", "i": "<i4"}
+
+class Table:
+    """Append-only table stored as one binary file per column, written with the array module (little endian int64 "q", int8 "b")
+    so that numpy.fromfile(path, dtype) or numpy.memmap read a column without parsing. String columns (STRING) are dictionary
+    encoded: the file holds int32 codes into the table's dictionary, which the ColumnStore keeps in its state.
+    """
+    def __init__(self, directory, name, columns, rows, dictionaries):
+        self.directory = directory
+        self.name = name
+        self.columns = columns
+        self.rows = rows
+        self.dictionaries = dictionaries
+        self.codes = {column: {value: code for code, value in enumerate(values)} for column, values in dictionaries.items()}
+        self.buffers = {column: array.array(self.typecode(column)) for column, _ in columns}
+        if array.array("q").itemsize != 8 or array.array("i").itemsize != 4:
+            raise RuntimeError("unsupported platform, the column files need 8 byte q and 4 byte i arrays")
+
+    def typecode(self, column):
+        typecode = dict(self.columns)[column]
+        return "i" if typecode == STRING else typecode
+
+    def path(self, column):
+        return os.path.join(self.directory, "{}.{}.bin".format(self.name, column))
+
+    def truncate(self):
+        """Cuts every column file to the committed row count, dropping rows appended by a run that did not commit.
+        """
+        for column, _ in self.columns:
+            path = self.path(column)
+            size = self.rows * array.array(self.typecode(column)).itemsize
+            if not os.path.exists(path):
+                open(path, "wb").close()
+            elif os.path.getsize(path) > size:
+                with open(path, "r+b") as column_file:
+                    column_file.truncate(size)
+            elif os.path.getsize(path) < size:
+                raise ValueError("{} has fewer rows than committed, the export is corrupt".format(path))
+
+    def encode(self, column, value):
+        codes = self.codes.setdefault(column, {})
+        if value not in codes:
+            codes[value] = len(codes)
+            self.dictionaries.setdefault(column, []).append(value)
+        return codes[value]
+
+    def append(self, **row):
+        for column, typecode in self.columns:
+            value = row[column]
+            self.buffers[column].append(self.encode(column, value) if typecode == STRING else value)
+
+    def flush(self):
+        """Appends the buffered rows to the column files and returns the new row count.
+        """
+        appended = len(self.buffers[self.columns[0][0]])
+        for column, _ in self.columns:
+            buffer = self.buffers[column]
+            if sys.byteorder != "little":
+                buffer.byteswap()
+            with open(self.path(column), "ab") as column_file:
+                buffer.tofile(column_file)
+            self.buffers[column] = array.array(self.typecode(column))
+        self.rows += appended
+        return self.rows
+
+class ColumnStore:
+    """Directory of Tables and a state.json with the last processed level, the committed row count of every table, the string
+    dictionaries and any extra state of the writer. Rows only count once commit wrote the state, so an interrupted export resumes
+    from the last committed level without duplicates.
+    """
+    def __init__(self, directory, schema):
+        self.directory = directory
+        self.schema = schema
+        os.makedirs(directory, exist_ok=True)
+        self.state = {"level": None, "rows": {}, "dictionaries": {}, "extra": {}}
+        state_path = os.path.join(directory, "state.json")
+        if os.path.exists(state_path):
+            with open(state_path) as state_file:
+                self.state = json.load(state_file)
+        self.tables = {}
+        for name, columns in schema.items():
+            table = Table(directory, name, columns, self.state["rows"].get(name, 0), self.state["dictionaries"].setdefault(name, {}))
+            table.truncate()
+            self.tables[name] = table
+
+    def append(self, table, **row):
+        self.tables[table].append(**row)
+
+    def commit(self, level):
+        for name, table in self.tables.items():
+            self.state["rows"][name] = table.flush()
+        self.state["level"] = level
+        self.state["schema"] = {name: [[column, NUMPY_TYPES["i" if typecode == STRING else typecode]] for column, typecode in columns]
+            for name, columns in self.schema.items()}
+        # written to a temporary file first so that a crash never leaves a truncated state behind
+        temporary_path = os.path.join(self.directory, "state.json.tmp")
+        with open(temporary_path, "w") as state_file:
+            json.dump(self.state, state_file, indent=2, sort_keys=True)
+        os.replace(temporary_path, os.path.join(self.directory, "state.json"))
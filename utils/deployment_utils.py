@@ -1,20 +1,172 @@
-def get_address(operation_hash):
-    while True:
-        try:
-            opg = pytezos_admin_client.shell.blocks[-50:].find_operation(operation_hash)
-            originated_contracts = OperationResult.originated_contracts(opg)
-            if len(originated_contracts) >= 1:
-                return originated_contracts[0]
-        except:
-            pass
-
-def wait_applied(operation_hash):
-    while True:
+import glob
+import hashlib
+import json
+import os
+import time
+
+from pytezos import ContractInterface
+from pytezos.michelson.parse import michelson_to_micheline
+from pytezos.operation.result import OperationResult
+
+from utils.limits import LimitTuner
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+EXPIRED = "expired"
+
+def artifact(target, output="out", kind="contract"):
+    """Returns the path of the compiled contract (kind="contract") or initial storage (kind="storage") of a compilation target. The
+    step_000_cont_N index depends on the order of compiler.py, so it is looked up instead of hard coded.
+    """
+    paths = glob.glob(os.path.join(output, target, "step_000_cont_*_{}.tz".format(kind)))
+    if len(paths) != 1:
+        raise FileNotFoundError("expected one compiled {} of {} in '{}', found {}".format(kind, target, output, len(paths)))
+    return paths[0]
+
+class Step:
+    """One origination of a deployment plan.
+
+    storage is either a dict of storage fields or a function of the addresses originated by the previous steps (step name -> address)
+    returning that dict. The fields override storage.dummy(), or the compiled initial storage if compiled_storage is set (required for
+    lazy builds, their entrypoint lambdas live in the storage).
+    """
+    def __init__(self, name, target, storage, compiled_storage=False):
+        self.name = name
+        self.target = target
+        self.storage = storage
+        self.compiled_storage = compiled_storage
+
+    def code_hash(self, output):
+        with open(artifact(self.target, output), "rb") as code_file:
+            return hashlib.sha256(code_file.read()).hexdigest()
+
+    def script(self, output, addresses):
+        """Returns (code hash, script) ready for the origination.
+        """
+        code_hash = self.code_hash(output)
+        code = ContractInterface.from_file(artifact(self.target, output))
+        if self.compiled_storage:
+            with open(artifact(self.target, output, kind="storage")) as storage_file:
+                storage = code.storage.decode(michelson_to_micheline(storage_file.read()))
+        else:
+            storage = code.storage.dummy()
+        fields = self.storage(addresses) if callable(self.storage) else self.storage
+        for field, value in fields.items():
+            storage[field] = value
+        return code_hash, code.script(initial_storage=storage)
+
+class Checkpoint:
+    """Deployment state persisted as json after every change: chain id and, per step, the status, operation hash, level the operation
+    expires at, code hash and originated address.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.chain_id = None
+        self.steps = {}
+        if os.path.exists(path):
+            with open(path) as checkpoint_file:
+                state = json.load(checkpoint_file)
+            self.chain_id = state["chain_id"]
+            self.steps = state["steps"]
+
+    def record(self, name, **fields):
+        self.steps.setdefault(name, {}).update(fields)
+        self.save()
+
+    def save(self):
+        # written to a temporary file first so that a crash never leaves a truncated checkpoint behind
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w") as checkpoint_file:
+            json.dump({"chain_id": self.chain_id, "steps": self.steps}, checkpoint_file, indent=2, sort_keys=True)
+        os.replace(temporary_path, self.path)
+
+class Deployer:
+    """Runs a plan (list of Step) step by step and records every origination in the checkpoint before injecting it. Rerunning the
+    same plan with the same checkpoint skips the done steps, waits for pending operations that can still be included and only
+    originates again if an operation failed or expired without being included. The limits and fees of the originations are set by
+    the LimitTuner.
+    """
+    def __init__(self, client, checkpoint, output="out", timeout=600, interval=5, ttl=60, tuner=None):
+        self.client = client
+        self.tuner = tuner or LimitTuner(client)
+        self.checkpoint = checkpoint
+        self.output = output
+        self.timeout = timeout
+        self.interval = interval
+        self.ttl = ttl
+
+    def head_level(self):
+        return self.client.shell.head.header()["level"]
+
+    def find_operation(self, operation_hash, level):
+        """Returns the operation group if it was included since level, None otherwise.
+        """
         try:
-            opg = pytezos_admin_client.shell.blocks[-50:].find_operation(operation_hash)
-            originated_contracts = OperationResult.is_applied(opg)
-            if originated_contracts:
-                time.sleep(5)
-                return True
-        except:
-            pass
\ No newline at end of file
+            return self.client.shell.blocks[level:].find_operation(operation_hash)
+        except StopIteration:
+            return None
+
+    def wait_included(self, operation_hash, level, expires_at):
+        """Polls until the operation is included (returns it) or has expired (returns None). Gives up after timeout seconds, the
+        operation stays pending in the checkpoint and the next run continues waiting.
+        """
+        deadline = time.time() + self.timeout
+        while True:
+            operation_group = self.find_operation(operation_hash, level)
+            if operation_group is not None:
+                return operation_group
+            if self.head_level() > expires_at:
+                return None
+            if time.time() > deadline:
+                raise TimeoutError("operation '{}' not included after {}s, rerun to continue waiting".format(operation_hash, self.timeout))
+            time.sleep(self.interval)
+
+    def reconcile(self, name):
+        """Resolves a pending step to done, failed or expired.
+        """
+        state = self.checkpoint.steps[name]
+        operation_group = self.wait_included(state["operation_hash"], state["level"], state["expires_at"])
+        if operation_group is None:
+            self.checkpoint.record(name, status=EXPIRED)
+        elif not OperationResult.is_applied(operation_group):
+            self.checkpoint.record(name, status=FAILED)
+        else:
+            self.checkpoint.record(name, status=DONE, address=OperationResult.originated_contracts(operation_group)[0])
+        return self.checkpoint.steps[name]
+
+    def originate(self, step, addresses):
+        code_hash, script = step.script(self.output, addresses)
+        level = self.head_level()
+        operation_group = self.tuner.prepare(self.client.origination(script=script), ttl=self.ttl).sign()
+        self.checkpoint.record(step.name, status=PENDING, operation_hash=operation_group.hash(), level=level,
+            expires_at=level+self.ttl, code_hash=code_hash, address=None)
+        operation_group.inject()
+        print("sent    {}: '{}'".format(step.name, operation_group.hash()))
+
+    def run(self, plan):
+        """Originates the plan and returns the addresses (step name -> address).
+        """
+        chain_id = self.client.shell.chains.main.chain_id()
+        if self.checkpoint.chain_id is None:
+            self.checkpoint.chain_id = chain_id
+        elif self.checkpoint.chain_id != chain_id:
+            raise ValueError("checkpoint '{}' belongs to chain {}, not {}".format(self.checkpoint.path, self.checkpoint.chain_id, chain_id))
+
+        addresses = {}
+        for step in plan:
+            state = self.checkpoint.steps.get(step.name, {})
+            if state.get("status") == PENDING:
+                state = self.reconcile(step.name)
+            if state.get("status") != DONE:
+                self.originate(step, addresses)
+                state = self.reconcile(step.name)
+                if state["status"] != DONE:
+                    raise RuntimeError("origination of {} {}: '{}'".format(step.name, state["status"], state["operation_hash"]))
+                print("done    {}: '{}'".format(step.name, state["address"]))
+            else:
+                print("skipped {}: '{}'".format(step.name, state["address"]))
+                if state["code_hash"] != step.code_hash(self.output):
+                    print("warning: {} was recompiled since it was originated, use a new checkpoint to deploy the new code".format(step.name))
+            addresses[step.name] = state["address"]
+        return addresses
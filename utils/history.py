@@ -0,0 +1,187 @@
+import calendar
+import json
+import os
+import time
+
+import oracles.constants as Constants
+from utils.columns import ColumnStore, STRING
+from utils.payload import decode
+from utils.reader import storage_fields
+from utils.rpc import Rpc
+
+SYMBOLS = {symbol_id: symbol for symbol, symbol_id in Constants.SYMBOL_IDS.items()}
+SCHEMA = {
+    "responses": [("level", "q"), ("timestamp", "q"), ("oracle", STRING), ("respondent", STRING), ("response_timestamp", "q"),
+        ("defi_price", "q"), ("xtz_price", "q"), ("btc_price", "q"), ("applied", "b")],
+    "epochs": [("level", "q"), ("timestamp", "q"), ("oracle", STRING), ("epoch", "q"), ("defi_price", "q"), ("xtz_price", "q"),
+        ("btc_price", "q")],
+    "lp_ratios": [("level", "q"), ("timestamp", "q"), ("oracle", STRING), ("lpt_total_supply", "q"), ("value_token_balance", "q"),
+        ("ratio", "q"), ("last_update", "q")],
+}
+LP_FIELDS = ("lpt_total_supply", "value_token_balance_of", "value_token_per_lpt_ratio", "last_update")
+
+def seconds(value):
+    """Unix time of an RFC 3339 timestamp or of a Micheline timestamp (int in optimized, string in readable form).
+    """
+    if isinstance(value, dict):
+        if "int" in value:
+            return int(value["int"])
+        value = value["string"]
+    return calendar.timegm(time.strptime(value[:19], "%Y-%m-%dT%H:%M:%S"))
+
+def transactions(block):
+    """Yields (respondent, destination, parameters, result) of every transaction of the block, internal ones included. respondent
+    is the source of the manager operation (the sp.source of the internal calls).
+    """
+    for operations in block["operations"][3:]:
+        for operation in operations:
+            for content in operation["contents"]:
+                if content["kind"] != "transaction":
+                    continue
+                metadata = content["metadata"]
+                yield content["source"], content["destination"], content.get("parameters"), metadata["operation_result"]
+                for internal in metadata.get("internal_operation_results", []):
+                    if internal["kind"] == "transaction":
+                        yield content["source"], internal["destination"], internal.get("parameters"), internal["result"]
+
+def big_map_updates(result, big_map_id):
+    """Yields (key, value) Micheline of the updates of the big_map big_map_id in a result.
+    """
+    for diff in result.get("lazy_storage_diff", []):
+        if diff["kind"] == "big_map" and diff["id"] == big_map_id and diff["diff"]["action"] in ("update", "alloc"):
+            for update in diff["diff"].get("updates", []):
+                if "value" in update:
+                    yield update["key"], update["value"]
+
+class Exporter:
+    """Incremental export of the fulfills, finalized epochs and LP ratio updates of the given oracles into a ColumnStore.
+
+    responses: every fulfill reaching a PriceOracle (through the JobScheduler or direct), its decoded payload and whether it applied
+    epochs: every change of last_epoch with the prices written to the prices big_map in the same call
+    lp_ratios: every change of the LPPriceOracle ratio or last_update
+
+    Blocks are exported up to confirmations below the head, so that a reorganisation does not leave orphaned rows behind.
+    """
+    def __init__(self, source, store, oracles=(), lp_oracles=(), confirmations=2, commit_every=100):
+        self.source = source
+        self.store = store
+        self.oracles = set(oracles)
+        self.lp_oracles = set(lp_oracles)
+        self.confirmations = confirmations
+        self.commit_every = commit_every
+        self.storage_types = {}
+        # last seen last_epoch / LP fields per contract, so that only changes are recorded
+        self.last = store.state["extra"].setdefault("last", {})
+
+    def storage_type(self, contract):
+        if contract not in self.storage_types:
+            code = self.source.contract_script(contract)["code"]
+            self.storage_types[contract] = next(section for section in code if section["prim"] == "storage")["args"][0]
+        return self.storage_types[contract]
+
+    def sync(self, start=None, until=None):
+        """Exports the blocks after the last committed level (or from start on a new export) up to until or the confirmed head.
+        Returns the last exported level.
+        """
+        level = self.store.state["level"]
+        first = level + 1 if level is not None else start if start is not None else self.source.header()["level"] - self.confirmations
+        last = until if until is not None else self.source.header()["level"] - self.confirmations
+        for current in range(first, last + 1):
+            self.process(self.source.block(current))
+            if current == last or (current - first + 1) % self.commit_every == 0:
+                self.store.commit(current)
+        return last
+
+    def process(self, block):
+        level = block["header"]["level"]
+        timestamp = seconds(block["header"]["timestamp"])
+        for respondent, destination, parameters, result in transactions(block):
+            applied = result["status"] == "applied"
+            if destination in self.oracles and parameters is not None and parameters["entrypoint"] == "fulfill":
+                self.response(level, timestamp, destination, respondent, parameters["value"], applied)
+            if not applied or "storage" not in result:
+                continue
+            if destination in self.oracles:
+                self.epoch(level, timestamp, destination, result)
+            elif destination in self.lp_oracles:
+                self.lp_ratio(level, timestamp, destination, result)
+
+    def response(self, level, timestamp, oracle, respondent, value, applied):
+        items = value["args"] if isinstance(value, dict) else value
+        try:
+            response = decode(bytes.fromhex(items[1]["bytes"]))
+        except (KeyError, IndexError, ValueError):
+            # not a payload of this oracle version, counted so that silently dropped responses are visible
+            self.store.state["extra"]["undecoded"] = self.store.state["extra"].get("undecoded", 0) + 1
+            return
+        self.store.append("responses", level=level, timestamp=timestamp, oracle=oracle, respondent=respondent,
+            response_timestamp=response[0], defi_price=response[1], xtz_price=response[2], btc_price=response[3], applied=int(applied))
+
+    def epoch(self, level, timestamp, oracle, result):
+        fields = storage_fields(self.storage_type(oracle), result["storage"], ("last_epoch", "prices"))
+        last_epoch = int(fields["last_epoch"]["int"])
+        if self.last.get(oracle) == last_epoch:
+            return
+        self.last[oracle] = last_epoch
+        prices = {}
+        # only the prices big_map, the median aggregation also writes its valid_responses buffer in the same call
+        for key, value in big_map_updates(result, fields["prices"]["int"]):
+            symbol = key["string"] if "string" in key else SYMBOLS.get(int(key["int"]))
+            prices[symbol] = int(value["int"])
+        if not prices:
+            # first call seen of an oracle that did not finalize in it, i.e. an admin call
+            return
+        self.store.append("epochs", level=level, timestamp=timestamp, oracle=oracle, epoch=last_epoch, defi_price=prices.get("DEFI", -1),
+            xtz_price=prices.get("XTZ", -1), btc_price=prices.get("BTC", -1))
+
+    def lp_ratio(self, level, timestamp, oracle, result):
+        fields = storage_fields(self.storage_type(oracle), result["storage"], LP_FIELDS)
+        values = [int(fields[name]["int"]) for name in LP_FIELDS[:3]] + [seconds(fields["last_update"])]
+        if self.last.get(oracle) == values[2:]:
+            return
+        self.last[oracle] = values[2:]
+        self.store.append("lp_ratios", level=level, timestamp=timestamp, oracle=oracle, lpt_total_supply=values[0],
+            value_token_balance=values[1], ratio=values[2], last_update=values[3])
+
+class RecordedRpc:
+    """Stand-in of the Rpc for the exporter reading the blocks and scripts saved by RecordingRpc, the head is the last recorded
+    block. Used to rerun an export offline and to test the exporter on recorded blocks.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def load(self, *path):
+        with open(os.path.join(self.directory, *path)) as recorded_file:
+            return json.load(recorded_file)
+
+    def header(self, block="head"):
+        if block == "head":
+            block = max(int(name[:-len(".json")]) for name in os.listdir(os.path.join(self.directory, "blocks")))
+        return self.load("blocks", "{}.json".format(block))["header"]
+
+    def block(self, block="head"):
+        return self.load("blocks", "{}.json".format(block if block != "head" else self.header()["level"]))
+
+    def contract_script(self, contract, block="head"):
+        return self.load("scripts", "{}.json".format(contract))
+
+class RecordingRpc(Rpc):
+    """Rpc saving every block and script it returns in the layout read by RecordedRpc.
+    """
+    def __init__(self, endpoint, directory, **kwargs):
+        Rpc.__init__(self, endpoint, **kwargs)
+        self.directory = directory
+        for section in ("blocks", "scripts"):
+            os.makedirs(os.path.join(directory, section), exist_ok=True)
+
+    def save(self, value, *path):
+        with open(os.path.join(self.directory, *path), "w") as recorded_file:
+            json.dump(value, recorded_file)
+        return value
+
+    def block(self, block="head"):
+        value = Rpc.block(self, block)
+        return self.save(value, "blocks", "{}.json".format(value["header"]["level"]))
+
+    def contract_script(self, contract, block="head"):
+        return self.save(Rpc.contract_script(self, contract, block), "scripts", "{}.json".format(contract))
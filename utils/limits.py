@@ -0,0 +1,159 @@
+import math
+import threading
+
+from pytezos.operation.group import OperationGroup
+from pytezos.operation.result import OperationResult
+from pytezos.rpc.errors import RpcError
+
+MINIMAL_FEE_MUTEZ = 100
+MINIMAL_NANOTEZ_PER_GAS_UNIT = 100
+MINIMAL_NANOTEZ_PER_BYTE = 1000
+SIGNATURE_SIZE = 64
+ORIGINATION_SIZE = 257
+FEE_PLACEHOLDER = 10**6 # fee of the simulations only, with_fees sizes the operation with the actual fees
+
+def shape(value):
+    """Shape of a Micheline value: the structure with the sizes of the literals instead of their values. Two fulfills with
+    different prices but the same payload length have the same shape and cost the same gas.
+    """
+    if isinstance(value, list):
+        return tuple(shape(item) for item in value)
+    if isinstance(value, dict):
+        if "prim" in value:
+            return (value["prim"],) + tuple(shape(argument) for argument in value.get("args", []))
+        for literal in ("int", "string", "bytes"):
+            if literal in value:
+                return (literal, len(value[literal]))
+    return value
+
+def operation_key(content):
+    """Cache key of a content: kind, destination, entrypoint and shape of the parameters (or of the script for originations).
+    """
+    parameters = content.get("parameters", {})
+    return (content["kind"], content.get("destination"), parameters.get("entrypoint"), shape(parameters.get("value")),
+        shape(content.get("script", {}).get("code")))
+
+def usage(content):
+    """Returns the (milligas, storage bytes) a simulated content consumed, internal operations included.
+    """
+    metadata = content["metadata"]
+    results = [metadata["operation_result"]] + [internal["result"] for internal in metadata.get("internal_operation_results", [])]
+    milligas, storage = 0, 0
+    for result in results:
+        milligas += int(result.get("consumed_milligas", int(result.get("consumed_gas", 0))*1000))
+        storage += int(result.get("paid_storage_size_diff", 0))
+        storage += ORIGINATION_SIZE * (len(result.get("originated_contracts", [])) + int(result.get("allocated_destination_contract", False)))
+    return milligas, storage
+
+class LimitTuner:
+    """Sets the gas, storage and fee of outgoing operations from a simulation (run_operation) instead of pytezos' defaults.
+
+    The limits are the measured usage plus gas_margin and storage_margin (fractions). The fee is the minimal fee the nodes accept for
+    these limits and the forged size, plus fee_margin. Simulations are cached per operation_key: the highest usage seen for a key is
+    reused for resimulate_every operations before simulating again (fulfill gets more expensive for the response that finalizes the
+    epoch, a cache hit must not be limited to the cheaper path). An operation failing for exhausted limits clears its cache entry.
+    The cache is shared by the threads sending through the same tuner (load_test), simulations run outside of its lock.
+    """
+    def __init__(self, client, gas_margin=0.15, storage_margin=0.1, fee_margin=0.05, resimulate_every=20):
+        self.client = client
+        self.gas_margin = gas_margin
+        self.storage_margin = storage_margin
+        self.fee_margin = fee_margin
+        self.resimulate_every = resimulate_every
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def simulate(self, operation_group):
+        """Returns the usage of every content, raises the node's error if the operation would fail.
+        """
+        result = operation_group.run_operation()
+        if not OperationResult.is_applied(result):
+            raise RpcError.from_errors(OperationResult.errors(result))
+        return [usage(content) for content in result["contents"]]
+
+    def key(self, operation_group):
+        return (operation_group.protocol,) + tuple(operation_key(content) for content in operation_group.contents)
+
+    def limits(self, operation_group):
+        key = self.key(operation_group)
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is not None and entry["uses"] < self.resimulate_every:
+                entry["uses"] += 1
+                return entry["usage"]
+        measured = self.simulate(self.with_limits(operation_group, None))
+        with self.lock:
+            # another thread may have stored a simulation of the same key meanwhile, keep the highest usage of both
+            entry = self.cache.get(key)
+            if entry is not None:
+                measured = [(max(milligas, cached[0]), max(storage, cached[1])) for (milligas, storage), cached in zip(measured, entry["usage"])]
+            self.cache[key] = {"usage": measured, "uses": 1}
+        return measured
+
+    def with_contents(self, operation_group, contents):
+        """Unsigned copy of the operation group with other contents.
+        """
+        return OperationGroup(context=operation_group.context, contents=contents, protocol=operation_group.protocol,
+            chain_id=operation_group.chain_id, branch=operation_group.branch)
+
+    def with_limits(self, operation_group, measured):
+        """Copy of the operation group with the limits of measured, or the hard limits of the node to simulate if measured is None.
+        """
+        if measured is None:
+            constants = self.client.shell.block.context.constants()
+        contents = []
+        for index, content in enumerate(operation_group.contents):
+            if measured is None:
+                gas_limit = int(constants["hard_gas_limit_per_operation"]) // len(operation_group.contents)
+                storage_limit = int(constants["hard_storage_limit_per_operation"])
+            else:
+                milligas, storage = measured[index]
+                gas_limit = math.ceil(milligas * (1 + self.gas_margin) / 1000)
+                storage_limit = math.ceil(storage * (1 + self.storage_margin))
+            contents.append(dict(content, gas_limit=str(gas_limit), storage_limit=str(storage_limit), fee=str(FEE_PLACEHOLDER)))
+        return self.with_contents(operation_group, contents)
+
+    def with_fees(self, operation_group):
+        """Copy of the operation group with the minimal fees of its limits and forged size. The fees are part of the forged size
+        (zarith, 2 bytes below 16384 mutez, 3 below 2097152), so they are set again until the size no longer changes. The size only
+        moves in one direction from the placeholder fees, this takes two or three forges.
+        """
+        size = None
+        while True:
+            forged_size = len(operation_group.forge()) // 2 + SIGNATURE_SIZE
+            if forged_size == size:
+                return operation_group
+            size = forged_size
+            contents = []
+            for content in operation_group.contents:
+                # the size is paid once, by the first content of a batch
+                fee = MINIMAL_FEE_MUTEZ + int(content["gas_limit"]) * MINIMAL_NANOTEZ_PER_GAS_UNIT / 1000
+                if not contents:
+                    fee += size * MINIMAL_NANOTEZ_PER_BYTE / 1000
+                contents.append(dict(content, fee=str(math.ceil(fee * (1 + self.fee_margin)))))
+            operation_group = self.with_contents(operation_group, contents)
+
+    def prepare(self, operation, **fill_kwargs):
+        """Returns the filled operation group with tuned limits and fees, ready to be signed. operation is an OperationGroup or a
+        ContractCall, fill_kwargs are passed to OperationGroup.fill (counter, ttl).
+        """
+        if hasattr(operation, "as_transaction"):
+            operation = operation.as_transaction()
+        operation_group = operation.fill(**fill_kwargs)
+        return self.with_fees(self.with_limits(operation_group, self.limits(operation_group)))
+
+    def send(self, operation, min_confirmations=0, **fill_kwargs):
+        """prepare, sign and inject, returns the signed operation group. If the node rejects the operation for exhausted limits the
+        cache entry is dropped and the operation simulated and sent again once.
+        """
+        operation_group = self.prepare(operation, **fill_kwargs).sign()
+        try:
+            operation_group.inject(min_confirmations=min_confirmations)
+        except RpcError as error:
+            if "exhausted" not in str(error):
+                raise
+            with self.lock:
+                self.cache.pop(self.key(operation_group), None)
+            operation_group = self.prepare(operation, **fill_kwargs).sign()
+            operation_group.inject(min_confirmations=min_confirmations)
+        return operation_group
@@ -0,0 +1,236 @@
+import calendar
+import hashlib
+import time
+
+# primitives in the order of their binary tag (michelson_v1_primitives of the protocol)
+PRIMITIVES = """parameter storage code False Elt Left None Pair Right Some True Unit PACK UNPACK BLAKE2B SHA256 SHA512 ABS ADD AMOUNT
+AND BALANCE CAR CDR CHECK_SIGNATURE COMPARE CONCAT CONS CREATE_ACCOUNT CREATE_CONTRACT IMPLICIT_ACCOUNT DIP DROP DUP EDIV EMPTY_MAP
+EMPTY_SET EQ EXEC FAILWITH GE GET GT HASH_KEY IF IF_CONS IF_LEFT IF_NONE INT LAMBDA LE LEFT LOOP LSL LSR LT MAP MEM MUL NEG NEQ NIL
+NONE NOT NOW OR PAIR PUSH RIGHT SIZE SOME SOURCE SENDER SELF STEPS_TO_QUOTA SUB SWAP TRANSFER_TOKENS SET_DELEGATE UNIT UPDATE XOR
+ITER LOOP_LEFT ADDRESS CONTRACT ISNAT CAST RENAME bool contract int key key_hash lambda list map big_map nat option or pair set
+signature string bytes mutez timestamp unit operation address SLICE DIG DUG EMPTY_BIG_MAP APPLY chain_id CHAIN_ID LEVEL SELF_ADDRESS
+never NEVER UNPAIR VOTING_POWER TOTAL_VOTING_POWER KECCAK SHA3 PAIRING_CHECK bls12_381_g1 bls12_381_g2 bls12_381_fr sapling_state
+sapling_transaction_deprecated SAPLING_EMPTY_STATE SAPLING_VERIFY_UPDATE ticket TICKET_DEPRECATED READ_TICKET SPLIT_TICKET
+JOIN_TICKETS GET_AND_UPDATE chest chest_key OPEN_CHEST VIEW view constant SUB_MUTEZ tx_rollup_l2_address MIN_BLOCK_TIME
+sapling_transaction EMIT Lambda_rec LAMBDA_REC TICKET BYTES NAT Ticket IS_IMPLICIT_ACCOUNT""".split()
+PRIMITIVE_TAGS = {primitive: tag for tag, primitive in enumerate(PRIMITIVES)}
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+# base58 prefix -> forged address tag, implicit accounts are tagged 0 followed by their curve
+ADDRESS_TAGS = {
+    "tz1": (bytes.fromhex("06a19f"), b"\x00\x00"),
+    "tz2": (bytes.fromhex("06a1a1"), b"\x00\x01"),
+    "tz3": (bytes.fromhex("06a1a4"), b"\x00\x02"),
+    "tz4": (bytes.fromhex("06a1a6"), b"\x00\x03"),
+    "KT1": (bytes.fromhex("025a79"), b"\x01"),
+}
+INTEGER_TYPES = ("int", "nat", "mutez", "timestamp")
+STRING_TYPES = ("string", "key", "signature", "chain_id")
+
+def _zarith(value):
+    """Micheline encoding of an integer: sign bit and 6 bits in the first byte, then 7 bits per byte little endian."""
+    encoded = bytearray([abs(value) & 0x3f | (0x40 if value < 0 else 0)])
+    value = abs(value) >> 6
+    while value:
+        encoded[-1] |= 0x80
+        encoded.append(value & 0x7f)
+        value >>= 7
+    return bytes(encoded)
+
+def _sized(data):
+    return len(data).to_bytes(4, "big") + data
+
+def forge(micheline):
+    """Binary encoding of a Micheline expression, the one the node counts in the operation size.
+    """
+    if isinstance(micheline, list):
+        return b"\x02" + _sized(b"".join(forge(item) for item in micheline))
+    if "int" in micheline:
+        return b"\x00" + _zarith(int(micheline["int"]))
+    if "string" in micheline:
+        return b"\x01" + _sized(micheline["string"].encode())
+    if "bytes" in micheline:
+        return b"\x0a" + _sized(bytes.fromhex(micheline["bytes"]))
+    arguments, annotations = micheline.get("args", []), " ".join(micheline.get("annots", []))
+    tag = bytes([PRIMITIVE_TAGS[micheline["prim"]]])
+    if len(arguments) > 2:
+        return b"\x09" + tag + _sized(b"".join(forge(argument) for argument in arguments)) + _sized(annotations.encode())
+    encoded = bytes([3 + 2 * len(arguments) + (1 if annotations else 0)]) + tag + b"".join(forge(argument) for argument in arguments)
+    return encoded + (_sized(annotations.encode()) if annotations else b"")
+
+def _base58_decode(encoded):
+    value = 0
+    for character in encoded:
+        value = value * 58 + BASE58_ALPHABET.index(character)
+    decoded = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    decoded = b"\x00" * (len(encoded) - len(encoded.lstrip("1"))) + decoded
+    payload, checksum = decoded[:-4], decoded[-4:]
+    if hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4] != checksum:
+        raise ValueError("invalid base58 checksum in '{}'".format(encoded))
+    return payload
+
+def _base58_encode(payload):
+    payload += hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
+    value, encoded = int.from_bytes(payload, "big"), ""
+    while value:
+        value, digit = divmod(value, 58)
+        encoded = BASE58_ALPHABET[digit] + encoded
+    return "1" * (len(payload) - len(payload.lstrip(b"\x00"))) + encoded
+
+def forge_address(address):
+    """22 bytes of an address in the optimized form, followed by its entrypoint if it has one.
+    """
+    address, _, entrypoint = address.partition("%")
+    prefix, tag = ADDRESS_TAGS[address[:3]]
+    payload = _base58_decode(address)
+    if not payload.startswith(prefix):
+        raise ValueError("invalid address '{}'".format(address))
+    forged = tag + payload[len(prefix):] + (b"" if tag[0] == 0 else b"\x00")
+    return forged + entrypoint.encode()
+
+def unforge_address(forged):
+    tag = forged[:2] if forged[0] == 0 else forged[:1]
+    prefix = next(prefix for prefix, address_tag in ADDRESS_TAGS.values() if address_tag == tag)
+    address = _base58_encode(prefix + forged[len(tag):len(tag)+20])
+    entrypoint = forged[22:].decode()
+    return address + ("%" + entrypoint if entrypoint else "")
+
+def _pair_arguments(value):
+    """Left and right of a Pair value, right combs written flattened (Pair a b c or a sequence) are nested again.
+    """
+    items = value if isinstance(value, list) else value["args"]
+    if len(items) > 2:
+        return items[0], {"prim": "Pair", "args": items[1:]}
+    return items[0], items[1]
+
+def _leaves(pair_type):
+    """Types of the fields of a record: the arguments of the pair tree, pairs without field annotation are flattened.
+    """
+    leaves = []
+    for argument in pair_type["args"]:
+        if argument["prim"] == "pair" and not _field(argument):
+            leaves += _leaves(argument)
+        else:
+            leaves.append(argument)
+    return leaves
+
+def _field(value_type):
+    return next((annotation[1:] for annotation in value_type.get("annots", []) if annotation.startswith("%")), None)
+
+def _pair_values(pair_type, value):
+    values = []
+    for argument, item in zip(pair_type["args"], _pair_arguments(value)):
+        if argument["prim"] == "pair" and not _field(argument):
+            values += _pair_values(argument, item)
+        else:
+            values.append(to_python(argument, item))
+    return values
+
+def to_python(value_type, value):
+    """Python value of a Micheline value, in the readable or the optimized form: ints for numbers, mutez and timestamps, str for
+    strings and addresses, bytes, a dict of field -> value for records whose fields are all annotated (a tuple otherwise), None
+    for None, set for sets and dict for maps and big_maps given as their Elt list.
+    """
+    prim = value_type["prim"]
+    if prim in INTEGER_TYPES:
+        if prim == "timestamp" and "string" in value:
+            return calendar.timegm(time.strptime(value["string"].split(".")[0].rstrip("Z"), "%Y-%m-%dT%H:%M:%S"))
+        return int(value["int"])
+    if prim in STRING_TYPES:
+        return value["string"]
+    if prim == "bytes":
+        return bytes.fromhex(value["bytes"])
+    if prim in ("address", "key_hash", "contract"):
+        if "string" in value:
+            return value["string"]
+        forged = bytes.fromhex(value["bytes"])
+        return unforge_address(forged if prim != "key_hash" else b"\x00" + forged)
+    if prim == "bool":
+        return value["prim"] == "True"
+    if prim == "unit":
+        return None
+    if prim == "option":
+        return None if value["prim"] == "None" else to_python(value_type["args"][0], value["args"][0])
+    if prim == "pair":
+        values = _pair_values(value_type, value)
+        names = [_field(leaf) for leaf in _leaves(value_type)]
+        return dict(zip(names, values)) if all(names) else tuple(values)
+    if prim == "list":
+        return [to_python(value_type["args"][0], item) for item in value]
+    if prim == "set":
+        return {to_python(value_type["args"][0], item) for item in value}
+    if prim in ("map", "big_map"):
+        if not isinstance(value, list):
+            raise ValueError("{} has to be given as its Elt list, not {}".format(prim, value))
+        key_type, item_type = value_type["args"]
+        return {to_python(key_type, item["args"][0]): to_python(item_type, item["args"][1]) for item in value}
+    if prim == "lambda":
+        return value
+    raise ValueError("unsupported type {}".format(prim))
+
+def _sort_key(value_type, value):
+    """Python value ordered like the Michelson comparison of its type.
+    """
+    prim = value_type["prim"]
+    if prim in ("address", "key_hash"):
+        return forge_address(value)
+    if prim == "option":
+        return (0,) if value is None else (1, _sort_key(value_type["args"][0], value))
+    if prim == "pair":
+        values = [value[_field(leaf)] for leaf in _leaves(value_type)] if isinstance(value, dict) else list(value)
+        return tuple(_sort_key(leaf, item) for leaf, item in zip(_leaves(value_type), values))
+    return value
+
+def _build_pair(pair_type, values):
+    """Optimized form of a pair: its right comb is written as a sequence from 4 elements on, like the node does.
+    """
+    comb, node = [], pair_type
+    while True:
+        left, right = node["args"]
+        comb.append(_build_pair(left, values) if left["prim"] == "pair" and not _field(left) else to_micheline(left, values.pop(0)))
+        if right["prim"] != "pair" or _field(right):
+            comb.append(to_micheline(right, values.pop(0)))
+            break
+        node = right
+    if len(comb) >= 4:
+        return comb
+    if len(comb) == 3:
+        return {"prim": "Pair", "args": [comb[0], {"prim": "Pair", "args": comb[1:]}]}
+    return {"prim": "Pair", "args": comb}
+
+def to_micheline(value_type, value):
+    """Micheline of a python value (see to_python) in the optimized form: addresses as bytes, timestamps as ints, pairs nested,
+    sets and maps sorted by key.
+    """
+    prim = value_type["prim"]
+    if prim in INTEGER_TYPES:
+        return {"int": str(value)}
+    if prim in STRING_TYPES:
+        return {"string": value}
+    if prim == "bytes":
+        return {"bytes": bytes(value).hex()}
+    if prim in ("address", "contract"):
+        return {"bytes": forge_address(value).hex()}
+    if prim == "key_hash":
+        return {"bytes": forge_address(value)[1:].hex()}
+    if prim == "bool":
+        return {"prim": "True" if value else "False"}
+    if prim == "unit":
+        return {"prim": "Unit"}
+    if prim == "option":
+        return {"prim": "None"} if value is None else {"prim": "Some", "args": [to_micheline(value_type["args"][0], value)]}
+    if prim == "pair":
+        values = [value[_field(leaf)] for leaf in _leaves(value_type)] if isinstance(value, dict) else list(value)
+        return _build_pair(value_type, values)
+    if prim == "list":
+        return [to_micheline(value_type["args"][0], item) for item in value]
+    if prim == "set":
+        item_type = value_type["args"][0]
+        return [to_micheline(item_type, item) for item in sorted(value, key=lambda item: _sort_key(item_type, item))]
+    if prim in ("map", "big_map"):
+        key_type, item_type = value_type["args"]
+        return [{"prim": "Elt", "args": [to_micheline(key_type, key), to_micheline(item_type, item)]}
+            for key, item in sorted(value.items(), key=lambda entry: _sort_key(key_type, entry[0]))]
+    if prim == "lambda":
+        return value
+    raise ValueError("unsupported type {}".format(prim))
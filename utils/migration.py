@@ -0,0 +1,244 @@
+import oracles.constants as Constants
+from utils.micheline import forge, to_python, to_micheline
+from utils.reader import storage_fields
+from utils.slots import default_slot
+
+MAX_OPERATION_DATA_LENGTH = 32768
+ORIGINATION_OVERHEAD = 1024 # branch, manager fields, signature, length prefixes and the fields left to their initial value
+BATCH_SIZE = 50
+
+def storage_section(code):
+    """Storage type of a Micheline script (list of parameter, storage and code sections).
+    """
+    return next(section for section in code if section["prim"] == "storage")["args"][0]
+
+def field_types(storage_type, found=None):
+    """Returns field annotation -> type of the leaves of the storage record, the annotated nodes of its pair tree.
+    """
+    found = {} if found is None else found
+    names = [annotation[1:] for annotation in storage_type.get("annots", []) if annotation.startswith("%")]
+    if names:
+        found[names[0]] = storage_type
+    elif storage_type.get("prim") == "pair":
+        for argument in storage_type["args"]:
+            field_types(argument, found)
+    return found
+
+def strip_annotations(micheline):
+    if isinstance(micheline, list):
+        return [strip_annotations(item) for item in micheline]
+    if isinstance(micheline, dict):
+        return {key: strip_annotations(value) for key, value in micheline.items() if key != "annots"}
+    return micheline
+
+def canonical(value_type, value):
+    """Micheline of a python value, sorted and in the optimized form, so two values can be compared whatever form they were read in.
+    """
+    return to_micheline(value_type, value)
+
+def size(value_type, value):
+    """Forged size in bytes of a python value.
+    """
+    return len(forge(canonical(value_type, value)))
+
+def snapshot(rpc, tzkt, contract, level=None):
+    """Reads the storage of contract at level (head if None). Big_map ids are replaced by the Elt list of all keys active at that
+    level, read in bulk from the indexer. Returns a json serializable dict with the raw Micheline of every field.
+    """
+    level = level if level is not None else rpc.header()["level"]
+    script = rpc.contract_script(contract, block=level)
+    storage_type = storage_section(script["code"])
+    types = field_types(storage_type)
+    values = storage_fields(storage_type, script["storage"], set(types))
+    fields = {}
+    for name, field_type in types.items():
+        value = values[name]
+        if field_type["prim"] == "big_map":
+            value = [{"prim": "Elt", "args": [key, item]} for key, item in tzkt.bigmap_keys(int(value["int"]), level)]
+        fields[name] = value
+    return {"contract": contract, "level": level, "storage_type": storage_type, "fields": fields}
+
+def replay_jobs(executor, jobs):
+    """JobScheduler.jobs entry as publish calls. Replayed jobs start unacknowledged and unpaid, the executors ack them again.
+    """
+    calls = [("publish", dict({field: value for field, value in job.items() if field not in ("status", "last_paid_epoch")}, executor=executor, script=script))
+        for script, job in sorted(jobs.items())]
+    return calls, {script: dict(job, status=0, last_paid_epoch=-1) for script, job in jobs.items()}
+
+def upgrade_jobs(jobs):
+    """JobScheduler.jobs of a scheduler without staggered slots or per epoch fees, every job gets the default slot (always a
+    primary) and is unpaid in its current epoch.
+    """
+    return {executor: {script: dict(job, slot=job.get("slot", default_slot()), last_paid_epoch=job.get("last_paid_epoch", -1))
+        for script, job in scripts.items()} for executor, scripts in jobs.items()}
+
+def derive_expiries(storage):
+    """Rebuilds the JobScheduler expiries index of the jobs (dropped again by plan if the new scheduler has no index).
+    """
+    if "jobs" not in storage:
+        return
+    expiries = {}
+    for executor, jobs in storage["jobs"].items():
+        for script, job in jobs.items():
+            expiries.setdefault(job["end"] // Constants.ORACLE_EPOCH_INTERVAL, set()).add((executor, script))
+    storage["expiries"] = expiries
+
+class Migration:
+    """How the fields of a snapshot become the storage of the new contract.
+
+    Fields of the new storage type found with the same type in the snapshot are carried over, the others keep the new contract's
+    initial value. The entries of the big_map fields in replays are inlined in the origination while it stays below the operation
+    size limit, replays[field](key, value) returns the admin calls (entrypoint, parameter) recreating an entry that did not fit and
+    the value the entry has once they are applied. derive(storage) recomputes the fields depending on others (i.e. indexes).
+    upgrades[field](value) converts the python value of a field whose type changed to the new type. admin are the administrator
+    fields, the replays have to be signed by that account. settled are the nat fields accounting for tez the old contract holds
+    (i.e. the JobScheduler owed_fees), the balance is not migrated so they have to be 0 in the snapshot.
+    """
+    def __init__(self, admin, replays=None, derive=None, upgrades=None, settled=()):
+        self.admin = admin
+        self.replays = replays or {}
+        self.derive = derive or (lambda storage: None)
+        self.upgrades = upgrades or {}
+        self.settled = settled
+
+    def derived(self, storage, types):
+        self.derive(storage)
+        for name in set(storage) - set(types):
+            del storage[name]
+
+MIGRATIONS = {
+    "scheduler": Migration(("admin", "proposed_admin"), replays={"jobs": replay_jobs}, derive=derive_expiries,
+        upgrades={"jobs": upgrade_jobs}, settled=("owed_fees",)),
+    "oracle": Migration(("administrator",)),
+}
+
+def plan(snapshot, migration, code, administrator=None):
+    """Plans the migration of a snapshot to the compiled code (Micheline) of the new contract. administrator replaces the admin
+    fields of the snapshot, i.e. to rehearse on a sandbox.
+
+    Returns:
+        tuple: storage fields of the origination (python values for Step), replays (entrypoint, parameter) and the fields the new
+        contract is expected to have once the replays are applied
+    """
+    types = field_types(storage_section(code))
+    old_types = field_types(snapshot["storage_type"])
+    for name in migration.settled:
+        if name in old_types and to_python(old_types[name], snapshot["fields"][name]) != 0:
+            raise ValueError("{} is {} at level {}: the old contract keeps its balance, settle it there first (i.e. claim the fees of "
+                "every executor, the admin can claim on their behalf) and take a new snapshot".format(name,
+                to_python(old_types[name], snapshot["fields"][name]), snapshot["level"]))
+    carried = {}
+    for name, field_type in types.items():
+        if name not in old_types:
+            continue
+        if strip_annotations(old_types[name]) == strip_annotations(field_type):
+            carried[name] = to_python(field_type, snapshot["fields"][name])
+        elif name in migration.upgrades:
+            carried[name] = migration.upgrades[name](to_python(old_types[name], snapshot["fields"][name]))
+    if administrator is not None:
+        for name in migration.admin:
+            if name in types:
+                carried[name] = administrator
+
+    storage, expected = dict(carried), dict(carried)
+    limit = MAX_OPERATION_DATA_LENGTH - ORIGINATION_OVERHEAD - len(forge(code))
+    used = sum(size(types[name], value) for name, value in carried.items() if name not in migration.replays)
+    pending = {}
+    for name in migration.replays:
+        if name not in carried:
+            continue
+        key_type, value_type = types[name]["args"]
+        storage[name], expected[name], pending[name] = {}, dict(carried[name]), []
+        for key, value in sorted(carried[name].items()):
+            entry_size = size(key_type, key) + size(value_type, value) + 2
+            if used + entry_size <= limit:
+                storage[name][key] = value
+                used += entry_size
+            else:
+                pending[name].append((key, value))
+    migration.derived(storage, types)
+    # derived fields grow with the inlined entries, move entries to the replays until the whole storage fits again
+    while sum(size(types[name], value) for name, value in storage.items()) > limit:
+        name = next((name for name in pending if storage[name]), None)
+        if name is None:
+            raise ValueError("the fields without replays do not fit in an origination ({} bytes available)".format(limit))
+        moved = sorted(storage[name].items())[-max(1, len(storage[name]) // 10):]
+        for key, value in moved:
+            del storage[name][key]
+        pending[name] = moved + pending[name]
+        migration.derived(storage, types)
+
+    replays = []
+    for name, entries in pending.items():
+        for key, value in entries:
+            calls, expected[name][key] = migration.replays[name](key, value)
+            replays += calls
+    migration.derived(expected, types)
+    return storage, replays, expected
+
+class Migrator:
+    """Sends the replays of a migration in batches after the origination done by the Deployer. Every batch is recorded in the
+    deployment checkpoint like an origination, a rerun skips the batches that are done and waits for pending ones.
+    """
+    def __init__(self, deployer, batch_size=BATCH_SIZE):
+        self.deployer = deployer
+        self.batch_size = batch_size
+
+    def reconcile(self, name):
+        from pytezos.operation.result import OperationResult
+        from utils.deployment_utils import DONE, FAILED, EXPIRED
+        state = self.deployer.checkpoint.steps[name]
+        operation_group = self.deployer.wait_included(state["operation_hash"], state["level"], state["expires_at"])
+        if operation_group is None:
+            status = EXPIRED
+        elif not OperationResult.is_applied(operation_group):
+            status = FAILED
+        else:
+            status = DONE
+        self.deployer.checkpoint.record(name, status=status)
+        return self.deployer.checkpoint.steps[name]
+
+    def replay(self, name, address, replays):
+        """Sends the (entrypoint, parameter) calls to address, returns the number of batches sent by this run.
+        """
+        from utils.deployment_utils import PENDING, DONE
+        client, checkpoint = self.deployer.client, self.deployer.checkpoint
+        contract = client.contract(address)
+        sent = 0
+        for start in range(0, len(replays), self.batch_size):
+            batch_name = "{}:replay:{}".format(name, start // self.batch_size)
+            state = checkpoint.steps.get(batch_name, {})
+            if state.get("status") == PENDING:
+                state = self.reconcile(batch_name)
+            if state.get("status") == DONE:
+                continue
+            calls = [getattr(contract, entrypoint)(parameter) for entrypoint, parameter in replays[start:start+self.batch_size]]
+            operation_group = self.deployer.tuner.prepare(client.bulk(*calls), ttl=self.deployer.ttl).sign()
+            level = self.deployer.head_level()
+            checkpoint.record(batch_name, status=PENDING, operation_hash=operation_group.hash(), level=level,
+                expires_at=level+self.deployer.ttl)
+            operation_group.inject()
+            state = self.reconcile(batch_name)
+            if state["status"] != DONE:
+                raise RuntimeError("replay batch {} {}: '{}'".format(batch_name, state["status"], state["operation_hash"]))
+            sent += 1
+        return sent
+
+def verify(client, address, storage_type, expected):
+    """Compares the storage of the migrated contract with the expected fields, big_maps key by key (keys that should not exist
+    are not detected, the node cannot list a big_map). Returns the mismatching (field, key) pairs, key is None for other fields.
+    """
+    contract = client.contract(address)
+    current = contract.storage()
+    types = field_types(storage_type)
+    mismatches = []
+    for name, value in sorted(expected.items()):
+        field_type = types[name]
+        if field_type["prim"] == "big_map":
+            value_type = field_type["args"][1]
+            for key, item in value.items():
+                if canonical(value_type, contract.storage[name][key]()) != canonical(value_type, item):
+                    mismatches.append((name, key))
+        elif canonical(field_type, current[name]) != canonical(field_type, value):
+            mismatches.append((name, None))
+    return mismatches
@@ -0,0 +1,109 @@
+import oracles.constants as Constants
+
+PACK_PREFIX = b"\x05"
+PAIR_TAG = b"\x07\x07"
+INT_TAG = b"\x00"
+
+def _zarith(value):
+    """Micheline encoding of a (non negative) integer: sign bit in the first byte, 7 bits per byte little endian."""
+    if value < 0:
+        raise ValueError("only nats are supported")
+    encoded = bytearray([value & 0x3f])
+    value >>= 6
+    while value:
+        encoded[-1] |= 0x80
+        encoded.append(value & 0x7f)
+        value >>= 7
+    return bytes(encoded)
+
+def _unzarith(data, offset):
+    first = data[offset]
+    if first & 0x40:
+        raise ValueError("negative value in a nat field")
+    value, shift = first & 0x3f, 6
+    offset += 1
+    while data[offset-1] & 0x80:
+        value |= (data[offset] & 0x7f) << shift
+        shift += 7
+        offset += 1
+    return value, offset
+
+def pack_response(timestamp, defi_price, xtz_price, btc_price):
+    """Same bytes as sp.pack(Response.make(timestamp, defi_price, xtz_price, btc_price)), i.e. the "packed" payload format.
+    """
+    encoded = PACK_PREFIX
+    for value in (timestamp, defi_price, xtz_price):
+        encoded += PAIR_TAG + INT_TAG + _zarith(value)
+    return encoded + INT_TAG + _zarith(btc_price)
+
+def unpack_response(payload):
+    """Decodes a "packed" payload into (timestamp, defi_price, xtz_price, btc_price).
+    """
+    if payload[:1] != PACK_PREFIX:
+        raise ValueError("not a packed value")
+    offset, values = 1, []
+    for index in range(4):
+        if index < 3:
+            if payload[offset:offset+2] != PAIR_TAG:
+                raise ValueError("not a Response record")
+            offset += 2
+        if payload[offset:offset+1] != INT_TAG:
+            raise ValueError("not a Response record")
+        value, offset = _unzarith(payload, offset+1)
+        values.append(value)
+    if offset != len(payload):
+        raise ValueError("trailing bytes after the Response record")
+    return tuple(values)
+
+def encode_fixed(timestamp, defi_price, xtz_price, btc_price):
+    """Encodes the "fixed" payload format decoded by PriceOracle(payload_format="fixed"): the version byte, the timestamp as big
+    endian unsigned integer of Constants.FIXED_PAYLOAD_TIMESTAMP_BYTES and the three prices of Constants.FIXED_PAYLOAD_PRICE_BYTES
+    each.
+    """
+    encoded = bytes([Constants.FIXED_PAYLOAD_VERSION]) + timestamp.to_bytes(Constants.FIXED_PAYLOAD_TIMESTAMP_BYTES, "big")
+    for price in (defi_price, xtz_price, btc_price):
+        encoded += price.to_bytes(Constants.FIXED_PAYLOAD_PRICE_BYTES, "big")
+    return encoded
+
+def decode_fixed(payload):
+    """Decodes a "fixed" payload into (timestamp, defi_price, xtz_price, btc_price).
+    """
+    if len(payload) != Constants.FIXED_PAYLOAD_LENGTH or payload[0] != Constants.FIXED_PAYLOAD_VERSION:
+        raise ValueError("not a version {} fixed payload".format(Constants.FIXED_PAYLOAD_VERSION))
+    offset = 1 + Constants.FIXED_PAYLOAD_TIMESTAMP_BYTES
+    values = [int.from_bytes(payload[1:offset], "big")]
+    for _ in range(3):
+        values.append(int.from_bytes(payload[offset:offset+Constants.FIXED_PAYLOAD_PRICE_BYTES], "big"))
+        offset += Constants.FIXED_PAYLOAD_PRICE_BYTES
+    return tuple(values)
+
+def encode(payload_format, timestamp, defi_price, xtz_price, btc_price):
+    """Encodes a response in the payload format the oracle was compiled with ("packed" or "fixed").
+    """
+    if payload_format == "fixed":
+        return encode_fixed(timestamp, defi_price, xtz_price, btc_price)
+    return pack_response(timestamp, defi_price, xtz_price, btc_price)
+
+def decode(payload):
+    """Decodes either payload format.
+    """
+    if payload[:1] == PACK_PREFIX:
+        return unpack_response(payload)
+    return decode_fixed(payload)
+
+def benchmark():
+    """Prints the payload sizes of both formats for typical responses. Every byte less is one byte less in the fulfill operation
+    (the payload is a bytes field, its 4 byte length prefix is the same for both formats).
+    """
+    responses = [
+        ("test scenario", (18000, 3500000, 3500000, 38415000000)),
+        ("2022 prices", (1650000000, 2100000, 2950000, 40000000000)),
+        ("large prices", (1650000000, 900000000000, 900000000000, 250000000000000)),
+    ]
+    print("{:<16} {:>7} {:>6} {:>6}".format("response", "packed", "fixed", "saved"))
+    for name, values in responses:
+        packed, fixed = len(pack_response(*values)), len(encode_fixed(*values))
+        print("{:<16} {:>7} {:>6} {:>6}".format(name, packed, fixed, packed-fixed))
+
+if __name__ == '__main__':
+    benchmark()
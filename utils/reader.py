@@ -0,0 +1,158 @@
+import time
+
+import oracles.constants as Constants
+import oracles.errors as Errors
+from utils.rpc import RpcError
+
+class OracleError(Exception):
+    """Raised when the oracle view would fail, code is the oracles/errors.py code (i.e. Errors.PRICE_TOO_OLD).
+    """
+    def __init__(self, code, message):
+        Exception.__init__(self, "{} ({})".format(message, code))
+        self.code = code
+
+def storage_fields(storage_type, value, names, found=None):
+    """Returns the fields of names (field annotations of the storage type) from a Micheline storage value. Handles the right combs
+    the node writes flattened (Pair a b c or sequences) in both the type and the value.
+    """
+    found = {} if found is None else found
+    for annotation in storage_type.get("annots", []):
+        if annotation.startswith("%") and annotation[1:] in names:
+            found[annotation[1:]] = value
+    if storage_type.get("prim") == "pair":
+        arguments = storage_type["args"]
+        items = list(value) if isinstance(value, list) else list(value["args"])
+        while len(items) < len(arguments) and isinstance(items[-1], (dict, list)) and (isinstance(items[-1], list) or items[-1].get("prim") == "Pair"):
+            last = items.pop()
+            items.extend(last if isinstance(last, list) else last["args"])
+        if len(items) > len(arguments):
+            items = items[:len(arguments)-1] + [{"prim": "Pair", "args": items[len(arguments)-1:]}]
+        for argument_type, item in zip(arguments, items):
+            storage_fields(argument_type, item, names, found)
+    return found
+
+def batch_script(requests):
+    """Micheline script calling the onchain view of every (contract, view, argument) request and storing the nat results, so that
+    all of them are read with a single run_code call.
+    """
+    code = [{"prim": "DROP"}, {"prim": "NIL", "args": [{"prim": "nat"}]}]
+    for contract, view, argument in requests:
+        code.append({"prim": "PUSH", "args": [{"prim": "address"}, {"string": contract}]})
+        if argument is None:
+            code.append({"prim": "UNIT"})
+        elif isinstance(argument, int):
+            code.append({"prim": "PUSH", "args": [{"prim": "nat"}, {"int": str(argument)}]})
+        else:
+            code.append({"prim": "PUSH", "args": [{"prim": "string"}, {"string": argument}]})
+        code.append({"prim": "VIEW", "args": [{"string": view}, {"prim": "nat"}]})
+        code.append({"prim": "IF_NONE", "args": [[{"prim": "PUSH", "args": [{"prim": "string"}, {"string": "{}%{}".format(contract, view)}]}, {"prim": "FAILWITH"}], []]})
+        code.append({"prim": "CONS"})
+    code += [{"prim": "NIL", "args": [{"prim": "operation"}]}, {"prim": "PAIR"}]
+    return [
+        {"prim": "parameter", "args": [{"prim": "unit"}]},
+        {"prim": "storage", "args": [{"prim": "list", "args": [{"prim": "nat"}]}]},
+        {"prim": "code", "args": [code]}
+    ]
+
+class OracleReader:
+    """Read client of a PriceOracle (and of RelativeProxyOracles pointing to it) for off-chain consumers.
+
+    Prices only change when the oracle finalizes an epoch, which also sets last_epoch. The reader keeps the last_epoch and
+    validity_window_in_epochs of the oracle storage and caches every view result until last_epoch changes:
+    - once the current epoch is finalized nothing can change before the next epoch boundary, reads are served without any RPC,
+    - otherwise the storage is polled at most every poll_interval seconds (about a block) to notice the finalization.
+    The staleness check of the views (Errors.PRICE_TOO_OLD) and the zero check (Errors.CANNOT_BE_ZERO) are done locally. View results
+    missing from the cache are fetched in one run_code round trip.
+    """
+    def __init__(self, rpc, oracle, epoch_interval=Constants.ORACLE_EPOCH_INTERVAL, poll_interval=10, clock=time.time):
+        self.rpc = rpc
+        self.oracle = oracle
+        self.epoch_interval = epoch_interval
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.storage_type = None
+        self.last_epoch = None
+        self.validity_window_in_epochs = None
+        self.polled_at = None
+        self.cache = {}
+
+    def current_epoch(self):
+        return int(self.clock()) // self.epoch_interval
+
+    def refresh(self):
+        """Reloads last_epoch and the validity window from the oracle storage unless nothing can have changed since the last load.
+        """
+        now = self.clock()
+        if self.last_epoch == self.current_epoch():
+            return
+        if self.polled_at is not None and now - self.polled_at < self.poll_interval:
+            return
+        if self.storage_type is None:
+            script = self.rpc.contract_script(self.oracle)
+            self.storage_type = next(section for section in script["code"] if section["prim"] == "storage")["args"][0]
+            storage = script["storage"]
+        else:
+            storage = self.rpc.contract_storage(self.oracle)
+        fields = storage_fields(self.storage_type, storage, ("last_epoch", "validity_window_in_epochs"))
+        last_epoch = int(fields["last_epoch"]["int"])
+        if last_epoch != self.last_epoch:
+            self.cache.clear()
+        self.last_epoch = last_epoch
+        self.validity_window_in_epochs = int(fields["validity_window_in_epochs"]["int"])
+        self.polled_at = now
+
+    def check_validity(self):
+        """Same check as PriceOracle.read_price, the sp.as_nat fails as well if the window reaches before epoch 0.
+        """
+        earliest = self.current_epoch() - self.validity_window_in_epochs
+        if earliest < 0 or self.last_epoch <= earliest:
+            raise OracleError(Errors.PRICE_TOO_OLD, "last epoch {} is outside the validity window".format(self.last_epoch))
+
+    def read(self, requests):
+        """Returns the nat results of the (contract, view, argument) requests, from the cache or with one round trip.
+        """
+        self.refresh()
+        self.check_validity()
+        missing = [request for request in dict.fromkeys(requests) if request not in self.cache]
+        if missing:
+            try:
+                results = self.rpc.run_code(batch_script(missing), [])
+                for request, result in zip(missing, reversed(results)):
+                    self.cache[request] = int(result["int"])
+            except RpcError:
+                # one failing view fails the whole batch, read them one by one to only fail the broken ones
+                for request in missing:
+                    self.cache[request] = self.read_one(request)
+        values = [self.cache[request] for request in requests]
+        for request, value in zip(requests, values):
+            if isinstance(value, OracleError):
+                raise value
+            if value == 0:
+                raise OracleError(Errors.CANNOT_BE_ZERO, "{} returned 0".format(request))
+        return values
+
+    def read_one(self, request):
+        contract, view, argument = request
+        if argument is None:
+            micheline = None
+        elif isinstance(argument, int):
+            micheline = {"int": str(argument)}
+        else:
+            micheline = {"string": argument}
+        try:
+            return int(self.rpc.run_view(contract, view, micheline)["int"])
+        except RpcError as error:
+            return OracleError(error.failwith(), "{}%{} failed".format(contract, view))
+
+    def get_prices(self, symbols, view="get_price"):
+        """Returns symbol -> price. Use view="get_price_by_id" with nat symbol ids for a CompactPriceOracle.
+        """
+        return dict(zip(symbols, self.read([(self.oracle, view, symbol) for symbol in symbols])))
+
+    def get_price(self, symbol, view="get_price"):
+        return self.get_prices([symbol], view)[symbol]
+
+    def get_relative_price(self, proxy):
+        """Price of a RelativeProxyOracle reading this oracle (its view_price).
+        """
+        return self.read([(proxy, "view_price", None)])[0]
@@ -0,0 +1,100 @@
+import json
+import urllib.error
+import urllib.request
+
+class RpcError(Exception):
+    """Error response of the node, errors is the decoded error list (i.e. script_rejected with the failwith value in "with").
+    """
+    def __init__(self, path, errors):
+        Exception.__init__(self, "{}: {}".format(path, errors))
+        self.errors = errors
+
+    def failwith(self):
+        """Returns the int the script failed with (see oracles/errors.py), None if it did not fail with an int.
+        """
+        for error in self.errors if isinstance(self.errors, list) else []:
+            if "int" in error.get("with", {}):
+                return int(error["with"]["int"])
+        return None
+
+class Rpc:
+    """Minimal json client of the node RPC on top of urllib, used by the read commands which should not pay for importing pytezos.
+    """
+    def __init__(self, endpoint, timeout=10):
+        self.endpoint = endpoint.rstrip("/")
+        self.timeout = timeout
+        self._chain_id = None
+
+    def request(self, path, body=None):
+        data = None if body is None else json.dumps(body).encode()
+        request = urllib.request.Request(self.endpoint + path, data=data, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as error:
+            body = error.read()
+            try:
+                errors = json.loads(body)
+            except ValueError:
+                errors = body.decode(errors="replace")
+            raise RpcError(path, errors)
+
+    def chain_id(self):
+        if self._chain_id is None:
+            self._chain_id = self.request("/chains/main/chain_id")
+        return self._chain_id
+
+    def header(self, block="head"):
+        return self.request("/chains/main/blocks/{}/header".format(block))
+
+    def block(self, block="head"):
+        """Full block with the operations and their results.
+        """
+        return self.request("/chains/main/blocks/{}".format(block))
+
+    def run_view(self, contract, view, argument=None, block="head"):
+        """Runs the onchain view of contract with the Micheline argument (unit if None) and returns the Micheline result.
+        """
+        return self.request("/chains/main/blocks/{}/helpers/scripts/run_script_view".format(block), {
+            "contract": contract,
+            "view": view,
+            "input": argument if argument is not None else {"prim": "Unit"},
+            "chain_id": self.chain_id(),
+            "unparsing_mode": "Readable"
+        })["data"]
+
+    def run_code(self, script, storage, argument=None, block="head"):
+        """Runs a Micheline script (list of parameter, storage and code) on storage and returns the resulting storage.
+        """
+        return self.request("/chains/main/blocks/{}/helpers/scripts/run_code".format(block), {
+            "script": script,
+            "storage": storage,
+            "input": argument if argument is not None else {"prim": "Unit"},
+            "amount": "0",
+            "balance": "0",
+            "chain_id": self.chain_id(),
+            "unparsing_mode": "Readable"
+        })["storage"]
+
+    def contract_script(self, contract, block="head"):
+        return self.request("/chains/main/blocks/{}/context/contracts/{}/script".format(block, contract))
+
+    def contract_storage(self, contract, block="head"):
+        return self.request("/chains/main/blocks/{}/context/contracts/{}/storage".format(block, contract))
+
+class Tzkt(Rpc):
+    """Minimal client of the TzKT indexer API. The node RPC only returns big_map values by key hash, whole big_maps are read from
+    the indexer instead.
+    """
+    def bigmap_keys(self, ptr, level, limit=10000):
+        """Yields the (key, value) Micheline of the keys of big_map ptr that were active at level, limit keys per request.
+        """
+        offset = 0
+        while True:
+            keys = self.request("/v1/bigmaps/{}/historical_keys/{}?micheline=2&sort.asc=id&limit={}&offset={}".format(ptr, level, limit, offset))
+            for key in keys:
+                if key["active"]:
+                    yield key["key"], key["value"]
+            if len(keys) < limit:
+                return
+            offset += limit
@@ -0,0 +1,78 @@
+import oracles.constants as Constants
+from utils.trigger import epoch_of
+
+def default_slot():
+    """Slot of a job published without staggering, the executor is always a primary.
+    """
+    return {"rank": 0, "group_size": 1, "primaries": 1, "spacing": 0}
+
+def assign(executors, primaries, spacing):
+    """Slots of a group of executors serving the same feed, in rank order. Publish primaries as the oracle's response_threshold so
+    that an epoch without failures gets exactly that many fulfills.
+
+    Returns:
+        dict: executor -> slot of the publish parameter
+    """
+    return {executor: {"rank": rank, "group_size": len(executors), "primaries": primaries, "spacing": spacing}
+        for rank, executor in enumerate(executors)}
+
+def job_epoch(job, timestamp):
+    """Epoch of the job a unix timestamp falls into, the same way JobScheduler.job_epoch computes it.
+    """
+    if timestamp <= job["start"]:
+        return 0
+    return (timestamp - job["start"]) // max(job["interval"], 1)
+
+def position(slot, epoch):
+    """Position of the executor in epoch, positions below primaries are the primaries.
+    """
+    return (slot["rank"] + epoch) % slot["group_size"]
+
+def slot_offset(slot, epoch):
+    """Seconds after the start of epoch the executor is due, 0 for the primaries.
+    """
+    return (max(position(slot, epoch) + 1, slot["primaries"]) - slot["primaries"]) * slot["spacing"]
+
+def slot_time(job, epoch):
+    """Unix time the executor of job is due in epoch, the same way JobScheduler.epoch_slot computes it.
+    """
+    return job["start"] + epoch * max(job["interval"], 1) + slot_offset(job["slot"], epoch)
+
+def should_submit(job, last_epoch, now, epoch_interval=Constants.ORACLE_EPOCH_INTERVAL):
+    """Executor side check of a staggered job (JobScheduler storage or get_jobs view, timestamps as unix time). Primaries submit
+    as soon as the epoch starts, backups wait for their slot and then only submit if the oracle did not finalize the epoch yet. A
+    backup therefore only adds a fulfill when a primary failed, the epoch still finalizes as long as response_threshold executors
+    are up. JobScheduler.fulfill does not pay a backup once the epoch is finalized, so skipping it costs the executor nothing.
+    Combine it with utils.trigger.should_submit in the deviation triggered mode.
+
+    Args:
+        job (dict): the executor's job with start, interval and slot
+        last_epoch (int): the oracle's last_epoch, read right before submitting
+        now (int): current unix timestamp
+        epoch_interval (int): epoch interval the oracle was compiled with
+
+    Returns:
+        bool: True if the executor's slot of the current epoch started and the epoch of now was not finalized yet
+    """
+    if epoch_of(now, epoch_interval) <= last_epoch:
+        return False
+    return now >= slot_time(job, job_epoch(job, now))
+
+def submitting(slots, online, epoch):
+    """Ranks submitting in epoch if only the online ranks are up and the epoch finalizes with the primaries' count of fulfills:
+    the online primaries, then backups in slot order until the count is reached.
+
+    Args:
+        slots (list): slot of every rank of the group
+        online (set): ranks that are up
+        epoch (int): epoch of the job
+
+    Returns:
+        list: submitting ranks in the order of their slots
+    """
+    ordered = sorted(range(len(slots)), key=lambda rank: position(slots[rank], epoch))
+    submitted = []
+    for rank in ordered:
+        if rank in online and len(submitted) < slots[rank]["primaries"]:
+            submitted.append(rank)
+    return submitted
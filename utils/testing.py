@@ -0,0 +1,72 @@
+import os
+import types
+import smartpy as sp
+
+TEST_CASE_VARIABLE = "ORACLES_TEST_CASE"
+
+VALID_SCRIPT = "0x697066733a2f2f516d50367043416a5337525948383768573366454a754631524b6f75486a7a55674c5035694e61323853636b5533"
+VALID_EXECUTORS = [
+    "tz3S9uYxmGahffYfcYURijrCGm1VBqiH4mPe",
+    "tz3YzXZtqPHuFyX7zxGpkxjAtoA1gnYQkEnL",
+    "tz3Qg4gvJDj8f4hy3ewvb3wyxEXYXRYbZ6Mz"
+]
+
+_registered = set()
+
+def add_test(name, **kwargs):
+    """Drop-in for sp.add_test used by all scenarios. If the ORACLES_TEST_CASE environment variable is set (see test_runner.py)
+    only the case with that name is registered, so a single case can run in its own SmartPy process. A case is registered once
+    even if its module gets imported by another test module.
+    """
+    def register(test):
+        selected = os.environ.get(TEST_CASE_VARIABLE)
+        if name in _registered or (selected is not None and selected != name):
+            return test
+        _registered.add(name)
+        return sp.add_test(name=name, **kwargs)(test)
+    return register
+
+def bootstrap_jobs(scenario, make_contract, executors=VALID_EXECUTORS, interval=900, **scheduler_kwargs):
+    """Fixture originating a JobScheduler and the contract returned by make_contract(administrator_address), then publishing one
+    job per executor pointing to that contract, acknowledged by the executor. With compact_scripts in scheduler_kwargs a CompactJobScheduler is originated, the
+    script is registered and the fixture's script is its id.
+
+    Returns:
+        types.SimpleNamespace: administrator, scheduler, contract, script and executors
+    """
+    from oracles.job_scheduler import JobScheduler, CompactJobScheduler, Job
+    administrator = sp.test_account("Administrator")
+
+    compact_scripts = scheduler_kwargs.pop("compact_scripts", False)
+    scheduler = (CompactJobScheduler if compact_scripts else JobScheduler)(administrator.address, **scheduler_kwargs)
+    scenario += scheduler
+
+    contract = make_contract(administrator.address)
+    scenario += contract
+
+    script = sp.bytes(VALID_SCRIPT)
+    if compact_scripts:
+        scenario += scheduler.register_script(script).run(sender=administrator.address)
+        script = sp.nat(0)
+    executors = [sp.address(executor) for executor in executors]
+    for executor in executors:
+        job = Job.make_publish(executor, script, sp.timestamp(0), sp.timestamp(1800000), interval, 1700, contract.address, compact_scripts)
+        scenario += scheduler.publish(job).run(sender=administrator.address)
+        scenario += scheduler.ack(script).run(sender=executor)
+
+    return types.SimpleNamespace(administrator=administrator, scheduler=scheduler, contract=contract, script=script, executors=executors)
+
+def fulfill_all(scenario, fixture, payload, now):
+    """Fixture letting every executor of a bootstrap_jobs fixture fulfill the same payload through the scheduler at now.
+    """
+    from oracles.job_scheduler import Fulfill
+    for executor in fixture.executors:
+        scenario += fixture.scheduler.fulfill(Fulfill.make(fixture.script, payload, fixture.scheduler.compact_scripts)).run(sender=executor, source=executor, now=sp.timestamp(now))
+
+def return_contract(scenario):
+    """Fixture originating a Viewer and returning it together with its set_nat callback.
+    """
+    from utils.viewer import Viewer
+    viewer = Viewer()
+    scenario += viewer
+    return viewer, sp.contract(sp.TNat, viewer.address, entry_point="set_nat").open_some()
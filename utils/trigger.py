@@ -0,0 +1,59 @@
+import oracles.constants as Constants
+
+DEFAULT_DEVIATION_THRESHOLD_BPS = 50 # 0.5%
+
+def epoch_of(timestamp, epoch_interval=Constants.ORACLE_EPOCH_INTERVAL):
+    """Returns the epoch a unix timestamp falls into, the same way PriceOracle.fulfill computes it.
+    """
+    return timestamp // epoch_interval
+
+def deviation_bps(onchain_price, observed_price):
+    """Returns the deviation of the observed price from the on-chain price in basis points (rounded down).
+    """
+    if onchain_price == 0:
+        return None
+    return abs(observed_price - onchain_price) * 10000 // onchain_price
+
+def heartbeat_expired(last_epoch, now, epoch_interval=Constants.ORACLE_EPOCH_INTERVAL, heartbeat=Constants.ORACLE_EPOCH_INTERVAL):
+    """Returns True if the last finalized epoch started a heartbeat or more ago.
+    """
+    return now - last_epoch * epoch_interval >= heartbeat
+
+def should_submit(onchain_prices, observed_prices, last_epoch, now, epoch_interval=Constants.ORACLE_EPOCH_INTERVAL, heartbeat=Constants.ORACLE_EPOCH_INTERVAL, deviation_threshold_bps=DEFAULT_DEVIATION_THRESHOLD_BPS):
+    """Executor side trigger for the high frequency mode of the PriceOracle. Every executor compares its own observed prices
+    against the same on-chain state (prices and last_epoch). The heartbeat part of the decision only depends on that shared state,
+    so all executors agree on it. The deviation part does not: near the threshold the executors' observations differ slightly,
+    some of them submit and others do not, and if fewer than response_threshold submit the epoch is not finalized. Such a move is
+    then only published once it grows past the threshold for the others too, or at the latest with the next heartbeat.
+
+    Args:
+        onchain_prices (dict): symbol -> price currently stored in the oracle
+        observed_prices (dict): symbol -> price the executor would submit
+        last_epoch (int): the oracle's last_epoch
+        now (int): current unix timestamp
+        epoch_interval (int): epoch interval the oracle was compiled with
+        heartbeat (int): max seconds between two updates
+        deviation_threshold_bps (int): min deviation in basis points that triggers a submission
+
+    Returns:
+        bool: True if the epoch of now was not finalized yet and a price deviates or the heartbeat expired
+    """
+    if epoch_of(now, epoch_interval) <= last_epoch:
+        return False
+    if heartbeat_expired(last_epoch, now, epoch_interval, heartbeat):
+        return True
+    for symbol, observed_price in observed_prices.items():
+        deviation = deviation_bps(onchain_prices.get(symbol, 0), observed_price)
+        if deviation is None or deviation >= deviation_threshold_bps:
+            return True
+    return False
+
+def max_submissions_per_day(sources, epoch_interval=Constants.ORACLE_EPOCH_INTERVAL):
+    """Upper bound of fulfill operations per day if every source submits in every epoch.
+    """
+    return sources * 86400 // epoch_interval
+
+def heartbeat_submissions_per_day(sources, heartbeat=Constants.ORACLE_EPOCH_INTERVAL):
+    """Fulfill operations per day of a flat market where only the heartbeat triggers submissions.
+    """
+    return sources * 86400 // heartbeat